@@ -0,0 +1,156 @@
+# Struct Compacter, benchmark of DWARF readers, on given files and on generated deep hierarchies
+
+import argparse
+import multiprocessing
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert( 0, os.path.dirname( os.path.abspath( __file__ ) ) )
+
+import sc
+
+def read_structs( args ):
+    ( file_name, reader ) = args
+
+    config = sc.process_argv( [ '--reader', reader, file_name ] )
+    application = sc.Application( config )
+
+    start = time.time()
+    types = application._read_DWARF( file_name, None )
+    elapsed = time.time() - start
+
+    # structs are packed as Application does, embedded ones first
+    start = time.time()
+    application._compact_structs( application._find_padding( application._fix_types( types ) ) )
+    packing = time.time() - start
+
+    # peak memory of this process only, each run has a process of its own
+    memory = resource.getrusage( resource.RUSAGE_SELF ).ru_maxrss // 1024
+
+    # fingerprints are made of layouts of structs and types of theirs members
+    structs = [ type.get_fingerprint() for type in types.values() \
+        if type.__class__ == sc.StructType ]
+
+    return ( elapsed, memory, sorted( structs ), packing )
+
+def run( file_name, reader, repeat ):
+    best = None
+
+    for i in range( repeat ):
+        pool = multiprocessing.Pool( 1 )
+
+        try:
+            result = pool.apply( read_structs, ( ( file_name, reader ), ) )
+        finally:
+            pool.close()
+            pool.join()
+
+        if best == None or result[ 0 ] < best[ 0 ]:
+            best = result
+
+    return best
+
+def make_deep_hierarchy( directory, depth ):
+    # structs nested by value and a member of typedef chain type, deeper than Python recursion limit
+    lines = [ 'struct S0 { char tag; long value; };', 'typedef struct S0 T0;' ]
+
+    for i in range( 1, depth + 1 ):
+        lines.append( 'struct S%d { char tag; struct S%d inner; short port; };' % ( i, i - 1 ) )
+        lines.append( 'typedef T%d T%d;' % ( i - 1, i ) )
+
+    lines.append( 'struct S%d deep;' % depth )
+    lines.append( 'struct Chain { char tag; T%d value; char flags; } chain;' % depth )
+
+    source = os.path.join( directory, 'deep%d.c' % depth )
+    output = os.path.join( directory, 'deep%d.o' % depth )
+
+    with open( source, 'w' ) as file:
+        file.write( '\n'.join( lines ) + '\n' )
+
+    subprocess.run( [ 'gcc', '-g', '-c', source, '-o', output ], check = True )
+
+    return output
+
+def process_argv( argv ):
+    parser = argparse.ArgumentParser(
+        prog='benchmark',
+        description=
+            'Compare time and memory of DWARF readers of Struct Compacter. Both of them'
+            ' have to find the same structs.'
+    )
+
+    parser.add_argument(
+        '-r', '--repeat',
+        default=3,
+        type=int,
+        help=
+            'Number of runs of each reader, the fastest one is reported. By default 3 is set.'
+    )
+
+    parser.add_argument(
+        '--deep',
+        default=None,
+        type=int,
+        metavar='DEPTH',
+        help=
+            'Generate and compile (with gcc) an object of DEPTH structs nested by value and'
+            ' a typedef chain of DEPTH typedefs, and add it to the files.'
+    )
+
+    parser.add_argument(
+        'files',
+        nargs='*',
+        help=
+            'Object files, executables or shared libraries to be read.'
+    )
+
+    result = parser.parse_args( argv )
+    result.repeat = max( 1, result.repeat )
+
+    if len( result.files ) == 0 and result.deep == None:
+        parser.error( 'files or --deep are required' )
+
+    if result.deep != None and shutil.which( 'gcc' ) == None:
+        parser.error( 'argument --deep: gcc is not found' )
+
+    return result
+
+def main():
+    config = process_argv( sys.argv[1:] )
+    readers = [ 'pyelftools', 'fast' ]
+    differ = False
+
+    directory = tempfile.mkdtemp()
+    files = list( config.files )
+
+    if config.deep != None:
+        files.append( make_deep_hierarchy( directory, config.deep ) )
+
+    print( '%-30s %-12s %10s %12s %8s %10s' % ( 'file', 'reader', 'time [s]', 'memory [MB]', 'structs', \
+        'pack [s]' ) )
+
+    for file_name in files:
+        results = [ run( file_name, reader, config.repeat ) for reader in readers ]
+
+        for ( reader, ( elapsed, memory, structs, packing ) ) in zip( readers, results ):
+            print( '%-30s %-12s %10.2f %12d %8d %10.2f' % ( os.path.basename( file_name )[ -30: ], reader, \
+                elapsed, memory, len( structs ), packing ) )
+
+        if results[ 0 ][ 2 ] != results[ 1 ][ 2 ]:
+            print( 'Readers found different structs in', file_name )
+            differ = True
+        else:
+            print( 'Fast reader is %.1fx faster' % ( results[ 0 ][ 0 ] / max( results[ 1 ][ 0 ], 1e-6 ) ) )
+
+    shutil.rmtree( directory )
+
+    if differ:
+        sys.exit( 1 )
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,34 @@
 # Struct Compacter
 
 import argparse
+import csv
+import difflib
+import glob
+import hashlib
+import heapq
+import json
+import mmap
+import multiprocessing
 import os
+import re
 import sys
-
+import tempfile
+import time
+import zipfile
+import zlib
+
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from io import BytesIO
 from math import ceil
-from fractions import gcd
+from struct import calcsize, pack_into, unpack_from
+
+# fractions.gcd is removed since Python 3.9
+try:
+    from math import gcd
+except ImportError:
+    from fractions import gcd
 
 # pyelftools should be installed in Python directory
 
@@ -17,9 +40,15 @@ else:
     exit( 'Apple?' )
 
 from elftools.elf.elffile import ELFFile
+from elftools.elf.relocation import RelocationHandler, RelocationSection
+from elftools.dwarf.die import AttributeValue, DIE as DWARFDIE
+from elftools.dwarf.dwarfinfo import DebugSectionDescriptor
+from elftools.dwarf.enums import ENUM_DW_AT, ENUM_DW_FORM, ENUM_DW_TAG
 from elftools.common.exceptions import ELFError
 from elftools.common.py3compat import bytes2str
 
+VERSION = '0.2'
+
 #
 # Tests
 #
@@ -127,6 +156,24 @@ class TypeName:
 
         return text.startswith( '_vptr.' )
 
+    @staticmethod
+    def get_unqualified( text ):
+        precondition( len( text ) > 0 )
+
+        depth = 0
+        begin = 0
+
+        # '::' inside of template arguments does not split the name
+        for i in range( len( text ) ):
+            if text[ i ] == '<':
+                depth += 1
+            elif text[ i ] == '>':
+                depth -= 1
+            elif depth == 0 and text.startswith( '::', i ):
+                begin = i + 2
+
+        return text[ begin : ]
+
     @staticmethod
     def validate( name ):
         if name == None:
@@ -175,7 +222,7 @@ class IMember( IVisitable ):
         return self.this_offset
 
     def set_this_offset( self, this_offset ):
-        precondition( ThisOffset.validate( this_offset, self.get_type().get_alignment() ) )
+        precondition( ThisOffset.validate( this_offset, get_effective_alignment( self.get_type() ) ) )
 
         self.this_offset = this_offset
 
@@ -202,18 +249,123 @@ class IMember( IVisitable ):
     def _get_name( self ):
         return self.name
 
-class Inheritance( IMember ):
+#
+# Derived class may put its members in tail padding of base which is not POD, so base takes
+# its data size only, the rest of it is shared with derived class
+#
+def get_base_size( type ):
+    if type.__class__ == StructType and type.get_is_pod() == False:
+        return type.get_data_size()
+
+    return type.get_size()
+
+def copy_member( member, this_offset, type = None ):
+    if type == None:
+        type = member.get_type()
+
+    if member.__class__ == Member:
+        return Member( member.get_name(), member.file_id, member.line_no, type, this_offset )
+
+    return member.__class__( type, this_offset )
+
+def get_embedded_struct( type ):
+    # struct embedded by value, as member, base or element of array, const and volatile too
+    while type.__class__ in ( ArrayType, ConstType, VolatileType ):
+        type = type.get_type()
+
+    if type.__class__ == StructType:
+        return type
+
+    return None
+
+def iter_structs_in_post_order( structs ):
+    # structs embedded in others go first, each of them once, without recursion since nesting may be deep
+    visited = set()
+
+    for struct in structs:
+        if struct in visited:
+            continue
+
+        visited.add( struct )
+        stack = [ ( struct, iter( struct.get_members() ) ) ]
+
+        while len( stack ) > 0:
+            ( parent, members ) = stack[ -1 ]
+            member = next( members, None )
+
+            if member == None:
+                stack.pop()
+                yield parent
+                continue
+
+            nested = get_embedded_struct( member.get_type() )
+
+            if nested == None or nested in visited:
+                continue
+
+            visited.add( nested )
+            stack.append( ( nested, iter( nested.get_members() ) ) )
+
+def propagate_is_pod( structs ):
+    # struct is not POD if a struct embedded in it is not, or if it has a reference member (C++03)
+    for struct in iter_structs_in_post_order( structs ):
+        for member in struct.get_members():
+            nested = get_embedded_struct( member.get_type() )
+
+            if member.get_type().__class__ == RefType or ( nested != None and not nested.get_is_pod() ):
+                struct.set_is_pod( False )
+                break
+
+#
+# StructMember is a view of a row of MemberTable of struct, standalone one has a table of its own
+# and is copied into the table of struct once added
+#
+class StructMember( IMember ):
+    def __init__( self, name, type, this_offset ):
+        self.table = MemberTable()
+        self.index = self.table.add_row( MemberTable.KINDS.index( self.__class__ ) )
+
+        IMember.__init__( self, name, type, this_offset )
+
+    # details
+
+    def _get_name_column( self ):
+        return self.table.objects[ 2 * self.index ]
+
+    def _set_name_column( self, name ):
+        self.table.objects[ 2 * self.index ] = sys.intern( name )
+
+    def _get_type( self ):
+        return self.table.objects[ 2 * self.index + 1 ]
+
+    def _set_type( self, type ):
+        self.table.objects[ 2 * self.index + 1 ] = type
+
+    def _get_this_offset( self ):
+        return self.table.get_value( self.index, MemberTable.THIS_OFFSET )
+
+    def _set_this_offset( self, this_offset ):
+        self.table.set_value( self.index, MemberTable.THIS_OFFSET, this_offset )
+
+    name = property( _get_name_column, _set_name_column )
+    type = property( _get_type, _set_type )
+    this_offset = property( _get_this_offset, _set_this_offset )
+
+class Inheritance( StructMember ):
     def __init__( self, type, this_offset ):
-        IMember.__init__( self, '__inheritance', type, this_offset )
+        StructMember.__init__( self, '__inheritance', type, this_offset )
+
+    def get_size( self ):
+        return get_base_size( self.type )
 
     def get_brief_desc( self ):
         return self.get_name( 30 ) + ' ' \
             + self.type.get_name( 30 ) \
             + ' [this+' + str( self.this_offset ) + ']'
 
-class EBOInheritance( IMember ):
+class EBOInheritance( StructMember ):
     def __init__( self, type, this_offset ):
-        IMember.__init__( self, '__ebo_inheritance', type, this_offset )
+        StructMember.__init__( self, '__ebo_inheritance', type, this_offset )
 
     def get_size( self ):
         return 0
@@ -223,9 +375,9 @@ class EBOInheritance( IMember ):
             + self.type.get_name( 30 ) \
             + ' [this+' + str( self.this_offset ) + ']'
 
-class Member( IMember ):
+class Member( StructMember ):
     def __init__( self, name, file_id, line_no, type, this_offset ):
-        IMember.__init__( self, name, type, this_offset )
+        StructMember.__init__( self, name, type, this_offset )
 
         self.file_id = file_id
         self.line_no = line_no
@@ -243,15 +395,209 @@ class Member( IMember ):
             + get_desc( self.type ) \
             + ' [this+' + str( self.this_offset ) + ']'
 
-class Padding( IMember ):
+    # details
+
+    def _get_file_id( self ):
+        return self.table.get_value( self.index, MemberTable.FILE_ID )
+
+    def _set_file_id( self, file_id ):
+        self.table.set_value( self.index, MemberTable.FILE_ID, file_id )
+
+    def _get_line_no( self ):
+        return self.table.get_value( self.index, MemberTable.LINE_NO )
+
+    def _set_line_no( self, line_no ):
+        self.table.set_value( self.index, MemberTable.LINE_NO, line_no )
+
+    file_id = property( _get_file_id, _set_file_id )
+    line_no = property( _get_line_no, _set_line_no )
+
+class Padding( StructMember ):
     def __init__( self, type, this_offset ):
-        IMember.__init__( self, '        ', type, this_offset )
+        StructMember.__init__( self, '        ', type, this_offset )
+
+    def set_size( self, new_size ):
+        self.table.set_value( self.index, MemberTable.SIZE, new_size )
 
     def get_brief_desc( self ):
         return self.get_name( 30 ) + ' ' \
             + self.type.get_name( 30 ) \
             + ' [this+' + str( self.this_offset ) + ']'
 
+    # details
+
+    # padding keeps its size only, PaddingType is created on demand
+    def _get_type( self ):
+        return PaddingType( self.table.get_value( self.index, MemberTable.SIZE ) )
+
+    def _set_type( self, type ):
+        self.table.set_value( self.index, MemberTable.SIZE, type.get_size() )
+
+    type = property( _get_type, _set_type )
+
+#
+# BitFields keeps bit fields sharing bytes of struct, they are listed by its BitFieldsType
+#
+class BitFields( StructMember ):
+    def __init__( self, type, this_offset ):
+        StructMember.__init__( self, '__bitfields', type, this_offset )
+
+    def get_brief_desc( self ):
+        return self.get_name( 30 ) + ' ' \
+            + get_desc( self.type ) \
+            + ' [this+' + str( self.this_offset ) + ']'
+
+#
+# BitField is one field of BitFields, its offset is in bits from the beginning of BitFields
+#
+class BitField( IVisitable ):
+    def __init__( self, name, file_id, line_no, type, bit_offset, bit_size ):
+        precondition( TypeName.validate( name ) )
+        precondition( type )
+        precondition( bit_size > 0 )
+
+        self.name = name
+        self.file_id = file_id
+        self.line_no = line_no
+        self.type = type
+        self.bit_offset = bit_offset
+        self.bit_size = bit_size
+
+    def get_name( self ):
+        return self.name
+
+    def get_file_id( self ):
+        return self.file_id
+
+    def get_line_no( self ):
+        return self.line_no
+
+    def get_type( self ):
+        return self.type
+
+    def get_bit_offset( self ):
+        return self.bit_offset
+
+    def set_bit_offset( self, bit_offset ):
+        precondition( bit_offset >= 0 )
+
+        self.bit_offset = bit_offset
+
+    def get_bit_size( self ):
+        return self.bit_size
+
+    def get_bit_end( self ):
+        return self.bit_offset + self.bit_size
+
+    def get_unit_size( self ):
+        # field may not cross boundary of storage unit of its type
+        if self.type.get_size() == None:
+            return 1
+
+        return self.type.get_size()
+
+#
+# MemberTable keeps members of struct in columns instead of an object per member. Integer
+# columns share one array and names share one list with types, row by row, so small structs pay
+# for two containers only. Member, Inheritance, EBOInheritance and Padding objects are views of
+# a row, created on access.
+#
+class MemberTable:
+    KINDS = ( Member, Inheritance, EBOInheritance, Padding, BitFields )
+
+    # integer columns, SIZE is set for padding only
+    ( KIND, THIS_OFFSET, SIZE, FILE_ID, LINE_NO ) = range( 5 )
+    WIDTH = 5
+
+    # None stored in an integer column
+    NONE = -0x80000000
+
+    def __init__( self ):
+        self.values = array( 'i' )
+
+        # name and type of each row
+        self.objects = []
+
+    def __len__( self ):
+        return len( self.objects ) // 2
+
+    def __iter__( self ):
+        for i in range( len( self ) ):
+            yield self.get_view( i )
+
+    def __getitem__( self, i ):
+        if isinstance( i, slice ):
+            return [ self.get_view( j ) for j in range( * i.indices( len( self ) ) ) ]
+
+        return self.get_view( self._get_index( i ) )
+
+    def __setitem__( self, i, member ):
+        self._copy_row( self._get_index( i ), member )
+
+    def append( self, member ):
+        ( source, j ) = ( member.table, member.index )
+
+        self.values.extend( source.values[ j * MemberTable.WIDTH : ( j + 1 ) * MemberTable.WIDTH ] )
+        self.objects.extend( source.objects[ 2 * j : 2 * j + 2 ] )
+
+    def add_row( self, kind ):
+        self.values.extend( ( kind, ) + ( MemberTable.NONE, ) * ( MemberTable.WIDTH - 1 ) )
+        self.objects.extend( ( None, None ) )
+
+        return len( self ) - 1
+
+    def swap( self, i, j ):
+        ( i, j ) = ( self._get_index( i ), self._get_index( j ) )
+
+        ( row_i, row_j ) = ( i * MemberTable.WIDTH, j * MemberTable.WIDTH )
+        ( self.values[ row_i : row_i + MemberTable.WIDTH ], self.values[ row_j : row_j + MemberTable.WIDTH ] ) \
+            = ( self.values[ row_j : row_j + MemberTable.WIDTH ], self.values[ row_i : row_i + MemberTable.WIDTH ] )
+
+        ( self.objects[ 2 * i : 2 * i + 2 ], self.objects[ 2 * j : 2 * j + 2 ] ) \
+            = ( self.objects[ 2 * j : 2 * j + 2 ], self.objects[ 2 * i : 2 * i + 2 ] )
+
+    def get_view( self, i ):
+        cls = MemberTable.KINDS[ self.values[ i * MemberTable.WIDTH + MemberTable.KIND ] ]
+
+        view = cls.__new__( cls )
+        view.table = self
+        view.index = i
+
+        return view
+
+    def get_value( self, i, column ):
+        value = self.values[ i * MemberTable.WIDTH + column ]
+
+        if value == MemberTable.NONE:
+            return None
+
+        return value
+
+    def set_value( self, i, column, value ):
+        if value == None:
+            value = MemberTable.NONE
+
+        self.values[ i * MemberTable.WIDTH + column ] = value
+
+    # details
+
+    def _get_index( self, i ):
+        if i < 0:
+            i += len( self )
+
+        if i < 0 or i >= len( self ):
+            raise IndexError( 'Member index out of range' )
+
+        return i
+
+    def _copy_row( self, i, member ):
+        # every member is a row of some table, standalone one too
+        ( source, j ) = ( member.table, member.index )
+
+        self.values[ i * MemberTable.WIDTH : ( i + 1 ) * MemberTable.WIDTH ] \
+            = source.values[ j * MemberTable.WIDTH : ( j + 1 ) * MemberTable.WIDTH ]
+        self.objects[ 2 * i : 2 * i + 2 ] = source.objects[ 2 * j : 2 * j + 2 ]
+
 #
 # Types representation
 #
@@ -482,11 +828,17 @@ class UnionType( IType ):
         return 3
 
 class ArrayType( IType ):
-    def __init__( self, type ):
+    def __init__( self, type, count = None ):
         IType.__init__( self, 'Array', None )
 
         self.type = type
 
+        # number of elements read from DWARF, None for flexible arrays or unknown bounds
+        self.count = count
+
+        if count != None and type.get_size() != None:
+            self.set_size( count * type.get_size() )
+
     def get_brief_desc( self ):
         if self.get_size() == None:
             size = '?'
@@ -501,6 +853,9 @@ class ArrayType( IType ):
     def get_type( self ):
         return self.type
 
+    def get_count( self ):
+        return self.count
+
     # details
 
     def _get_name( self ):
@@ -520,7 +875,42 @@ class StructType( IType ):
 
         self.is_valid = True
 
-        self.members = []
+        # MemberTable, created with the first member
+        self.members = None
+
+        # tail padding of struct which is not POD may be reused by derived class (Itanium C++ ABI)
+        self.is_pod = True
+        self.data_size = None
+
+        self.qualified_name = name
+        self.fingerprint = None
+
+    def get_qualified_name( self ):
+        return self.qualified_name
+
+    def set_qualified_name( self, qualified_name ):
+        precondition( TypeName.validate( qualified_name ) )
+
+        self.qualified_name = qualified_name
+
+    def get_fingerprint( self ):
+        return self.fingerprint
+
+    def set_is_pod( self, is_pod ):
+        self.is_pod = is_pod
+
+    def get_is_pod( self ):
+        return self.is_pod
+
+    def get_data_size( self ):
+        # size without tail padding, dsize in Itanium C++ ABI
+        if self.data_size == None:
+            self.data_size = self._calculate_data_size()
+
+        return self.data_size
+
+    def set_fingerprint( self, fingerprint ):
+        self.fingerprint = fingerprint
 
     def get_full_desc( self ):
         total_padding = calculate_total_padding( self )
@@ -559,7 +949,7 @@ class StructType( IType ):
 
         result += ')'
 
-        for member in self.members:
+        for member in self.get_members():
             result += '\n\t' + member.get_brief_desc()
 
         return result
@@ -567,7 +957,7 @@ class StructType( IType ):
     def add_member( self, member ):
         self._validate_member_not_none( member )
 
-        if len( self.members ) == 0:
+        if self.members == None:
             self._validate_member_this0( member )
 
         # do not validate, not EBOInheritance yet
@@ -576,13 +966,23 @@ class StructType( IType ):
 
         self._validate_member_out_of_struct( member )
 
+        if self.members == None:
+            self.members = MemberTable()
+
         self.members.append( member )
+        self.data_size = None
 
     def get_members( self ):
+        # struct without members does not keep a table, there are many of them in C++
+        if self.members == None:
+            return ()
+
         return self.members
 
     def set_members( self, members ):
-        del self.members[:]
+        # members may be views of the current table, it is replaced by a new one
+        self.members = None
+        self.data_size = None
 
         for member in members:
             self.add_member( member )
@@ -590,16 +990,36 @@ class StructType( IType ):
     def validate( self ):
         Alignment.validate( self.get_alignment(), self.get_size() )
 
-        if len( self.members ) == 0:
+        members = self.get_members()
+
+        if len( members ) == 0:
             return True
 
-        for ( prev, current ) in zip( self.members[ 0 : -1 ], self.members[ 1 : ] ):
+        for ( prev, current ) in zip( members[ 0 : -1 ], members[ 1 : ] ):
             self._validate_members_layout( prev, current )
 
         return True
 
     # details
 
+    def _calculate_data_size( self ):
+        data_size = 0
+
+        for member in self.get_members():
+            if member.__class__ == Padding:
+                continue
+
+            if member.get_size() == None:
+                return self.get_size()
+
+            data_size = max( data_size, member.get_this_offset() + member.get_size() )
+
+        # empty struct takes one byte at least
+        if data_size == 0:
+            return self.get_size()
+
+        return data_size
+
     def _validate_member_not_none( self, member ):
         if member == None:
             raise( TypeNotWellDefinedError( \
@@ -693,6 +1113,119 @@ class PaddingType( IType ):
     def _get_name( self ):
         return 'char[' + str( self.get_size() ) + ']'
 
+class BitFieldsType( IType ):
+    def __init__( self, fields ):
+        precondition( len( fields ) > 0 )
+
+        IType.__init__( self, 'BitFields', BitFieldsType._get_bytes( fields ) )
+
+        self.fields = list( fields )
+
+    def get_fields( self ):
+        return self.fields
+
+    def add_field( self, field ):
+        self.fields.append( field )
+        self.set_size( max( self.get_size(), BitFieldsType._get_bytes( self.fields ) ) )
+
+    def set_alignment( self, alignment ):
+        # the last byte used may be followed by other members, so size is not aligned
+        precondition( Alignment.validate_value( alignment ) )
+
+        self.alignment = alignment
+
+    def get_storage_alignment( self ):
+        # declared types of fields align struct, wherever the fields are placed
+        alignment = 1
+
+        for field in self.fields:
+            if field.get_type().get_alignment() != None:
+                alignment = max( alignment, field.get_type().get_alignment() )
+            else:
+                alignment = max( alignment, Alignment.get_from_sizeof( field.get_unit_size() ) )
+
+        return alignment
+
+    @staticmethod
+    def pack( fields ):
+        precondition( len( fields ) > 0 )
+
+        # the widest fields first, the narrow ones fill the holes left
+        fields = sorted( fields, key = lambda field: -field.get_bit_size() )
+
+        unit_size = max( field.get_unit_size() for field in fields )
+        size = ( sum( field.get_bit_size() for field in fields ) + 7 ) // 8
+
+        # alignment tells where the fields start only, they take the bytes they use (SysV ABI)
+        while True:
+            alignment = BitFieldsType._get_alignment( size, unit_size )
+            bit_offsets = BitFieldsType._place_fields( fields, size, alignment )
+
+            if bit_offsets != None:
+                break
+
+            size += 1
+
+        packed = [ BitField( field.get_name(), field.get_file_id(), field.get_line_no() \
+            , field.get_type(), bit_offset, field.get_bit_size() ) \
+                for ( field, bit_offset ) in zip( fields, bit_offsets ) ]
+
+        result = BitFieldsType( sorted( packed, key = lambda field: field.get_bit_offset() ) )
+        result.set_size( size )
+        result.set_alignment( alignment )
+
+        return result
+
+    # details
+
+    def _get_name( self ):
+        return ','.join( '%s:%d' % ( field.get_name(), field.get_bit_size() ) for field in self.fields )
+
+    def _decorate_name( self, name ):
+        return 'b{' + name + '}'
+
+    def _get_decoration_size( self ):
+        return 3
+
+    @staticmethod
+    def _get_bytes( fields ):
+        return max( 1, ( max( field.get_bit_end() for field in fields ) + 7 ) // 8 )
+
+    @staticmethod
+    def _get_alignment( size, unit_size ):
+        # BitFields no wider than its alignment can not cross a boundary of unit wider than that
+        alignment = 1
+
+        while alignment < size and alignment < min( unit_size, 8 ):
+            alignment *= 2
+
+        return alignment
+
+    @staticmethod
+    def _place_fields( fields, size, alignment ):
+        used = [ False ] * ( size * 8 )
+        result = []
+
+        for field in fields:
+            bit_size = field.get_bit_size()
+            unit = max( min( field.get_unit_size(), alignment ) * 8, bit_size )
+
+            for bit_offset in range( 0, size * 8 - bit_size + 1 ):
+                if bit_offset // unit != ( bit_offset + bit_size - 1 ) // unit:
+                    continue
+
+                if any( used[ bit_offset : bit_offset + bit_size ] ):
+                    continue
+
+                break
+            else:
+                return None
+
+            used[ bit_offset : bit_offset + bit_size ] = [ True ] * bit_size
+            result.append( bit_offset )
+
+        return result
+
 
 class Alignment:
     @staticmethod
@@ -746,16 +1279,22 @@ class Alignment:
         if size == None:
             raise TypeNotWellDefinedError( 'Size can not be None for alignment validation' )
 
+        Alignment.validate_value( alignment )
+
+        if ( size % alignment ) != 0:
+            raise TypeNotWellDefinedError( \
+                'Size (%d) has to be mutliplication of alignment (%d)' % ( size, alignment ) )
+
+        return True
+
+    @staticmethod
+    def validate_value( alignment ):
         if alignment == None:
             raise TypeNotWellDefinedError( 'Alignment can not be None' )
 
         if alignment not in [ 1, 2, 4, 8 ]:
             raise TypeNotWellDefinedError( 'Alignment (%d) is not one of [1,2,4,8]' % ( alignment ) )
 
-        if ( size % alignment ) != 0:
-            raise TypeNotWellDefinedError( \
-                'Size (%d) has to be mutliplication of alignment (%d)' % ( size, alignment ) )
-
         return True
 
 #
@@ -770,12 +1309,27 @@ def try_set_size( type, size ):
     if type.get_size() == None:
         type.set_size( size )
 
+def get_effective_alignment( type ):
+    # arrays of types never fixed have no alignment, size of element tells the greatest one possible
+    alignment = type.get_alignment()
+
+    while alignment == None and type.__class__ in ( ArrayType, ConstType, VolatileType ):
+        type = type.get_type()
+        alignment = type.get_alignment()
+
+    if alignment == None and type.get_size() != None:
+        alignment = Alignment.get_from_sizeof( type.get_size() )
+
+    return alignment
+
 def calculate_alignment_based_on_members( struct ):
     alignment = 1
 
     for member in struct.get_members():
-        if member.get_type().get_alignment() != None:
-            alignment = max( alignment, member.get_type().get_alignment() )
+        if member.get_type().__class__ == BitFieldsType:
+            alignment = max( alignment, member.get_type().get_storage_alignment() )
+        elif get_effective_alignment( member.get_type() ) != None:
+            alignment = max( alignment, get_effective_alignment( member.get_type() ) )
 
     return gcd( alignment, struct.get_size() )
 
@@ -799,7 +1353,7 @@ def _fix_size_alignment_ebo_impl( struct, i ):
     elif ( i != -1 ) and is_empty_struct( members[ i + 1 ].get_type() ):
         # class Derived : EmptyBase1, Base2, EmptyBase3 {}
         #       ->   class Derived : EmptyBase1, EmptyBase3, Base2 {}
-        ( members[ i ], members[ i + 1 ] ) = ( members[ i + 1 ], members[ i ] )
+        members.swap( i, i + 1 )
         members[ i ] = EBOInheritance( members[ i ].get_type(), members[ i ].get_this_offset() )
 
         # even though EBO, size in DWARF may be >1
@@ -828,10 +1382,29 @@ def _fix_types_size_and_alignment_impl( struct, i, member_size ):
     else:
         _fix_size_alignment_member_impl( struct, i, member_size )
 
+def find_bases_with_reused_tail_padding( struct ):
+    members = struct.get_members()
+
+    # bases go first
+    for i in range( len( members ) - 1 ):
+        base = members[ i ]
+
+        if base.__class__ != Inheritance:
+            return
+
+        if base.get_type().__class__ != StructType:
+            continue
+
+        # compiler put member into tail padding of base, so base is not POD
+        if members[ i + 1 ].get_this_offset() < base.get_this_offset() + base.get_type().get_size():
+            base.get_type().set_is_pod( False )
+
 def fix_types_size_and_alignment( struct ):
     if struct.get_is_valid() == False:
         return
 
+    find_bases_with_reused_tail_padding( struct )
+
     members = struct.get_members()
 
     if len( members ) == 0:
@@ -934,6 +1507,7 @@ class ITypeVisitor:
         self.dispatcher[ StructType ] = self.visit_struct_type
         self.dispatcher[ EnumType ] = self.visit_enum_type
         self.dispatcher[ PaddingType ] = self.visit_padding_type
+        self.dispatcher[ BitFieldsType ] = self.visit_bit_fields_type
 
     def visit( self, interface, * args ):
         self.dispatcher[ interface.__class__ ]( interface, * args )
@@ -977,6 +1551,9 @@ class ITypeVisitor:
     def visit_padding_type( self, padding, * args ):
         return self.default_handler( self, padding, * args )
 
+    def visit_bit_fields_type( self, bit_fields, * args ):
+        return self.default_handler( self, bit_fields, * args )
+
 #
 # IMemberVisitor
 #
@@ -993,6 +1570,7 @@ class IMemberVisitor:
         self.dispatcher[ Inheritance ] = self.visit_inheritance
         self.dispatcher[ EBOInheritance ] = self.visit_ebo_inheritance
         self.dispatcher[ Padding ] = self.visit_padding
+        self.dispatcher[ BitFields ] = self.visit_bit_fields
 
     def visit( self, interface, * args ):
         self.dispatcher[ interface.__class__ ]( interface, * args )
@@ -1009,6 +1587,9 @@ class IMemberVisitor:
     def visit_padding( self, padding, * args ):
         return self.default_handler( self, padding, * args )
 
+    def visit_bit_fields( self, bit_fields, * args ):
+        return self.default_handler( self, bit_fields, * args )
+
 #
 # IsInheritanceVisitor
 #
@@ -1077,55 +1658,108 @@ def format_member( member, width ):
         + ('{: >' + str( this_offset_len ) + '}').format( this_offset ) \
         + ('{: <' + str( type_len ) + '}').format( type )
 
-def print_struct( struct, width ):
+def format_cache_line( this_offset, width ):
+    text = ' cache line +' + str( this_offset ) + ' '
+
+    return ( '{:-^' + str( 2 * ( width // 2 ) ) + '}' ).format( text )
+
+def format_members( struct, width, cache_line = None ):
+    result = []
+    line = 0
+
     for member in struct.get_members():
-        print( format_member( member, width ) )
+        # members starting in next cache line are preceded by its boundary
+        if cache_line != None and member.get_this_offset() // cache_line > line:
+            line = member.get_this_offset() // cache_line
+            result.append( format_cache_line( line * cache_line, width ) )
+
+        result.append( format_member( member, width ) )
+
+    return result
 
-def print_diff_of_structs( struct1, struct2, width ):
+def format_struct( struct, width, cache_line = None ):
+    return format_members( struct, width, cache_line )
+
+def format_diff_of_structs( struct1, struct2, width, cache_line = None ):
     struct_name = struct1.get_name()
     struct1_size = str( struct1.get_size() )
     struct2_size = str( struct2.get_size() )
-    print( '{' + struct_name + '}(' + struct1_size + '/' + struct2_size + ')' )
+    result = [ '{' + struct_name + '}(' + struct1_size + '/' + struct2_size + ')' ]
+
+    members = format_members( struct1, width, cache_line )
+    compacted = format_members( struct2, width, cache_line )
 
-    members_size = len( struct1.get_members() )
-    compacted_size = len( struct2.get_members() )
+    members_size = len( members )
+    compacted_size = len( compacted )
 
     # member type          | member type
     for i in range( min( members_size, compacted_size ) ):
-        member1 = struct1.get_members()[ i ]
-        member2 = struct2.get_members()[ i ]
-        print( format_member( member1, width ), '|', format_member( member2, width ) )
+        result.append( members[ i ] + ' | ' + compacted[ i ] )
 
     if members_size == compacted_size:
-        return
+        return result
 
     empty_member_string = ( '{: <' + str( width ) + '}' ).format( '-' )
 
     # member type          | -
     if members_size > compacted_size:
         for i in range( compacted_size, members_size ):
-            member1 = struct1.get_members()[ i ]
-            print( format_member( member1, width ), '|', empty_member_string )
+            result.append( members[ i ] + ' | ' + empty_member_string )
 
     # -                    | member type
     if members_size < compacted_size:
         for i in range( members_size, compacted_size ):
-            member2 = struct2.get_members()[ i ]
-            print( empty_member_string, '|', format_member( member2, width ) )
+            result.append( empty_member_string + ' | ' + compacted[ i ] )
+
+    return result
+
+def print_struct( struct, width, cache_line = None ):
+    for text in format_struct( struct, width, cache_line ):
+        print( text )
+
+def print_diff_of_structs( struct1, struct2, width, cache_line = None ):
+    for text in format_diff_of_structs( struct1, struct2, width, cache_line ):
+        print( text )
 
 #
-# IsEmptyStructVisitor
+# check_nested_types applies visitor to type and all types nested in it, without recursion.
+# Visitor sets result of a check for one type and puts types nested in it into nested_types.
 #
-class IsEmptyStructVisitor( ITypeVisitor ):
-    def __init__( self ):
-        ITypeVisitor.__init__( self )
+def check_nested_types( type, visitor ):
+    stack = [ type ]
+    visited = set()
+
+    while len( stack ) > 0:
+        type = stack.pop()
+
+        if id( type ) in visited:
+            continue
+
+        visited.add( id( type ) )
+
+        visitor.nested_types = []
+        type.accept( visitor )
+
+        if visitor.get_and_reset() == False:
+            return False
+
+        stack.extend( visitor.nested_types )
+
+    return True
+
+#
+# IsEmptyStructVisitor
+#
+class IsEmptyStructVisitor( ITypeVisitor ):
+    def __init__( self ):
+        ITypeVisitor.__init__( self )
 
         self.is_empty_struct = False
+        self.nested_types = []
 
     def visit_struct_type( self, struct, * args ):
-        for member in struct.get_members():
-            if is_empty_struct( member.get_type() ) == False:
-                return
+        # struct is empty if all its members are empty structs
+        self.nested_types = [ member.get_type() for member in struct.get_members() ]
 
         self.is_empty_struct = True
 
@@ -1137,11 +1771,7 @@ class IsEmptyStructVisitor( ITypeVisitor ):
         return result
 
 def is_empty_struct( type ):
-    is_empty_struct_visitor = IsEmptyStructVisitor()
-
-    type.accept( is_empty_struct_visitor )
-
-    return is_empty_struct_visitor.get_and_reset()
+    return check_nested_types( type, IsEmptyStructVisitor() )
 
 #
 # IsTemplateParamDependentVisitor
@@ -1188,6 +1818,9 @@ class IsTemplateParamDependentVisitor( ITypeVisitor ):
     def visit_padding_type( self, padding, * args ):
         self.is_dependent = False
 
+    def visit_bit_fields_type( self, bit_fields, * args ):
+        self.is_dependent = False
+
     def get( self ):
         return self.is_dependent
 
@@ -1216,9 +1849,9 @@ class PrintStructVisitor( ITypeVisitor ):
         #if TypeName.is_stl_internal( struct._get_name() ):
         #    return
 
-        id = args[0]
+        label = args[0]
 
-        print( '%x %s' % ( id, struct.get_full_desc() ) )
+        print( '%s %s' % ( label, struct.get_full_desc() ) )
 
 #
 # IsTypeWellDefinedVisitor
@@ -1240,10 +1873,12 @@ class IsTypeWellDefinedVisitor( ITypeVisitor ):
         self.is_well_defined = True
 
     def visit_const_type( self, const, * args ):
-        self.is_well_defined = is_type_well_defined( const.get_type() )
+        self.is_well_defined = True
+        self.nested_types = [ const.get_type() ]
 
     def visit_volatile_type( self, volatile, * args ):
-        self.is_well_defined = is_type_well_defined( volatile.get_type() )
+        self.is_well_defined = True
+        self.nested_types = [ volatile.get_type() ]
 
     def visit_base_type( self, base, * args ):
         self.is_well_defined = True
@@ -1252,7 +1887,8 @@ class IsTypeWellDefinedVisitor( ITypeVisitor ):
         self.is_well_defined = True
 
     def visit_array_type( self, array, * args ):
-        self.is_well_defined = is_type_well_defined( array.get_type() )
+        self.is_well_defined = True
+        self.nested_types = [ array.get_type() ]
 
     def visit_struct_type( self, struct, * args ):
         self.is_well_defined = self._visit_struct_type_impl( struct, * args )
@@ -1263,9 +1899,19 @@ class IsTypeWellDefinedVisitor( ITypeVisitor ):
     def visit_padding_type( self, padding, * args ):
         self.is_well_defined = True
 
+    def visit_bit_fields_type( self, bit_fields, * args ):
+        self.is_well_defined = True
+
     def get( self ):
         return self.is_well_defined
 
+    def get_and_reset( self ):
+        result = self.is_well_defined
+
+        self.is_well_defined = None
+
+        return result
+
     # details
 
     def _visit_unknown_type_impl( self, unknown, * args ):
@@ -1296,18 +1942,12 @@ class IsTypeWellDefinedVisitor( ITypeVisitor ):
         if struct.get_alignment() == None:
             return False
 
-        for member in struct.get_members():
-            if is_type_well_defined( member.get_type() ) == False:
-                return False
+        self.nested_types = [ member.get_type() for member in struct.get_members() ]
 
         return True
 
 def is_type_well_defined( type ):
-    visitor = IsTypeWellDefinedVisitor()
-
-    type.accept( visitor )
-
-    return visitor.get()
+    return check_nested_types( type, IsTypeWellDefinedVisitor() )
 
 #
 # IsTypeWellDefinedVisitor
@@ -1329,10 +1969,12 @@ class IsTypeCompletelyDefinedVisitor( ITypeVisitor ):
         self.is_completely_defined = True
 
     def visit_const_type( self, const, * args ):
-        self.is_completely_defined = is_type_completely_defined( const.get_type() )
+        self.is_completely_defined = True
+        self.nested_types = [ const.get_type() ]
 
     def visit_volatile_type( self, volatile, * args ):
-        self.is_completely_defined = is_type_completely_defined( volatile.get_type() )
+        self.is_completely_defined = True
+        self.nested_types = [ volatile.get_type() ]
 
     def visit_base_type( self, base, * args ):
         self.is_completely_defined = True
@@ -1341,7 +1983,8 @@ class IsTypeCompletelyDefinedVisitor( ITypeVisitor ):
         self.is_completely_defined = True
 
     def visit_array_type( self, array, * args ):
-        self.is_completely_defined = is_type_completely_defined( array.get_type() )
+        self.is_completely_defined = True
+        self.nested_types = [ array.get_type() ]
 
     def visit_struct_type( self, struct, * args ):
         self.is_completely_defined = self._visit_struct_type_impl( struct, * args )
@@ -1352,24 +1995,28 @@ class IsTypeCompletelyDefinedVisitor( ITypeVisitor ):
     def visit_padding_type( self, padding, * args ):
         self.is_completely_defined = True
 
+    def visit_bit_fields_type( self, bit_fields, * args ):
+        self.is_completely_defined = True
+
     def get( self ):
         return self.is_completely_defined
 
+    def get_and_reset( self ):
+        result = self.is_completely_defined
+
+        self.is_completely_defined = None
+
+        return result
+
     # details
 
     def _visit_struct_type_impl( self, struct, * args ):
-        for member in struct.get_members():
-            if is_type_completely_defined( member.get_type() ) == False:
-                return False
+        self.nested_types = [ member.get_type() for member in struct.get_members() ]
 
         return True
 
 def is_type_completely_defined( type ):
-    visitor = IsTypeCompletelyDefinedVisitor()
-
-    type.accept( visitor )
-
-    return visitor.get()
+    return check_nested_types( type, IsTypeCompletelyDefinedVisitor() )
 
 #
 # INode
@@ -1411,6 +2058,9 @@ class InheritanceNode( INode ):
     def __init__( self, type, this_offset ):
         INode.__init__( self, '__inheritance', type, this_offset )
 
+    def get_size( self ):
+        return get_base_size( self.type )
+
     def __str__( self ):
         return 'Inheritance ' + get_desc( self.type )
 
@@ -1425,9 +2075,13 @@ class EBOInheritanceNode( INode ):
         return 'EBOInheritance ' + get_desc( self.type )
 
 class MemberNode( INode ):
-    def __init__( self, name, type, this_offset ):
+    def __init__( self, name, type, this_offset, file_id = None, line_no = None ):
         INode.__init__( self, name, type, this_offset )
 
+        # declaration of member is kept for packed one
+        self.file_id = file_id
+        self.line_no = line_no
+
     def __str__( self ):
         return self.get_name() + ' ' + self.get_type().get_name() \
             + ' (' + str( self.get_size() ) + ')' \
@@ -1498,20 +2152,24 @@ class TypesToNodesConversionVisitor( IMemberVisitor ):
         self.node = EBOInheritanceNode( ebo_inheritance.get_type(), None )
 
     def visit_member( self, member, * args ):
-        self.node = MemberNode( member.get_name(), member.get_type(), None )
+        self.node = MemberNode( member.get_name(), member.get_type(), None, member.file_id, member.line_no )
 
     def visit_padding( self, padding, * args ):
         self.node = PaddingNode( PaddingType( padding.get_size() ), None )
 
+    def visit_bit_fields( self, bit_fields, * args ):
+        self.node = MemberNode( bit_fields.get_name(), bit_fields.get_type(), None )
+
     def get_node( self ):
         return self.node
 
 #
-# FindMatchingPaddingVisitor
+# PaddingIndex
 #
 def check_padding( padding, size, alignment ):
+    # size of bit fields is not multiplication of their alignment
     precondition( TypeSize.validate( size ) )
-    precondition( Alignment.validate( alignment, size ) )
+    precondition( Alignment.validate_value( alignment ) )
 
     if padding.get_size() < size:
         return False
@@ -1522,23 +2180,158 @@ def check_padding( padding, size, alignment ):
     return ( padding.get_size() - ( padding_this_aligned - padding_this ) ) >= size
 
 #
-# Struct members representation
+# MinTree keeps one value per key, keys are small non-negative integers (sizes), and finds the
+# least value of keys not less than given one in logarithmic time. It grows with the greatest key.
 #
-class FindMatchingPaddingVisitor( INodeVisitor ):
-    def __init__( self, size, alignment ):
-        INodeVisitor.__init__( self )
+class MinTree:
+    def __init__( self ):
+        self.capacity = 1
+        self.values = [ None, None ]
 
-        self.size = size
-        self.alignment = alignment
+    def set( self, key, value ):
+        # value None removes key
+        precondition( key >= 0 )
 
-        self.padding = None
+        if key >= self.capacity:
+            self._grow( key )
 
-    def visit_padding_node( self, padding, * args ):
-        if check_padding( padding, self.size, self.alignment ):
-            self.padding = padding
+        i = key + self.capacity
+        self.values[ i ] = value
 
-    def get( self ):
-        return self.padding
+        while i > 1:
+            i //= 2
+            self.values[ i ] = MinTree._min( self.values[ 2 * i ], self.values[ 2 * i + 1 ] )
+
+    def find_min( self, key ):
+        precondition( key >= 0 )
+
+        result = None
+
+        begin = key + self.capacity
+        end = 2 * self.capacity
+
+        while begin < end:
+            if begin % 2 == 1:
+                result = MinTree._min( result, self.values[ begin ] )
+                begin += 1
+
+            if end % 2 == 1:
+                end -= 1
+                result = MinTree._min( result, self.values[ end ] )
+
+            begin //= 2
+            end //= 2
+
+        return result
+
+    # details
+
+    def _grow( self, key ):
+        capacity = self.capacity
+
+        while capacity <= key:
+            capacity *= 2
+
+        values = [ None ] * ( 2 * capacity )
+        values[ capacity : capacity + self.capacity ] = self.values[ self.capacity : ]
+
+        for i in range( capacity - 1, 0, -1 ):
+            values[ i ] = MinTree._min( values[ 2 * i ], values[ 2 * i + 1 ] )
+
+        self.capacity = capacity
+        self.values = values
+
+    @staticmethod
+    def _min( value1, value2 ):
+        if value1 == None:
+            return value2
+
+        if value2 == None:
+            return value1
+
+        return min( value1, value2 )
+
+#
+# PaddingIndex keeps paddings of MemberList in buckets, one per alignment and usable size,
+# each of them is sorted by offset. MinTree of each alignment keeps the first offset of each
+# usable size, so the first padding of struct matching a member is found without walking
+# through the list or through the buckets
+#
+class PaddingIndex:
+    ALIGNMENTS = ( 1, 2, 4, 8 )
+
+    def __init__( self ):
+        self.paddings = {}
+        self.buckets = dict( ( alignment, {} ) for alignment in PaddingIndex.ALIGNMENTS )
+        self.first_offsets = dict( ( alignment, MinTree() ) for alignment in PaddingIndex.ALIGNMENTS )
+
+    def __len__( self ):
+        return len( self.paddings )
+
+    def add( self, padding ):
+        this_offset = padding.get_this_offset()
+
+        precondition( this_offset not in self.paddings )
+
+        self.paddings[ this_offset ] = padding
+
+        for ( alignment, bucket ) in self.buckets.items():
+            usable_size = PaddingIndex._get_usable_size( padding, alignment )
+
+            if usable_size <= 0:
+                continue
+
+            offsets = bucket.setdefault( usable_size, [] )
+            insort( offsets, this_offset )
+
+            self.first_offsets[ alignment ].set( usable_size, offsets[ 0 ] )
+
+    def remove( self, padding ):
+        this_offset = padding.get_this_offset()
+
+        if self.paddings.get( this_offset ) is not padding:
+            return
+
+        del self.paddings[ this_offset ]
+
+        for ( alignment, bucket ) in self.buckets.items():
+            usable_size = PaddingIndex._get_usable_size( padding, alignment )
+
+            if usable_size <= 0:
+                continue
+
+            offsets = bucket[ usable_size ]
+            del offsets[ bisect_left( offsets, this_offset ) ]
+
+            if len( offsets ) == 0:
+                del bucket[ usable_size ]
+                self.first_offsets[ alignment ].set( usable_size, None )
+            else:
+                self.first_offsets[ alignment ].set( usable_size, offsets[ 0 ] )
+
+    def find( self, size, alignment ):
+        if len( self.paddings ) == 0:
+            return None
+
+        precondition( TypeSize.validate( size ) )
+        precondition( Alignment.validate_value( alignment ) )
+
+        # the first of paddings of usable size not less than size
+        this_offset = self.first_offsets[ alignment ].find_min( size )
+
+        if this_offset == None:
+            return None
+
+        return self.paddings[ this_offset ]
+
+    # details
+
+    @staticmethod
+    def _get_usable_size( padding, alignment ):
+        padding_this = padding.get_this_offset()
+        padding_this_aligned = Alignment.get_aligned_up( padding_this, alignment )
+
+        return padding.get_size() - ( padding_this_aligned - padding_this )
 
 class NodeToTypeConversionVisitor( INodeVisitor ):
     def __init__( self ):
@@ -1554,7 +2347,11 @@ class NodeToTypeConversionVisitor( INodeVisitor ):
         type = member.get_type()
         this_offset = member.get_this_offset()
 
-        self.type = Member( name, None, None, type, this_offset )
+        # bit fields are packed as any other member
+        if type.__class__ == BitFieldsType:
+            self.type = BitFields( type, this_offset )
+        else:
+            self.type = Member( name, member.file_id, member.line_no, type, this_offset )
 
     def visit_inheritance_node( self, inheritance, * args ):
         self.type = Inheritance( inheritance.get_type(), inheritance.get_this_offset() )
@@ -1573,6 +2370,8 @@ class MemberList:
         self.members_front = HeadNode()
         self.members_back = self.members_front
 
+        self.paddings = PaddingIndex()
+
     def print( self ):
         head = self.members_front
 
@@ -1588,13 +2387,30 @@ class MemberList:
     def back( self ):
         return self.members_back
 
+    def find_padding( self, size, alignment ):
+        return self.paddings.find( size, alignment )
+
+    def set_padding( self, padding, this_offset, size ):
+        self.paddings.remove( padding )
+
+        padding.set_this_offset( this_offset )
+        padding.set_size( size )
+
+        self.paddings.add( padding )
+
     def append( self, node ):
         node.prev = self.members_back
         self.members_back.next = node
 
         self.members_back = node
 
+        if node.__class__ == PaddingNode:
+            self.paddings.add( node )
+
     def pop_back( self ):
+        if self.members_back.__class__ == PaddingNode:
+            self.paddings.remove( self.members_back )
+
         self.members_back = self.members_back.prev
         self.members_back.next.prev = None
         self.members_back.next = None
@@ -1604,6 +2420,9 @@ class MemberList:
             self.pop_back()
             return None
 
+        if node.__class__ == PaddingNode:
+            self.paddings.remove( node )
+
         node.prev.next = node.next
         node.next.prev = node.prev
 
@@ -1624,6 +2443,9 @@ class MemberList:
             node.prev = pos
             pos.next = node
 
+            if node.__class__ == PaddingNode:
+                self.paddings.add( node )
+
 #
 # StructCompacter
 #
@@ -1657,6 +2479,7 @@ class StructCompacter:
 
             result = StructType( struct.get_name(), packed_struct_size )
             try_set_alignment( result, struct.get_alignment() )
+            result.set_is_pod( struct.get_is_pod() )
             result.set_members( StructCompacter._convert_nodes_to_members( self.members.front().next ) )
 
             return result
@@ -1753,7 +2576,7 @@ class StructCompacter:
 
     def _add_back_padding( self ):
         struct_end = self.members.back().get_end()
-        aligned_struct_end = Alignment.get_aligned_up( struct_end, self.struct.get_alignment() )
+        aligned_struct_end = self._get_aligned_struct_end( struct_end )
 
         back_padding_size = aligned_struct_end - struct_end
 
@@ -1766,18 +2589,28 @@ class StructCompacter:
     def _process_member_end( self, tail, end ):
         self._add_back_padding()
 
+    def _get_aligned_struct_end( self, struct_end ):
+        node = self.members.front()
+
+        # tail padding of base may be reused, but derived class is not smaller than base
+        while node:
+            if node.__class__ == InheritanceNode:
+                struct_end = max( struct_end, node.get_this_offset() + node.get_type().get_size() )
+
+            node = node.next
+
+        return Alignment.get_aligned_up( struct_end, self.struct.get_alignment() )
+
     def _process_padding_end( self, tail, end ):
         back_padding_this_offset = tail.get_this_offset()
-        aligned_struct_end \
-            = Alignment.get_aligned_up( back_padding_this_offset, self.struct.get_alignment() )
+        aligned_struct_end = self._get_aligned_struct_end( back_padding_this_offset )
 
         back_padding_new_size = aligned_struct_end - back_padding_this_offset
-        back_padding_new_size = back_padding_new_size % self.struct.get_alignment()
 
         if back_padding_new_size == 0:
             self.members.pop_back()
         elif tail.get_size() != back_padding_new_size:
-            tail.get_type().set_size( back_padding_new_size )
+            self.members.set_padding( tail, tail.get_this_offset(), back_padding_new_size )
 
     def _process_padding_padding( self, tail, padding ):
         total_padding_size = tail.get_size() + padding.get_size()
@@ -1786,14 +2619,13 @@ class StructCompacter:
         if total_padding_size == 0:
             self.members.pop_back()
         elif tail.get_size() != total_padding_size:
-            tail.get_type().set_size( total_padding_size )
+            self.members.set_padding( tail, tail.get_this_offset(), total_padding_size )
 
     def _process_padding_member( self, tail, member ):
         member_size = member.get_size()
-        member_alignment = member.get_type().get_alignment()
+        member_alignment = StructCompacter._get_alignment( member )
 
-        found_padding \
-            = StructCompacter._find_matching_padding( self.members.front(), member_size, member_alignment )
+        found_padding = self.members.find_padding( member_size, member_alignment )
 
         if found_padding != None:
             self._move_member_into_padding( found_padding, member )
@@ -1808,8 +2640,8 @@ class StructCompacter:
 
     def _process_member_member( self, tail, member ):
         member_size = member.get_size()
-        member_alignment = member.get_type().get_alignment()
-        padding_node = self._find_matching_padding( self.members.front(), member_size, member_alignment )
+        member_alignment = StructCompacter._get_alignment( member )
+        padding_node = self.members.find_padding( member_size, member_alignment )
 
         if padding_node == None:
             self._add_unaligned_member( member )
@@ -1843,7 +2675,12 @@ class StructCompacter:
     #
 
     def _pack_members( self ):
-        for member in self.struct.get_members():
+        members = self.struct.get_members()
+
+        if any( member.__class__ == BitFields for member in members ):
+            members = self._regroup_bit_fields( members )
+
+        for member in members:
             tail = self.members.back()
             node = self._convert_to_node( member )
 
@@ -1853,13 +2690,49 @@ class StructCompacter:
 
         self.dispatch( self.members.back(), EndNode() )
 
+    def _regroup_bit_fields( self, members ):
+        # all bit fields are packed into one BitFields, put in place of the first of them, and
+        # members are laid out again, so paddings match alignments as they do in original struct
+        bit_fields = [ field for member in members if member.__class__ == BitFields \
+            for field in member.get_type().get_fields() ]
+
+        result = []
+        end = 0
+
+        for member in members:
+            if member.__class__ == Padding:
+                continue
+
+            if member.__class__ == BitFields:
+                if len( bit_fields ) == 0:
+                    continue
+
+                member = BitFields( BitFieldsType.pack( bit_fields ), None )
+                bit_fields = []
+
+            this_offset = Alignment.get_aligned_up( end, StructCompacter._get_alignment( member ) )
+
+            if this_offset != end:
+                result.append( Padding( PaddingType( this_offset - end ), end ) )
+
+            result.append( member )
+            end = this_offset + member.get_size()
+
+        struct_end = Alignment.get_aligned_up( end, self.struct.get_alignment() )
+
+        if struct_end != end:
+            result.append( Padding( PaddingType( struct_end - end ), end ) )
+
+        return result
+
     def _try_shrink_padding_right( self, padding, member ):
-        if Alignment.is_aligned( padding.get_this_offset(), member.get_type().get_alignment() ):
+        if Alignment.is_aligned( padding.get_this_offset(), StructCompacter._get_alignment( member ) ):
             self.members.pop_back()
-        elif padding.get_size() < member.get_type().get_alignment():
+        elif padding.get_size() < StructCompacter._get_alignment( member ):
             return False
         else:
-            padding.get_type().set_size( padding.get_size() % member.get_type().get_alignment() )
+            self.members.set_padding( padding, padding.get_this_offset(), \
+                padding.get_size() % StructCompacter._get_alignment( member ) )
 
         self._add_unaligned_member( member )
 
@@ -1872,7 +2745,7 @@ class StructCompacter:
         return aligned_struct_size
 
     def _add_unaligned_member( self, member ):
-        member.set_this_offset( self._get_aligned_struct_size( member.get_type().get_alignment() ) )
+        member.set_this_offset( self._get_aligned_struct_size( StructCompacter._get_alignment( member ) ) )
 
         alignment_padding = self._get_alignment_padding( member )
 
@@ -1905,7 +2778,7 @@ class StructCompacter:
 
     def _move_member_into_not_exact_match_padding( self, padding, member ):
         member_new_this_offset \
-            = Alignment.get_aligned_up( padding.get_this_offset(), member.get_type().get_alignment() )
+            = Alignment.get_aligned_up( padding.get_this_offset(), StructCompacter._get_alignment( member ) )
 
         front_padding_this_offset = padding.get_this_offset()
         front_padding_size = member_new_this_offset - front_padding_this_offset
@@ -1918,7 +2791,7 @@ class StructCompacter:
         member.set_this_offset( member_new_this_offset )
 
         if front_padding_size != 0 and right_padding_size != 0:
-            padding.set_size( member_new_this_offset - padding.this_offset )
+            self.members.set_padding( padding, padding.get_this_offset(), front_padding_size )
 
             new_padding = PaddingNode( PaddingType( right_padding_size ), back_padding_this_offset )
 
@@ -1926,466 +2799,4542 @@ class StructCompacter:
             self.members.insert( member, new_padding )
 
         elif front_padding_size != 0:
-            padding.set_size( front_padding_size )
+            self.members.set_padding( padding, padding.get_this_offset(), front_padding_size )
 
             self.members.insert( padding, member )
 
         elif right_padding_size != 0:
-            padding.set_size( right_padding_size )
-            padding.set_this_offset( padding.get_this_offset() + member.get_size() )
+            self.members.set_padding( padding, back_padding_this_offset, right_padding_size )
 
             self.members.insert( padding.prev, member )
 
     @staticmethod
-    def _find_matching_padding( head, size, alignment ):
-        visitor = FindMatchingPaddingVisitor( size, alignment )
-
-        while head:
-            head.accept( visitor )
-
-            if visitor.get():
-                return visitor.get()
+    def _get_alignment( member ):
+        # arrays of types never fixed have no alignment, the same one as OptimalStructCompacter's is taken
+        alignment = get_effective_alignment( member.get_type() )
 
-            head = head.next
+        if alignment == None:
+            raise TypeNotWellDefinedError( 'Alignment of member at (%s) is unknown' % member.get_this_offset() )
 
-        return None
+        return alignment
 
 #
-# FixSizeAlignmentVisitor
+# OptimalStructCompacter finds order of members with the least padding
 #
-class FixSizeAlignmentVisitor( ITypeVisitor ):
-    def __init__( self ):
-        ITypeVisitor.__init__( self )
+# Members of the same alignment and the same size modulo 8 are interchangeable, so they are
+# grouped into classes and orders of classes are searched with memoization on (offset modulo 8,
+# members left). Once offset is aligned to the greatest alignment left, members sorted by
+# descending alignment need no padding, so the search stops there. Bases and vptr stay where
+# they are, members are placed after them.
+#
+class SearchBudgetExceededError( StructCompacterError ):
+    def __init__( self, message ):
+        StructCompacterError.__init__( self, message )
 
-    def visit_struct_type( self, struct, * args ):
-        fix_types_size_and_alignment( struct )
+class OptimalStructCompacter:
+    MAX_DEPTH = 500
 
-#
-# FindPaddingVisitor
-#
-class FindPaddingVisitor( ITypeVisitor ):
-    def __init__( self ):
-        ITypeVisitor.__init__( self )
+    def __init__( self, budget = 1.0 ):
+        precondition( budget > 0 )
 
-    def visit_struct_type( self, struct, * args ):
-        find_and_create_padding_members( struct )
+        self.budget = budget
+        self.deadline = None
+        self.memo = None
+        self.classes = None
 
-#
-# CompactStructVisitor
-#
-class CompactStructVisitor( ITypeVisitor ):
-    def __init__( self ):
-        ITypeVisitor.__init__( self )
+    def process( self, struct ):
+        if struct.get_is_valid() == False:
+            return None
 
-        self.packed = None
+        if self._is_packed( struct ):
+            return None
 
-    def visit_struct_type( self, struct, * args ):
-        if self._skip_type( struct ):
-            self.packed = None
-        else:
-            self.packed = StructCompacter().process( struct )
+        ( fixed, movable ) = OptimalStructCompacter._split_members( struct.get_members() )
 
-    def get_and_reset( self ):
-        result = self.packed
-        self.packed = None
+        if movable == None or len( movable ) > OptimalStructCompacter.MAX_DEPTH:
+            return StructCompacter().process( struct )
 
-        return result
+        fixed_end = max( [ member.get_this_offset() + member.get_size() for member in fixed ] + [ 0 ] )
 
-    def clear( self ):
-        self.packed = None
+        try:
+            movable = self._order_members( fixed_end, movable )
+        except SearchBudgetExceededError:
+            return StructCompacter().process( struct )
 
-    # details
+        result_members = []
+        end = 0
 
-    def _skip_type( self, struct ):
-        if TypeName.is_stl_internal( struct.get_name() ):
-            return True
+        for member in fixed:
+            this_offset = member.get_this_offset()
 
-        if TypeName.is_template( struct.get_name() ):
-            if is_template_param_dependent( struct ):
-                return True
+            if this_offset > end:
+                result_members.append( Padding( PaddingType( this_offset - end ), end ) )
 
-        return False
+            result_members.append( copy_member( member, this_offset ) )
+            end = max( end, this_offset + member.get_size() )
 
-#
-# Utils for DIE
-#
-class DIE:
-    @staticmethod
-    def is_struct( die ):
-        return die.tag in ( 'DW_TAG_class_type', 'DW_TAG_structure_type' )
+        for member in movable:
+            this_offset = Alignment.get_aligned_up( end, OptimalStructCompacter._get_alignment( member ) )
 
-    @staticmethod
-    def is_static( die ):
-        return 'DW_AT_external' in die.attributes
+            if this_offset != end:
+                result_members.append( Padding( PaddingType( this_offset - end ), end ) )
 
-    @staticmethod
-    def is_member( die ):
-        if die.tag != 'DW_TAG_member':
-            return False
-        elif DIE.is_static( die ):
+            result_members.append( copy_member( member, this_offset ) )
+            end = this_offset + member.get_size()
+
+        # tail padding of base may be reused, but derived class is not smaller than base
+        bases_end = max( [ member.get_this_offset() + member.get_type().get_size() \
+            for member in fixed if member.__class__ == Inheritance ] + [ end ] )
+
+        packed_struct_size = Alignment.get_aligned_up( bases_end, struct.get_alignment() )
+
+        if packed_struct_size != end:
+            result_members.append( Padding( PaddingType( packed_struct_size - end ), end ) )
+
+        result = StructType( struct.get_name(), packed_struct_size )
+        try_set_alignment( result, struct.get_alignment() )
+        result.set_is_pod( struct.get_is_pod() )
+        result.set_members( result_members )
+
+        if self._is_better( result, struct ) == False:
+            return None
+
+        return result
+
+    #
+    # details
+    #
+
+    def _is_packed( self, struct ):
+        if any( member.__class__ == BitFields for member in struct.get_members() ):
             return False
-        else:
-            return True
 
-    @staticmethod
-    def get_name( die, dies ):
-        try:
-            return DIE._get_name_impl( die )
-        except KeyError:
-            pass
+        return calculate_total_padding( struct ) < struct.get_alignment()
 
-        try:
-            return DIE._get_name_from_specification( die, dies )
-        except KeyError:
-            pass
+    def _order_members( self, this_offset, members ):
+        return self._find_order( this_offset, members )
 
-        return 'anonymous'
+    def _is_better( self, packed, struct ):
+        return packed.get_size() < struct.get_size()
 
     @staticmethod
-    def get_size( die ):
-        try:
-            return die.attributes[ 'DW_AT_size' ].value
-        except KeyError:
-            pass
-
-        try:
-            return die.attributes[ 'DW_AT_byte_size' ].value
-        except KeyError:
-            pass
+    def _get_end( this_offset, members ):
+        for member in members:
+            this_offset = Alignment.get_aligned_up( this_offset, OptimalStructCompacter._get_alignment( member ) )
+            this_offset += member.get_size()
 
-        return None
+        return this_offset
+
+    @staticmethod
+    def _split_members( members ):
+        # returns bases and vptr leading the struct and all other members, movable is None
+        # if a base follows data members, such layouts are left to StructCompacter
+        fixed = []
+        movable = []
+        bit_fields = []
+
+        for member in members:
+            if member.__class__ == Padding:
+                continue
+
+            if member.__class__ in [ Inheritance, EBOInheritance ] or TypeName.is_vptr( member.get_name() ):
+                if movable or bit_fields:
+                    return ( fixed, None )
+
+                fixed.append( member )
+            elif member.__class__ == BitFields:
+                bit_fields.extend( member.get_type().get_fields() )
+            elif member.get_size() == 0:
+                return ( fixed, None )
+            else:
+                movable.append( member )
+
+        if bit_fields:
+            movable.append( BitFields( BitFieldsType.pack( bit_fields ), None ) )
+
+        return ( fixed, movable )
+
+    @staticmethod
+    def _get_alignment( member ):
+        alignment = get_effective_alignment( member.get_type() )
+
+        if alignment == None:
+            alignment = Alignment.get_from_sizeof( member.get_size() )
+
+        return alignment
+
+    def _find_order( self, this_offset, members ):
+        classes = OrderedDict()
+
+        # stable sort, members of equal alignment keep their order
+        members = sorted( members, key = lambda member: -OptimalStructCompacter._get_alignment( member ) )
+
+        for member in members:
+            key = ( OptimalStructCompacter._get_alignment( member ), member.get_size() % 8 )
+            classes.setdefault( key, [] ).append( member )
+
+        self.classes = list( classes.items() )
+        self.memo = {}
+        self.deadline = time.time() + self.budget
+
+        counts = tuple( len( class_members ) for ( key, class_members ) in self.classes )
+        self._search( this_offset % 8, counts )
+
+        # follow the best choices, members of each class are taken in the order they came
+        result = []
+        taken = [ 0 ] * len( self.classes )
+        offset = this_offset % 8
+
+        while True:
+            ( padding, choice ) = self.memo.get( ( offset, counts ), ( 0, None ) )
+
+            if choice == None:
+                break
+
+            ( ( alignment, size ), class_members ) = self.classes[ choice ]
+
+            result.append( class_members[ taken[ choice ] ] )
+            taken[ choice ] += 1
+
+            offset = ( Alignment.get_aligned_up( offset, alignment ) + size ) % 8
+            counts = counts[ : choice ] + ( counts[ choice ] - 1, ) + counts[ choice + 1 : ]
+
+        # the rest needs no padding in descending order of alignment
+        for ( i, ( key, class_members ) ) in enumerate( self.classes ):
+            result.extend( class_members[ taken[ i ] : ] )
+
+        return result
+
+    def _search( self, offset, counts ):
+        # returns the least padding needed to place members left, memo keeps it with a choice
+        key = ( offset, counts )
+
+        if key in self.memo:
+            return self.memo[ key ][ 0 ]
+
+        alignments = [ self.classes[ i ][ 0 ][ 0 ] for i in range( len( counts ) ) if counts[ i ] ]
+
+        if len( alignments ) == 0 or offset % max( alignments ) == 0:
+            return 0
+
+        if len( self.memo ) % 1024 == 0 and time.time() > self.deadline:
+            raise SearchBudgetExceededError( 'Search exceeded budget of %s second(s)' % self.budget )
+
+        choices = []
+
+        for i in range( len( counts ) ):
+            if counts[ i ] == 0:
+                continue
+
+            ( alignment, size ) = self.classes[ i ][ 0 ]
+            this_offset = Alignment.get_aligned_up( offset, alignment )
+            choices.append( ( this_offset - offset, i, ( this_offset + size ) % 8 ) )
+
+        best = None
+
+        for ( padding, i, next_offset ) in sorted( choices ):
+            if best != None and padding >= best[ 0 ]:
+                break
+
+            next_counts = counts[ : i ] + ( counts[ i ] - 1, ) + counts[ i + 1 : ]
+            total = padding + self._search( next_offset, next_counts )
+
+            if best == None or total < best[ 0 ]:
+                best = ( total, i )
+
+            if total == 0:
+                break
+
+        self.memo[ key ] = best
+
+        return best[ 0 ]
+
+#
+# CacheLineStructCompacter puts members accessed according to profile in front, the most
+# accessed first, so they share as few cache lines as possible, other members follow them.
+# Layout is accepted if it touches less lines on hot path or if it is smaller.
+#
+class CacheLineStructCompacter( OptimalStructCompacter ):
+    def __init__( self, counts, cache_line = 64, budget = 1.0 ):
+        OptimalStructCompacter.__init__( self, budget )
+
+        precondition( cache_line > 0 )
+
+        self.counts = counts
+        self.cache_line = cache_line
+
+    def count_hot_lines( self, struct ):
+        lines = set()
+
+        for member in struct.get_members():
+            if self._get_count( member ) == 0 or member.get_size() == 0:
+                continue
+
+            first_line = member.get_this_offset() // self.cache_line
+            last_line = ( member.get_this_offset() + member.get_size() - 1 ) // self.cache_line
+
+            lines.update( range( first_line, last_line + 1 ) )
+
+        return len( lines )
+
+    # details
+
+    def _is_packed( self, struct ):
+        return False
+
+    def _order_members( self, this_offset, members ):
+        hot = [ member for member in members if self._get_count( member ) > 0 ]
+        cold = [ member for member in members if self._get_count( member ) == 0 ]
+
+        # members of the same class are taken in order they come, the most accessed first
+        hot = self._find_order( this_offset, sorted( hot, key = lambda member: -self._get_count( member ) ) )
+        cold = self._find_order( OptimalStructCompacter._get_end( this_offset, hot ), cold )
+
+        return hot + cold
+
+    def _is_better( self, packed, struct ):
+        packed_lines = self.count_hot_lines( packed )
+        struct_lines = self.count_hot_lines( struct )
+
+        if packed_lines != struct_lines:
+            return packed_lines < struct_lines
+
+        return packed.get_size() < struct.get_size()
+
+    def _get_count( self, member ):
+        if member.__class__ == BitFields:
+            return max( self.counts.get( field.get_name(), 0 ) for field in member.get_type().get_fields() )
+
+        return self.counts.get( member.get_name(), 0 )
+
+#
+# FixSizeAlignmentVisitor
+#
+class FixSizeAlignmentVisitor( ITypeVisitor ):
+    def __init__( self ):
+        ITypeVisitor.__init__( self )
+
+    def visit_struct_type( self, struct, * args ):
+        fix_types_size_and_alignment( struct )
+
+#
+# FindPaddingVisitor
+#
+class FindPaddingVisitor( ITypeVisitor ):
+    def __init__( self ):
+        ITypeVisitor.__init__( self )
+
+    def visit_struct_type( self, struct, * args ):
+        find_and_create_padding_members( struct )
+
+#
+# CompactStructVisitor
+#
+class CompactStructVisitor( ITypeVisitor ):
+    def __init__( self, engine = 'greedy', budget = 1.0, profile = None, cache_line = 64 ):
+        ITypeVisitor.__init__( self )
+
+        self.engine = engine
+        self.budget = budget
+        self.profile = profile
+        self.cache_line = cache_line
+        self.packed = None
+
+        # structs embedded by value are packed before structs embedding them, each of them once
+        self.packed_structs = {}
+
+    def visit_struct_type( self, struct, * args ):
+        self.packed = self._pack( struct )
+
+    def get_and_reset( self ):
+        result = self.packed
+        self.packed = None
+
+        return result
+
+    def clear( self ):
+        self.packed = None
+
+    def get_skip_reason( self, struct ):
+        if struct.get_is_valid() == False:
+            return 'invalid'
+
+        if TypeName.is_stl_internal( struct.get_name() ):
+            return 'STL internal'
+
+        if TypeName.is_template( struct.get_name() ):
+            if is_template_param_dependent( struct ):
+                return 'template dependent'
+
+        return None
+
+    # details
+
+    def _pack( self, struct ):
+        if struct in self.packed_structs:
+            return self.packed_structs[ struct ]
+
+        # embedded structs go first, without recursion since nesting may be deep
+        for nested in self._get_embedded_structs_in_post_order( struct ):
+            try:
+                self.packed_structs[ nested ] = self._pack_impl( nested )
+            except StructCompacterError:
+                self.packed_structs[ nested ] = None
+
+        packed = self._pack_impl( struct )
+        self.packed_structs[ struct ] = packed
+
+        return packed
+
+    def _pack_impl( self, struct ):
+        if self._skip_type( struct ):
+            return None
+
+        embedding = self._embed_packed_structs( struct )
+        packed = self._get_compacter( struct ).process( embedding )
+
+        # smaller embedded structs may be the only saving
+        if packed == None and embedding.get_size() < struct.get_size():
+            return embedding
+
+        return packed
+
+    def _get_embedded_structs_in_post_order( self, struct ):
+        result = []
+        visited = set( [ struct ] )
+        stack = [ ( struct, iter( struct.get_members() ) ) ]
+
+        while len( stack ) > 0:
+            ( parent, members ) = stack[ -1 ]
+            member = next( members, None )
+
+            if member == None:
+                stack.pop()
+
+                if parent is not struct:
+                    result.append( parent )
+
+                continue
+
+            nested = get_embedded_struct( member.get_type() )
+
+            if nested == None or nested in visited or nested in self.packed_structs:
+                continue
+
+            visited.add( nested )
+            stack.append( ( nested, iter( nested.get_members() ) ) )
+
+        return result
+
+    def _get_compacter( self, struct ):
+        counts = None
+
+        if self.profile != None:
+            counts = self.profile.get_counts( struct.get_name() )
+
+        if counts != None:
+            return CacheLineStructCompacter( counts, self.cache_line, self.budget )
+        elif self.engine == 'optimal':
+            return OptimalStructCompacter( self.budget )
+        else:
+            return StructCompacter()
+
+    def _get_packed_type( self, type ):
+        if type.__class__ == StructType:
+            return self.packed_structs.get( type )
+
+        if type.__class__ in ( ConstType, VolatileType ):
+            wrapped = self._get_packed_type( type.get_type() )
+
+            if wrapped == None:
+                return None
+
+            result = type.__class__( wrapped )
+            result.set_alignment( get_effective_alignment( wrapped ) )
+
+            return result
+
+        if type.__class__ != ArrayType or type.get_size() == None:
+            return None
+
+        element = self._get_packed_type( type.get_type() )
+
+        if element == None:
+            return None
+
+        ( count, rest ) = divmod( type.get_size(), type.get_type().get_size() )
+
+        if rest != 0:
+            return None
+
+        return ArrayType( element, count )
+
+    def _embed_packed_structs( self, struct ):
+        # members are laid out as declared, with packed structs in place of embedded ones
+        if struct.get_is_valid() == False:
+            return struct
+
+        members = [ member for member in struct.get_members() if member.__class__ != Padding ]
+        types = [ self._get_packed_type( member.get_type() ) for member in members ]
+
+        if all( type == None for type in types ):
+            return struct
+
+        result_members = []
+        end = 0
+        bases_end = 0
+
+        for ( member, type ) in zip( members, types ):
+            # packed struct keeps alignment of original one
+            if member.__class__ == EBOInheritance:
+                this_offset = end
+            elif member.__class__ == BitFields:
+                this_offset = Alignment.get_aligned_up( end, member.get_type().get_storage_alignment() )
+            else:
+                this_offset = Alignment.get_aligned_up( end, OptimalStructCompacter._get_alignment( member ) )
+
+            member = copy_member( member, this_offset, type )
+            result_members.append( member )
+
+            end = max( end, this_offset + member.get_size() )
+
+            if member.__class__ == Inheritance:
+                bases_end = max( bases_end, this_offset + member.get_type().get_size() )
+
+        size = Alignment.get_aligned_up( max( end, bases_end ), struct.get_alignment() )
+
+        result = StructType( struct.get_name(), size )
+        result.set_alignment( struct.get_alignment() )
+        result.set_is_pod( struct.get_is_pod() )
+
+        try:
+            result.set_members( result_members )
+            find_and_create_padding_members( result )
+        except TypeNotWellDefinedError:
+            return struct
+
+        return result
+
+    def _skip_type( self, struct ):
+        return self.get_skip_reason( struct ) not in ( None, 'invalid' )
+
+#
+# StructDeduplicator keeps one canonical StructType per layout. Fingerprint of struct is made of
+# fingerprints of types of its members, so structs embedding different layouts of the same name differ.
+#
+def get_wrapped_type( type ):
+    # derived types wrap one type each, typedefs are resolved while DWARF is read
+    if type.__class__ in ( ConstType, VolatileType, ArrayType, PtrType, RefType ):
+        return type.type
+
+    return None
+
+def make_type_fingerprint( type ):
+    wrappers = []
+
+    while type.__class__ in ( ConstType, VolatileType, ArrayType ):
+        wrappers.append( ( type.__class__.__name__, type.get_size() ) )
+        type = type.get_type()
+
+    if type.__class__ == StructType:
+        layout = type.get_fingerprint()
+    elif type.__class__ == BitFieldsType:
+        layout = tuple( ( field.get_name(), field.get_bit_offset(), field.get_bit_size() \
+            , make_type_fingerprint( field.get_type() ) ) for field in type.get_fields() )
+    else:
+        # pointed types are told by name only, pointers may form cycles
+        layout = ( type.__class__.__name__, type.get_name(), type.get_size() )
+
+    return ( tuple( wrappers ), layout )
+
+def make_struct_fingerprint( struct ):
+    # fingerprints of structs embedded in struct have to be made first
+    members = tuple( \
+        ( member.__class__.__name__ \
+            , member.get_name() \
+            , member.get_this_offset() \
+            , make_type_fingerprint( member.get_type() ) ) \
+        for member in struct.get_members() )
+
+    layout = ( struct.get_qualified_name(), struct.get_size(), struct.get_is_pod(), members )
+
+    # digest keeps fingerprint flat however deep structs are nested
+    return hashlib.sha1( repr( layout ).encode( 'utf-8' ) ).hexdigest()
+
+def set_struct_fingerprints( structs ):
+    for struct in iter_structs_in_post_order( structs ):
+        struct.set_fingerprint( make_struct_fingerprint( struct ) )
+
+class StructDeduplicator( ITypeVisitor ):
+    def __init__( self ):
+        ITypeVisitor.__init__( self )
+
+        self.canonical = {}
+        self.replaced = {}
+
+    def visit_struct_type( self, struct, * args ):
+        fingerprint = struct.get_fingerprint()
+
+        if fingerprint == None:
+            return
+
+        canonical = self.canonical.setdefault( fingerprint, struct )
+
+        if canonical is not struct:
+            self.replaced[ id( struct ) ] = canonical
+
+    def process( self, items ):
+        items = list( items )
+
+        # duplicates of previous items are told by canonical structs, replaced ones are of these items
+        self.replaced = {}
+
+        for id, type in items:
+            type.accept( self )
+
+        unique_types = OrderedDict()
+
+        for id, type in items:
+            if self.is_replaced( type ):
+                continue
+
+            self._canonicalize_members( type )
+            unique_types[ id ] = type
+
+        return unique_types
+
+    def is_replaced( self, type ):
+        return id( type ) in self.replaced
+
+    def get_canonical( self, type ):
+        return self.replaced.get( id( type ), type )
+
+    # details
+
+    def _canonicalize_members( self, type ):
+        if type.__class__ == StructType:
+            for member in type.get_members():
+                self._canonicalize( member, member.get_type() )
+        elif get_wrapped_type( type ) != None:
+            self._canonicalize( type, get_wrapped_type( type ) )
+
+    def _canonicalize( self, holder, type ):
+        # duplicates may be wrapped in derived types, pointers included
+        while not self.is_replaced( type ):
+            wrapped = get_wrapped_type( type )
+
+            if wrapped == None:
+                return
+
+            ( holder, type ) = ( type, wrapped )
+
+        holder.type = self.get_canonical( type )
+
+#
+# TypeFilter matches type names given with --types, common prefix may end with asterix
+#
+class TypeFilter:
+    def __init__( self, patterns ):
+        self.names = set()
+        self.prefixes = []
+
+        for pattern in patterns:
+            if pattern[ -1 ] == '*':
+                self.prefixes.append( pattern[ 0 : -1 ] )
+            else:
+                self.names.add( pattern )
+
+    def is_empty( self ):
+        return len( self.names ) == 0 and len( self.prefixes ) == 0
+
+    def matches( self, name ):
+        if self.is_empty():
+            return True
+
+        if name in self.names:
+            return True
+
+        for prefix in self.prefixes:
+            if name.startswith( prefix ):
+                return True
+
+        return False
+
+#
+# read_csv_rows yields rows of CSV file with given number of columns, lines starting with #
+# are skipped
+#
+def read_csv_rows( file, columns ):
+    for row in csv.reader( file ):
+        if len( row ) == 0 or row[ 0 ].lstrip().startswith( '#' ):
+            continue
+
+        if len( row ) != len( columns ):
+            raise StructCompacterError( 'Line %s of %s has to be: %s' \
+                % ( ','.join( row ), file.name, ','.join( columns ) ) )
+
+        yield [ item.strip() for item in row ]
+
+#
+# AccessProfile keeps access counts of members read from --profile file, one member per line
+# as: struct,member,count. Lines with no number (headers) are skipped.
+#
+class AccessProfile:
+    def __init__( self, file_name ):
+        self.counts = {}
+
+        if file_name == None:
+            return
+
+        try:
+            with open( file_name, 'r' ) as file:
+                self._read( file )
+        except ( IOError, OSError ) as error:
+            raise StructCompacterError( 'Profile %s can not be read, %s' % ( file_name, error ) )
+
+    def is_empty( self ):
+        return len( self.counts ) == 0
+
+    def get_counts( self, struct_name ):
+        return self.counts.get( struct_name )
+
+    # details
+
+    def _read( self, file ):
+        for ( struct_name, member_name, count ) in read_csv_rows( file, ( 'struct', 'member', 'count' ) ):
+            try:
+                count = int( float( count ) )
+            except ValueError:
+                continue
+
+            counts = self.counts.setdefault( struct_name, {} )
+            counts[ member_name ] = counts.get( member_name, 0 ) + count
+
+#
+# InstanceCounts keeps numbers of live instances of types read from --instances file, one type
+# per line as: type,count. Types are named with theirs scopes, lines with no number (headers) are skipped.
+#
+class InstanceCounts:
+    def __init__( self, file_name ):
+        self.counts = {}
+
+        if file_name == None:
+            return
+
+        try:
+            with open( file_name, 'r' ) as file:
+                self._read( file )
+        except ( IOError, OSError ) as error:
+            raise StructCompacterError( 'Instances %s can not be read, %s' % ( file_name, error ) )
+
+    def is_empty( self ):
+        return len( self.counts ) == 0
+
+    def get_count( self, struct ):
+        # types of other scopes may have the same name, counts are kept by qualified names
+        return self.counts.get( struct.get_qualified_name() )
+
+    def get_saving( self, struct, packed ):
+        # bytes saved by all instances, None if number of instances is unknown
+        count = self.get_count( struct )
+
+        if count == None:
+            return None
+
+        return count * ( struct.get_size() - packed.get_size() )
+
+    def rank( self, packed_structs ):
+        # the greatest saving first, types of unknown number of instances go last
+        def key( item ):
+            ( struct, packed ) = item
+            saving = self.get_saving( struct, packed )
+
+            if saving == None:
+                return ( 1, packed.get_size() - struct.get_size() )
+
+            return ( 0, -saving )
+
+        if self.is_empty():
+            return packed_structs
+
+        return sorted( packed_structs, key = key )
+
+    # details
+
+    def _read( self, file ):
+        for ( type_name, count ) in read_csv_rows( file, ( 'type', 'count' ) ):
+            try:
+                count = int( float( count ) )
+            except ValueError:
+                continue
+
+            # profilers may name types of global scope with leading ::
+            if type_name.startswith( '::' ):
+                type_name = type_name[ 2 : ]
+
+            self.counts[ type_name ] = self.counts.get( type_name, 0 ) + count
+
+#
+# SavingsSummary aggregates structs one by one as files are processed. It keeps the top ones and
+# counters only, so its memory does not grow with number of structs.
+#
+class SavingsSummary:
+    MAX_HOLE_SIZE = 16
+
+    def __init__( self, top ):
+        self.top = top
+        self.count = 0
+
+        # min-heaps of ( saving, -count, name, size, packed size ), the best ones stay
+        self.by_bytes = []
+        self.by_percent = []
+
+        self.structs = 0
+        self.packed_structs = 0
+        self.total_size = 0
+        self.total_padding = 0
+        self.recoverable_padding = 0
+
+        # alignment of member after hole (of struct for tail padding) -> hole size -> count
+        self.holes = {}
+
+        # ( phase, reason ) -> count
+        self.skipped = OrderedDict()
+
+    def add_struct( self, struct, packed ):
+        padding = calculate_total_padding( struct )
+
+        self.structs += 1
+        self.total_size += struct.get_size()
+        self.total_padding += padding
+        self._add_holes( struct )
+
+        if packed == None:
+            return
+
+        self.packed_structs += 1
+        self.recoverable_padding += max( 0, padding - calculate_total_padding( packed ) )
+
+        self.count += 1
+        saving = struct.get_size() - packed.get_size()
+        item = ( struct.get_name(), struct.get_size(), packed.get_size() )
+
+        self._push( self.by_bytes, ( saving, -self.count ) + item )
+        self._push( self.by_percent, ( 100.0 * saving / struct.get_size(), -self.count ) + item )
+
+    def add_skipped( self, phase, reason ):
+        key = ( phase, reason )
+        self.skipped[ key ] = self.skipped.get( key, 0 ) + 1
+
+    def print_summary( self ):
+        print( 'Summary:' )
+        print( 'Structs: %d, packed: %d' % ( self.structs, self.packed_structs ) )
+        print( 'Size: %d bytes, padding: %d bytes (%.1f%%), recoverable: %d bytes (%.1f%% of padding)' \
+            % ( self.total_size, self.total_padding, SavingsSummary._get_percent( self.total_padding, \
+                self.total_size ), self.recoverable_padding, SavingsSummary._get_percent( \
+                    self.recoverable_padding, self.total_padding ) ) )
+
+        print( 'Top %d by bytes saved:' % self.top )
+
+        for ( saving, order, name, size, packed_size ) in sorted( self.by_bytes, reverse = True ):
+            print( '  {%s}(%d/%d) %d bytes' % ( name, size, packed_size, saving ) )
+
+        print( 'Top %d by percent saved:' % self.top )
+
+        for ( percent, order, name, size, packed_size ) in sorted( self.by_percent, reverse = True ):
+            print( '  {%s}(%d/%d) %.1f%%' % ( name, size, packed_size, percent ) )
+
+        print( 'Holes by alignment of next member as size:count, %d stands for %d and more:' \
+            % ( SavingsSummary.MAX_HOLE_SIZE, SavingsSummary.MAX_HOLE_SIZE ) )
+
+        for alignment in sorted( self.holes, key = lambda alignment: ( alignment == None, alignment ) ):
+            sizes = self.holes[ alignment ]
+
+            print( '  %s: %s' % ( '?' if alignment == None else alignment, ' '.join( '%d:%d' \
+                % ( size, sizes[ size ] ) for size in sorted( sizes ) ) ) )
+
+        if len( self.skipped ) == 0:
+            return
+
+        print( 'Skipped types:' )
+
+        for ( ( phase, reason ), count ) in self.skipped.items():
+            print( '  %s, %s: %d' % ( phase, reason, count ) )
+
+    # details
+
+    def _push( self, heap, item ):
+        if len( heap ) < self.top:
+            heapq.heappush( heap, item )
+        else:
+            heapq.heappushpop( heap, item )
+
+    def _add_holes( self, struct ):
+        members = struct.get_members()
+
+        for ( index, member ) in enumerate( members ):
+            if member.__class__ != Padding:
+                continue
+
+            if index + 1 < len( members ):
+                alignment = members[ index + 1 ].get_type().get_alignment()
+            else:
+                alignment = struct.get_alignment()
+
+            sizes = self.holes.setdefault( alignment, {} )
+            size = min( member.get_size(), SavingsSummary.MAX_HOLE_SIZE )
+            sizes[ size ] = sizes.get( size, 0 ) + 1
+
+    @staticmethod
+    def _get_percent( part, whole ):
+        if whole == 0:
+            return 0.0
+
+        return 100.0 * part / whole
+
+#
+# Report streams one record per packed struct to one file (or stdout) as JSON Lines or CSV, to
+# be read by other tools instead of text layout of *.sc files
+#
+def get_record_members( struct ):
+    # bit fields are listed one by one since the greedy engine may merge their storage
+    result = []
+
+    for member in struct.get_members():
+        if member.__class__ == Padding:
+            continue
+
+        if member.__class__ == BitFields:
+            for field in member.get_type().get_fields():
+                result.append( ( field.get_name(), get_full_name( field.get_type() ), None, \
+                    member.get_this_offset(), field.get_bit_offset(), field.get_bit_size() ) )
+        else:
+            result.append( ( member.get_name(), get_full_name( member.get_type() ), member.get_size(), \
+                member.get_this_offset(), None, None ) )
+
+    return result
+
+def get_member_keys( members ):
+    # bases share names, the n-th of them is told apart by its number
+    counts = {}
+    result = []
+
+    for member in members:
+        name = member[ 0 ]
+        counts[ name ] = counts.get( name, 0 ) + 1
+        result.append( ( name, counts[ name ] ) )
+
+    return result
+
+def get_full_name( type ):
+    # name decorated as in text output (eg. int[?]), not abbreviated
+    return type.get_name( len( type.get_name() ) + 4 + type._get_decoration_size() )
+
+def get_paddings( struct ):
+    return [ [ member.get_this_offset(), member.get_size() ] for member in struct.get_members() \
+        if member.__class__ == Padding ]
+
+def make_struct_record( struct, packed ):
+    members = get_record_members( struct )
+    packed_members = get_record_members( packed )
+
+    keys = get_member_keys( members )
+    indexes = dict( ( key, index ) for ( index, key ) in enumerate( keys ) )
+
+    # i-th member of packed struct is permutation[ i ]-th member of struct
+    permutation = [ indexes.get( key ) for key in get_member_keys( packed_members ) ]
+
+    record = OrderedDict()
+    record[ 'type' ] = struct.get_qualified_name()
+    record[ 'old_size' ] = struct.get_size()
+    record[ 'new_size' ] = packed.get_size()
+    record[ 'saving' ] = struct.get_size() - packed.get_size()
+    record[ 'old_padding' ] = calculate_total_padding( struct )
+    record[ 'new_padding' ] = calculate_total_padding( packed )
+    record[ 'permutation' ] = permutation
+    record[ 'members' ] = []
+
+    for ( ( name, type, size, this_offset, bit_offset, bit_size ), index ) in zip( packed_members, permutation ):
+        if index == None:
+            old = ( None, None )
+        else:
+            old = ( members[ index ][ 3 ], members[ index ][ 4 ] )
+
+        record[ 'members' ].append( OrderedDict( [
+            ( 'name', name ),
+            ( 'type', type ),
+            ( 'size', size ),
+            ( 'old_offset', old[ 0 ] ),
+            ( 'new_offset', this_offset ),
+            ( 'bit_size', bit_size ),
+            ( 'old_bit_offset', old[ 1 ] ),
+            ( 'new_bit_offset', bit_offset ) ] ) )
+
+    record[ 'old_paddings' ] = get_paddings( struct )
+    record[ 'new_paddings' ] = get_paddings( packed )
+
+    return record
+
+class IReport:
+    def __init__( self, file_name ):
+        if file_name == None:
+            self.file = sys.stdout
+            return
+
+        try:
+            self.file = open( file_name, 'w', newline = '' )
+        except ( IOError, OSError ) as error:
+            raise StructCompacterError( 'Output %s can not be created, %s' % ( file_name, error ) )
+
+    def write( self, record ):
+        pass
+
+    def close( self ):
+        if self.file == sys.stdout:
+            self.file.flush()
+        else:
+            self.file.close()
+
+class JSONLinesReport( IReport ):
+    def __init__( self, file_name ):
+        IReport.__init__( self, file_name )
+
+    def write( self, record ):
+        self.file.write( json.dumps( record ) + '\n' )
+
+class CSVReport( IReport ):
+    COLUMNS = ( 'type', 'old_size', 'new_size', 'saving', 'old_padding', 'new_padding', 'instances', \
+        'instances_saving', 'permutation', 'names', 'types', 'sizes', 'old_offsets', 'new_offsets', \
+        'bit_sizes', 'old_bit_offsets', 'new_bit_offsets', 'old_paddings', 'new_paddings' )
+
+    def __init__( self, file_name ):
+        IReport.__init__( self, file_name )
+
+        self.writer = csv.writer( self.file )
+        self.writer.writerow( CSVReport.COLUMNS )
+
+    def write( self, record ):
+        members = record[ 'members' ]
+
+        # lists are kept in one column each, items separated by semicolon
+        def join( items ):
+            return ';'.join( '' if item == None else str( item ) for item in items )
+
+        row = dict( record )
+        row[ 'permutation' ] = join( record[ 'permutation' ] )
+        row[ 'names' ] = join( member[ 'name' ] for member in members )
+        row[ 'types' ] = join( member[ 'type' ] for member in members )
+        row[ 'sizes' ] = join( member[ 'size' ] for member in members )
+        row[ 'old_offsets' ] = join( member[ 'old_offset' ] for member in members )
+        row[ 'new_offsets' ] = join( member[ 'new_offset' ] for member in members )
+        row[ 'bit_sizes' ] = join( member[ 'bit_size' ] for member in members )
+        row[ 'old_bit_offsets' ] = join( member[ 'old_bit_offset' ] for member in members )
+        row[ 'new_bit_offsets' ] = join( member[ 'new_bit_offset' ] for member in members )
+        row[ 'old_paddings' ] = join( '%d:%d' % tuple( padding ) for padding in record[ 'old_paddings' ] )
+        row[ 'new_paddings' ] = join( '%d:%d' % tuple( padding ) for padding in record[ 'new_paddings' ] )
+
+        self.writer.writerow( [ '' if row.get( column ) == None else row[ column ] \
+            for column in CSVReport.COLUMNS ] )
+
+def open_report( format, file_name ):
+    if format == 'jsonl':
+        return JSONLinesReport( file_name )
+
+    if format == 'csv':
+        return CSVReport( file_name )
+
+    return None
+
+#
+# Output keeps text files (*.sc) in current directory or, with --archive, in one zip archive.
+# Central directory of zip is its table of contents, so one file is extracted without reading
+# the others (eg.: unzip -p layouts.zip MyType.sc).
+#
+class OutputDirectory:
+    def write( self, file_name, lines ):
+        with open( file_name, 'w' ) as file:
+            file.write( ''.join( line + '\n' for line in lines ) )
+
+    def get_location( self ):
+        return None
+
+    def close( self ):
+        pass
+
+class OutputArchive:
+    BUFFER_SIZE = 4 * 1024 * 1024
+
+    def __init__( self, file_name ):
+        self.file_name = file_name
+        self.names = set()
+
+        try:
+            self.file = open( file_name, 'wb', OutputArchive.BUFFER_SIZE )
+        except ( IOError, OSError ) as error:
+            raise StructCompacterError( 'Archive %s can not be created, %s' % ( file_name, error ) )
+
+        self.archive = zipfile.ZipFile( self.file, 'w', zipfile.ZIP_DEFLATED )
+
+    def write( self, file_name, lines ):
+        # zip may keep the same name twice, the first one (the best ranked) is kept only
+        if file_name in self.names:
+            return
+
+        self.names.add( file_name )
+        self.archive.writestr( file_name, ''.join( line + '\n' for line in lines ) )
+
+    def get_location( self ):
+        return self.file_name
+
+    def close( self ):
+        self.archive.close()
+        self.file.close()
+
+def open_output( archive_name ):
+    if archive_name == None:
+        return OutputDirectory()
+
+    return OutputArchive( archive_name )
+
+#
+# SourceFiles resolves index of file of declaration (DW_AT_decl_file) through file table of line
+# program of compilation unit. Paths relative to compilation directory are looked up in
+# --source-dir instead, if it is given.
+#
+def to_str( value ):
+    if isinstance( value, bytes ):
+        return bytes2str( value )
+
+    return value
+
+class SourceFiles:
+    def __init__( self, file_name, source_dir = None ):
+        self.source_dir = source_dir
+        self.file_tables = {}
+
+        with open( file_name, 'rb' ) as file:
+            self.dwarf_info = open_ELF_file( file ).get_dwarf_info()
+            self.cus = list( self.dwarf_info.iter_CUs() )
+
+        self.cu_offsets = [ cu.cu_offset for cu in self.cus ]
+
+    def get_path( self, die_offset, file_id ):
+        # path to file and its name in diff, None if it is not known
+        index = bisect_right( self.cu_offsets, die_offset ) - 1
+
+        if index < 0:
+            return None
+
+        cu = self.cus[ index ]
+
+        # types of type units (.debug_types) are not in any compilation unit
+        if die_offset >= cu.cu_offset + cu.size:
+            return None
+
+        # type units of DWARF 5 are, pyelftools can not read them
+        if cu.header.get( 'unit_type' ) in ( DWARFUnitType.TYPE, DWARFUnitType.SPLIT_TYPE ):
+            return None
+
+        if cu.cu_offset not in self.file_tables:
+            self.file_tables[ cu.cu_offset ] = self._read_file_table( cu )
+
+        files = self.file_tables[ cu.cu_offset ]
+
+        if file_id < 0 or file_id >= len( files ) or files[ file_id ] == None:
+            return None
+
+        return files[ file_id ]
+
+    # details
+
+    def _read_file_table( self, cu ):
+        line_program = self.dwarf_info.line_program_for_CU( cu )
+
+        if line_program == None:
+            return []
+
+        top_die = cu.get_top_DIE()
+
+        if 'DW_AT_comp_dir' in top_die.attributes:
+            comp_dir = to_str( top_die.attributes[ 'DW_AT_comp_dir' ].value )
+        else:
+            comp_dir = ''
+
+        version = line_program.header[ 'version' ]
+        directories = [ to_str( directory ) for directory in line_program.header[ 'include_directory' ] ]
+        files = []
+
+        # before DWARF 5 compilation directory is not listed and files are counted from 1
+        if version < 5:
+            directories.insert( 0, comp_dir )
+            files.append( None )
+
+        for entry in line_program.header[ 'file_entry' ]:
+            directory = os.path.join( comp_dir, directories[ entry.dir_index ] )
+            files.append( self._make_path( comp_dir, os.path.join( directory, to_str( entry.name ) ) ) )
+
+        return files
+
+    def _make_path( self, comp_dir, path ):
+        path = os.path.normpath( path )
+        label = os.path.relpath( path, comp_dir ) if comp_dir != '' else path
+
+        # files out of compilation directory (eg.: system headers) are kept as they are
+        if label.startswith( os.pardir ):
+            return ( path, path )
+
+        if self.source_dir != None:
+            path = os.path.join( self.source_dir, label )
+
+        return ( path, label )
+
+#
+# SourcePatch reorders declarations of members in source files as in packed structs, all changes
+# are written as one unified diff. Each member has to be declared on a line of its own, only
+# blank lines and comments may be between them.
+#
+def get_declarations( struct ):
+    # declared members in order of layout as ( name, file_id, line_no )
+    result = []
+
+    for member in struct.get_members():
+        if member.__class__ == Member:
+            result.append( ( member.get_name(), member.file_id, member.line_no ) )
+        elif member.__class__ == BitFields:
+            for field in sorted( member.get_type().get_fields(), key = lambda field: field.get_bit_offset() ):
+                result.append( ( field.get_name(), field.get_file_id(), field.get_line_no() ) )
+
+    return result
+
+def get_bases( struct ):
+    return [ member.get_type().get_name() for member in struct.get_members() \
+        if member.__class__ in ( Inheritance, EBOInheritance ) ]
+
+def strip_line_comment( text ):
+    index = text.find( '//' )
+
+    if index != -1:
+        text = text[ : index ]
+
+    return text.strip()
+
+def is_comment_or_blank( text ):
+    text = text.strip()
+
+    return text == '' or text.startswith( '//' ) or text.startswith( '/*' ) or text.startswith( '*' )
+
+class SourcePatch:
+    def __init__( self ):
+        # path -> [ label, lines, reordered lines, lines taken already ]
+        self.files = OrderedDict()
+        self.reordered = 0
+
+        # structs laid out in patched sources as packed ones are
+        self.structs = set()
+
+    def add( self, struct, packed, path ):
+        # returns reason why declarations can not be reordered, None if they are
+        if get_bases( struct ) != get_bases( packed ):
+            return 'bases are reordered'
+
+        declarations = get_declarations( struct )
+        packed_declarations = get_declarations( packed )
+
+        if sorted( declarations ) != sorted( packed_declarations ):
+            return 'members differ'
+
+        if declarations == packed_declarations:
+            self.structs.add( id( struct ) )
+            return None
+
+        if len( set( file_id for ( name, file_id, line_no ) in declarations ) ) != 1:
+            return 'members are declared in many files'
+
+        lines = [ line_no for ( name, file_id, line_no ) in declarations ]
+
+        if min( lines ) < 1 or len( set( lines ) ) != len( lines ):
+            return 'members do not have lines of their own'
+
+        if path == None:
+            return 'file of declaration is unknown'
+
+        try:
+            ( label, source, reordered, taken ) = self._get_file( path )
+        except ( IOError, OSError ) as error:
+            return 'source can not be read, %s' % error
+
+        reason = self._check_lines( source, declarations, taken )
+
+        if reason != None:
+            return reason
+
+        # declaration moves with comments and blank lines above it
+        blocks = {}
+        begin = SourcePatch._get_comments_begin( source, min( lines ) )
+
+        for line_no in sorted( lines ):
+            blocks[ line_no ] = source[ begin - 1 : line_no ]
+            begin = line_no + 1
+
+        begin = SourcePatch._get_comments_begin( source, min( lines ) )
+        end = max( lines )
+
+        reordered[ begin - 1 : end ] = \
+            [ text for ( name, file_id, line_no ) in packed_declarations for text in blocks[ line_no ] ]
+
+        taken.update( range( begin, end + 1 ) )
+        self.reordered += 1
+        self.structs.add( id( struct ) )
+
+        return None
+
+    def get_reordered( self ):
+        return self.reordered
+
+    def contains( self, struct ):
+        return id( struct ) in self.structs
+
+    def write( self, file ):
+        for ( path, ( label, source, reordered, taken ) ) in self.files.items():
+            if len( taken ) == 0:
+                continue
+
+            file.writelines( difflib.unified_diff( source, reordered, 'a/' + label, 'b/' + label ) )
+
+    # details
+
+    def _get_file( self, path ):
+        ( path, label ) = path
+
+        if path not in self.files:
+            with open( path, 'r', newline = '', errors = 'replace' ) as file:
+                source = file.read().splitlines( True )
+
+            # line with no end of line can not be moved
+            if len( source ) > 0 and not source[ -1 ].endswith( '\n' ):
+                source[ -1 ] += '\n'
+
+            self.files[ path ] = [ label, source, list( source ), set() ]
+
+        return self.files[ path ]
+
+    @staticmethod
+    def _get_comments_begin( source, line_no ):
+        # comments just above the first declaration, no blank line between
+        while line_no > 1 and source[ line_no - 2 ].strip() != '' \
+            and is_comment_or_blank( source[ line_no - 2 ] ):
+            line_no -= 1
+
+        return line_no
+
+    def _check_lines( self, source, declarations, taken ):
+        lines = [ line_no for ( name, file_id, line_no ) in declarations ]
+
+        if max( lines ) > len( source ):
+            return 'source is out of date'
+
+        begin = SourcePatch._get_comments_begin( source, min( lines ) )
+
+        if len( taken.intersection( range( begin, max( lines ) + 1 ) ) ) > 0:
+            return 'lines are reordered already for other struct'
+
+        for ( name, file_id, line_no ) in declarations:
+            text = strip_line_comment( source[ line_no - 1 ] )
+
+            if not re.search( r'\b%s\b' % re.escape( name ), text ):
+                return 'member %s is not found at line %d' % ( name, line_no )
+
+            if not text.endswith( ';' ) or text.count( ';' ) != 1:
+                return 'member %s is not the only declaration at line %d' % ( name, line_no )
+
+        for line_no in range( min( lines ), max( lines ) ):
+            if line_no not in lines and not is_comment_or_blank( source[ line_no - 1 ] ):
+                return 'line %d is between declarations' % line_no
+
+        return None
+
+#
+# LayoutGuards keeps sizes, alignments and offsets of members of packed structs as static
+# assertions in a header for C and C++, so compilation fails once a layout changes. Structs are
+# named through typedefs since commas of template arguments would split arguments of macros.
+#
+def is_type_name( name ):
+    # types of anonymous namespaces and unnamed ones can not be named out of their file
+    for part in re.split( r'::(?![^<]*>)', name ):
+        if not re.match( r'^[A-Za-z_]\w*(<.*>)?$', part ) or part.startswith( 'anonymous' ):
+            return False
+
+    return True
+
+def iter_nested_types( type ):
+    # type, types it is made of and types of their members, each of them once
+    stack = [ type ]
+    visited = set( stack )
+
+    while len( stack ) > 0:
+        type = stack.pop()
+
+        yield type
+
+        if type.__class__ in ( ConstType, VolatileType, ArrayType ):
+            nested = [ type.get_type() ]
+        elif type.__class__ == StructType:
+            nested = [ member.get_type() for member in type.get_members() ]
+        elif type.__class__ == BitFieldsType:
+            nested = [ field.get_type() for field in type.get_fields() ]
+        else:
+            nested = []
+
+        for nested_type in nested:
+            if nested_type not in visited:
+                visited.add( nested_type )
+                stack.append( nested_type )
+
+def has_exact_size( type ):
+    # sizes of arrays without bounds are taken from offsets of members after them, they may include padding
+    return not any( nested.__class__ == ArrayType and nested.get_count() == None \
+        for nested in iter_nested_types( type ) )
+
+def has_exact_alignment( type ):
+    # alignments of unions are taken from their offsets and the ones of types never fixed from their
+    # sizes, they are the greatest possible ones only, base types are known up to 8 bytes
+    for nested in iter_nested_types( type ):
+        if nested.__class__ in ( BaseType, EnumType, PtrType, RefType ):
+            if nested.get_size() not in ( 1, 2, 4, 8 ):
+                return False
+        elif nested.__class__ == StructType:
+            if nested.get_alignment() == None:
+                return False
+        elif nested.__class__ not in ( ConstType, VolatileType, ArrayType, BitFieldsType, PaddingType ):
+            return False
+
+    return True
+
+def has_bounded_alignment( type ):
+    # alignments greater than 8 bytes are not known, so struct may be bigger than packed one then
+    for nested in iter_nested_types( type ):
+        if nested.get_size() != None and nested.get_size() > 8 \
+                and nested.__class__ in ( BaseType, EnumType, PtrType, RefType ):
+            return False
+
+    return True
+
+class LayoutGuards:
+    def __init__( self, file_name ):
+        self.file_name = file_name
+        self.names = set()
+        self.lines = []
+
+    def add( self, struct, packed ):
+        # the same name is guarded once, the first one (the best ranked) is kept only
+        name = struct.get_qualified_name()
+
+        if name in self.names or not is_type_name( name ):
+            return False
+
+        self.names.add( name )
+
+        typedef_name = 'sc_%s_%d' % ( self._get_guard().lower(), len( self.names ) )
+
+        self.lines.append( '' )
+        self.lines.append( '/* {%s}(%d/%d) */' % ( name, struct.get_size(), packed.get_size() ) )
+        self.lines.append( 'typedef struct %s %s;' % ( name, typedef_name ) )
+
+        # only what the packed layout is sure of is asserted, compiler may lay out bit fields and
+        # members after bases closer than packed struct does, smaller arrays never make it bigger
+        exact_alignment = has_exact_alignment( packed )
+        exact_members = not any( member.__class__ in ( BitFields, Inheritance, EBOInheritance ) \
+            for member in packed.get_members() )
+
+        if exact_alignment and exact_members and has_exact_size( packed ):
+            self.lines.append( 'SC_ASSERT( sizeof( %s ) == %d );' % ( typedef_name, packed.get_size() ) )
+        elif has_bounded_alignment( packed ):
+            self.lines.append( 'SC_ASSERT( sizeof( %s ) <= %d );' % ( typedef_name, packed.get_size() ) )
+
+        if exact_alignment and packed.get_alignment() != None:
+            self.lines.append( 'SC_ASSERT( SC_ALIGNOF( %s ) == %d );' % ( typedef_name, packed.get_alignment() ) )
+
+        # offsetof needs standard layout and access to members
+        if not packed.get_is_pod():
+            return True
+
+        # offsets are known up to the first member of inexact size or alignment or bit fields
+        for member in packed.get_members():
+            if member.__class__ == BitFields or not has_exact_alignment( member.get_type() ):
+                break
+
+            if member.__class__ == Member and re.match( r'^[A-Za-z_]\w*$', member.get_name() ):
+                self.lines.append( 'SC_ASSERT( offsetof( %s, %s ) == %d );' \
+                    % ( typedef_name, member.get_name(), member.get_this_offset() ) )
+
+            if not has_exact_size( member.get_type() ):
+                break
+
+        return True
+
+    def get_count( self ):
+        return len( self.names )
+
+    def write( self, file ):
+        guard = self._get_guard()
+
+        lines = [
+            '/* Layouts of packed structs, generated by StructCompacter */',
+            '',
+            '#ifndef SC_LAYOUT_%s' % guard,
+            '#define SC_LAYOUT_%s' % guard,
+            '',
+            '#include <stddef.h>',
+            '',
+            '#ifdef __cplusplus',
+            '#define SC_ASSERT( condition ) static_assert( condition, #condition )',
+            '#define SC_ALIGNOF( type ) alignof( type )',
+            '#else',
+            '#define SC_ASSERT( condition ) _Static_assert( condition, #condition )',
+            '#define SC_ALIGNOF( type ) _Alignof( type )',
+            '#endif' ] + self.lines + [
+            '',
+            '#undef SC_ASSERT',
+            '#undef SC_ALIGNOF',
+            '',
+            '#endif' ]
+
+        file.write( ''.join( line + '\n' for line in lines ) )
+
+    # details
+
+    def _get_guard( self ):
+        # other headers of guards may be included too, names of them differ
+        return re.sub( r'\W', '_', os.path.basename( self.file_name ) ).upper()
+
+#
+# Utils for DIE
+#
+class DIE:
+    @staticmethod
+    def is_struct( die ):
+        return die.tag in ( 'DW_TAG_class_type', 'DW_TAG_structure_type' )
+
+    @staticmethod
+    def is_static( die ):
+        return 'DW_AT_external' in die.attributes
+
+    @staticmethod
+    def is_member( die ):
+        if die.tag != 'DW_TAG_member':
+            return False
+        elif DIE.is_static( die ):
+            return False
+        else:
+            return True
+
+    @staticmethod
+    def get_name( die, dies ):
+        try:
+            return DIE._get_name_impl( die )
+        except KeyError:
+            pass
+
+        try:
+            return DIE._get_name_from_specification( die, dies )
+        except KeyError:
+            pass
+
+        return 'anonymous'
+
+    @staticmethod
+    def get_size( die ):
+        try:
+            return die.attributes[ 'DW_AT_size' ].value
+        except KeyError:
+            pass
+
+        try:
+            return die.attributes[ 'DW_AT_byte_size' ].value
+        except KeyError:
+            pass
+
+        return None
+
+    @staticmethod
+    def get_element_count( die, dies ):
+        # elements of all dimensions of array, None if any bound is not a positive constant
+        count = None
+
+        for child in dies.iter_children( die ):
+            if child.tag != 'DW_TAG_subrange_type':
+                continue
+
+            dimension = DIE._get_subrange_count( child )
+
+            if dimension == None or dimension <= 0:
+                return None
+
+            count = dimension if count == None else count * dimension
+
+        return count
 
     @staticmethod
     def get_file_id( die ):
         try:
-            return die.attributes[ 'DW_AT_decl_file' ].value
+            return die.attributes[ 'DW_AT_decl_file' ].value
+        except KeyError:
+            return -1
+
+    @staticmethod
+    def get_line_number( die ):
+        if 'DW_AT_decl_line' in die.attributes:
+            return die.attributes[ 'DW_AT_decl_line' ].value
+        else:
+            return -1
+
+    @staticmethod
+    def get_type_id( die, dies ):
+        try:
+            return DIE.get_ref( die, 'DW_AT_type', dies )
+        except KeyError:
+            pass
+
+        try:
+            return DIE._get_type_id_from_specification( die, dies )
+        except KeyError:
+            pass
+
+        return None
+
+    @staticmethod
+    def get_ref( die, attr_name, dies = None ):
+        attr = die.attributes[ attr_name ]
+
+        if attr.form == 'DW_FORM_ref_addr':
+            return attr.value
+
+        # types kept in type units are referred to by signature
+        if attr.form == 'DW_FORM_ref_sig8':
+            precondition( dies != None )
+            return dies.get_type_offset( attr.value )
+
+        # DW_FORM_ref1/2/4/8/udata are relative to the beginning of CU
+        return attr.value + die.cu.cu_offset
+
+    @staticmethod
+    def get_this_offset( die ):
+        attr = die.attributes[ 'DW_AT_data_member_location' ]
+
+        # since DWARF 3 offset may be a constant instead of DW_OP_plus_uconst expression
+        if isinstance( attr.value, int ):
+            return attr.value
+
+        return decode( attr.value[1:] )
+
+    @staticmethod
+    def is_bit_field( die ):
+        return 'DW_AT_bit_size' in die.attributes
+
+    @staticmethod
+    def get_bit_size( die ):
+        return die.attributes[ 'DW_AT_bit_size' ].value
+
+    @staticmethod
+    def get_bit_offset( die, type_size, little_endian ):
+        bit_size = DIE.get_bit_size( die )
+
+        # DWARF 4 counts bits from the beginning of struct
+        if 'DW_AT_data_bit_offset' in die.attributes:
+            return die.attributes[ 'DW_AT_data_bit_offset' ].value
+
+        if 'DW_AT_data_member_location' in die.attributes:
+            this_offset = DIE.get_this_offset( die )
+        else:
+            this_offset = 0
+
+        # DWARF 2 and 3 count bits from the most significant bit of storage unit
+        try:
+            bit_offset = die.attributes[ 'DW_AT_bit_offset' ].value
+        except KeyError:
+            bit_offset = 0
+
+        storage_size = DIE.get_size( die )
+
+        if storage_size == None:
+            storage_size = type_size
+
+        if storage_size == None:
+            raise TypeNotWellDefinedError( 'Storage size of bit field at (%x) is unknown' % die.offset )
+
+        if little_endian:
+            return this_offset * 8 + storage_size * 8 - bit_offset - bit_size
+        else:
+            return this_offset * 8 + bit_offset
+
+    @staticmethod
+    def is_template( die, dies ):
+        return TypeName.is_template( DIE.get_name( die, dies ) )
+
+    @staticmethod
+    def is_stl( die, dies ):
+        return TypeName.is_stl_internal( DIE.get_name( die, dies ) )
+
+    @staticmethod
+    def is_local_type( die ):
+        # todo
+        return False
+
+    @staticmethod
+    def is_inheritance( die ):
+        return die.tag == 'DW_TAG_inheritance'
+
+    @staticmethod
+    def is_subprogram( die ):
+        return die.tag == 'DW_TAG_subprogram'
+
+    @staticmethod
+    def is_artificial( die ):
+        return 'DW_AT_artificial' in die.attributes
+
+    # DW_ACCESS_public, DW_ACCESS_protected, DW_ACCESS_private
+    ( ACCESS_PUBLIC, ACCESS_PROTECTED, ACCESS_PRIVATE ) = range( 1, 4 )
+
+    @staticmethod
+    def get_default_accessibility( die ):
+        # members of class are private unless given otherwise
+        if die.tag == 'DW_TAG_class_type':
+            return DIE.ACCESS_PRIVATE
+        else:
+            return DIE.ACCESS_PUBLIC
+
+    @staticmethod
+    def get_accessibility( die, default ):
+        try:
+            return die.attributes[ 'DW_AT_accessibility' ].value
+        except KeyError:
+            return default
+
+    @staticmethod
+    def is_declaration( die ):
+        return 'DW_AT_declaration' in die.attributes
+
+    @staticmethod
+    def is_scope( die ):
+        return die.tag in ( \
+            'DW_TAG_namespace' \
+            , 'DW_TAG_class_type' \
+            , 'DW_TAG_structure_type' \
+            , 'DW_TAG_union_type' \
+            , 'DW_TAG_subprogram' )
+
+    @staticmethod
+    def may_define_types( die ):
+        # children of these are never definitions of types, theirs subtrees are skipped
+        return die.tag not in ( \
+            'DW_TAG_enumeration_type' \
+            , 'DW_TAG_subroutine_type' \
+            , 'DW_TAG_array_type' \
+            , 'DW_TAG_formal_parameter' \
+            , 'DW_TAG_variable' \
+            , 'DW_TAG_member' \
+            , 'DW_TAG_call_site' \
+            , 'DW_TAG_GNU_call_site' \
+            , 'DW_TAG_GNU_template_parameter_pack' \
+            , 'DW_TAG_GNU_formal_parameter_pack' )
+
+    # details
+
+    @staticmethod
+    def _get_name_impl( die ):
+        return die.attributes[ 'DW_AT_name' ].value.decode( 'utf-8' )
+
+    @staticmethod
+    def _get_name_from_specification( die, dies ):
+        specification_id = DIE.get_ref( die, 'DW_AT_specification', dies )
+        specification_die = dies[ specification_id ]
+        result = DIE.get_name( specification_die, dies )
+
+        return result
+
+    @staticmethod
+    def _get_subrange_count( die ):
+        # bounds given by expressions (VLA) are not constants
+        if 'DW_AT_count' in die.attributes:
+            count = die.attributes[ 'DW_AT_count' ].value
+            return count if isinstance( count, int ) else None
+
+        if 'DW_AT_upper_bound' not in die.attributes:
+            return None
+
+        upper_bound = die.attributes[ 'DW_AT_upper_bound' ].value
+
+        if 'DW_AT_lower_bound' in die.attributes:
+            lower_bound = die.attributes[ 'DW_AT_lower_bound' ].value
+        else:
+            lower_bound = 0
+
+        if not isinstance( upper_bound, int ) or not isinstance( lower_bound, int ):
+            return None
+
+        return upper_bound - lower_bound + 1
+
+    @staticmethod
+    def _get_type_id_from_specification( die, dies ):
+        specification_id = DIE.get_ref( die, 'DW_AT_specification', dies )
+        specification_die = dies[ specification_id ]
+        result = DIE.get_type_id( specification_die, dies )
+
+        return result
+
+#
+# DIECache loads DIEs on demand by theirs offset in DWARF stream and keeps
+# only the most recently used ones, so memory does not grow with .debug_info
+#
+class DIECache:
+    def __init__( self, dwarf_info, max_size = 64 * 1024 ):
+        precondition( max_size > 0 )
+
+        self.dwarf_info = dwarf_info
+        self.max_size = max_size
+
+        if isinstance( dwarf_info, NativeDWARFInfo ):
+            self.die_class = NativeDIE
+            self.stream = None
+        else:
+            self.die_class = DWARFDIE
+            self.stream = dwarf_info.debug_info_sec.stream
+
+        self.dies = OrderedDict()
+
+        self.cus = None
+        self.cu_offsets = None
+
+    def __getitem__( self, offset ):
+        return self.get( offset )
+
+    def get( self, offset, cu = None ):
+        try:
+            die = self.dies[ offset ]
+            self.dies.move_to_end( offset )
+
+            return die
+        except KeyError:
+            pass
+
+        if cu == None:
+            cu = self.get_cu( offset )
+
+        die = self.die_class( cu, self.stream, offset )
+        self.dies[ offset ] = die
+
+        if len( self.dies ) > self.max_size:
+            self.dies.popitem( last = False )
+
+        return die
+
+    def get_type_offset( self, signature ):
+        # only native reader knows type units, KeyError as for any missing attribute
+        if not isinstance( self.dwarf_info, NativeDWARFInfo ):
+            raise KeyError( signature )
+
+        return self.dwarf_info.get_type_offset( signature )
+
+    def get_cu( self, offset ):
+        self._make_cus_index()
+
+        i = bisect_right( self.cu_offsets, offset ) - 1
+
+        if i < 0:
+            raise StructCompacterError( 'No CU contains DIE at offset (%x)' % offset )
+
+        return self.cus[ i ]
+
+    def iter_cus( self ):
+        self._make_cus_index()
+
+        return iter( self.cus )
+
+    def get_top_die( self, cu ):
+        return self.get( DIECache._get_top_die_offset( cu ), cu )
+
+    def iter_children( self, die ):
+        if not die.has_children:
+            return
+
+        offset = die.offset + die.size
+
+        while True:
+            child = self.get( offset, die.cu )
+
+            if child.tag == None:
+                return
+
+            yield child
+
+            offset = self._get_sibling_offset( child )
+
+    def get_parents( self, die ):
+        parents = []
+        parent = self.get_top_die( die.cu )
+
+        # descend from top DIE, subtrees not containing die are skipped by siblings
+        while parent.offset != die.offset:
+            parents.append( parent )
+
+            for child in self.iter_children( parent ):
+                if child.offset <= die.offset < self._get_sibling_offset( child ):
+                    parent = child
+                    break
+            else:
+                raise StructCompacterError( 'DIE at offset (%x) not found in its CU' % die.offset )
+
+        return parents
+
+    # details
+
+    def _make_cus_index( self ):
+        if self.cus != None:
+            return
+
+        # only CU headers are parsed here, DIEs are loaded later on demand
+        self.cus = list( self.dwarf_info.iter_CUs() )
+        self.cu_offsets = [ cu.cu_offset for cu in self.cus ]
+
+    def _get_sibling_offset( self, die ):
+        if not die.has_children:
+            return die.offset + die.size
+
+        # native DIEs are skipped by theirs abbreviations, without reading attributes
+        if isinstance( die, NativeDIE ):
+            return die.get_sibling_offset()
+
+        if 'DW_AT_sibling' in die.attributes:
+            return DIE.get_ref( die, 'DW_AT_sibling' )
+
+        # no DW_AT_sibling, skip whole subtree up to its null terminator
+        offset = die.offset + die.size
+        depth = 1
+
+        while depth > 0:
+            child = self.get( offset, die.cu )
+            offset = offset + child.size
+
+            if child.tag == None:
+                depth -= 1
+            elif child.has_children:
+                depth += 1
+
+        return offset
+
+    @staticmethod
+    def _get_top_die_offset( cu ):
+        try:
+            return cu.cu_die_offset
+        except AttributeError:
+            return cu.cu_offset + cu.structs.Dwarf_CU_header.sizeof()
+
+#
+# SectionReader reads integers, LEB128 numbers and strings from raw section data
+#
+class SectionReader:
+    FORMATS = { 1 : 'B', 2 : 'H', 4 : 'I', 8 : 'Q' }
+
+    def __init__( self, data, little_endian = True ):
+        self.data = data
+        self.endian = '<' if little_endian else '>'
+
+    def get_size( self ):
+        return len( self.data )
+
+    def read_uint( self, offset, size ):
+        value = unpack_from( self.endian + SectionReader.FORMATS[ size ], self.data, offset )[ 0 ]
+        return ( value, offset + size )
+
+    def read_uleb128( self, offset ):
+        result = 0
+        shift = 0
+
+        while True:
+            byte = self.data[ offset ]
+            offset += 1
+
+            result |= ( byte & 0x7F ) << shift
+            shift += 7
+
+            if byte & 0x80 == 0:
+                return ( result, offset )
+
+    def read_sleb128( self, offset ):
+        ( result, end ) = self.read_uleb128( offset )
+        bits = 7 * ( end - offset )
+
+        if result & ( 1 << ( bits - 1 ) ):
+            result -= 1 << bits
+
+        return ( result, end )
+
+    def read_cstring( self, offset ):
+        ( value, offset ) = self.read_cbytes( offset )
+        return ( bytes2str( value ), offset )
+
+    def read_cbytes( self, offset ):
+        end = offset
+
+        # data may be a memoryview, which has no find()
+        try:
+            while self.data[ end ] != 0:
+                end += 1
+        except IndexError:
+            raise StructCompacterError( 'String at offset (%x) is not terminated' % offset )
+
+        return ( bytes( self.data[ offset : end ] ), end + 1 )
+
+    def read_initial_length( self, offset ):
+        ( length, offset ) = self.read_uint( offset, 4 )
+
+        # 64-bit DWARF
+        if length == 0xffffffff:
+            ( length, offset ) = self.read_uint( offset, 8 )
+            return ( length, 8, offset )
+
+        return ( length, 4, offset )
+
+#
+# Name indexes (.debug_names, .gdb_index, .debug_pubtypes) map type names to DIEs,
+# so structs can be found by name without walking all DIEs
+#
+class INameIndex:
+    def __init__( self, section_name ):
+        self.section_name = section_name
+
+        # unqualified name -> [ ( qualified name, CU offset, DIE offset or None ) ]
+        self.entries = {}
+        self.cu_offsets = set()
+
+    def get_section_name( self ):
+        return self.section_name
+
+    def get_cu_offsets( self ):
+        return self.cu_offsets
+
+    def find( self, types_filter ):
+        result = []
+
+        for name in types_filter.names:
+            result.extend( self.entries.get( name, [] ) )
+
+        if len( types_filter.prefixes ) > 0:
+            for ( name, entries ) in self.entries.items():
+                if name not in types_filter.names and types_filter.matches( name ):
+                    result.extend( entries )
+
+        # the same order as DIEs are met by full walk
+        return sorted( set( result ), key = lambda entry: ( entry[ 1 ], entry[ 2 ] or 0 ) )
+
+    # details
+
+    def _add( self, name, cu_offset, die_offset ):
+        if len( name ) == 0:
+            return
+
+        self.entries.setdefault( TypeName.get_unqualified( name ), [] ) \
+            .append( ( name, cu_offset, die_offset ) )
+
+class PubTypesIndex( INameIndex ):
+    def __init__( self, section_name, data, little_endian ):
+        INameIndex.__init__( self, section_name )
+
+        # .debug_gnu_pubtypes has a flags byte after each DIE offset
+        self.is_gnu = section_name == '.debug_gnu_pubtypes'
+
+        self._read( SectionReader( data, little_endian ) )
+
+    # details
+
+    def _read( self, reader ):
+        offset = 0
+
+        while offset < reader.get_size():
+            ( length, offset_size, begin ) = reader.read_initial_length( offset )
+            end = begin + length
+
+            ( version, offset ) = reader.read_uint( begin, 2 )
+            ( cu_offset, offset ) = reader.read_uint( offset, offset_size )
+            ( cu_length, offset ) = reader.read_uint( offset, offset_size )
+
+            if version != 2:
+                raise StructCompacterError( 'Version (%d) of %s is not supported' \
+                    % ( version, self.section_name ) )
+
+            self.cu_offsets.add( cu_offset )
+
+            while offset < end:
+                ( die_offset, offset ) = reader.read_uint( offset, offset_size )
+
+                if die_offset == 0:
+                    break
+
+                if self.is_gnu:
+                    offset += 1
+
+                ( name, offset ) = reader.read_cstring( offset )
+
+                self._add( name, cu_offset, cu_offset + die_offset )
+
+            offset = end
+
+class GdbIndex( INameIndex ):
+    def __init__( self, section_name, data ):
+        INameIndex.__init__( self, section_name )
+
+        # .gdb_index is always little endian
+        self._read( SectionReader( data ) )
+
+    # details
+
+    def _read( self, reader ):
+        ( version, offset ) = reader.read_uint( 0, 4 )
+
+        if version < 4 or version > 8:
+            raise StructCompacterError( 'Version (%d) of %s is not supported' \
+                % ( version, self.section_name ) )
+
+        ( cu_list, offset ) = reader.read_uint( offset, 4 )
+        ( types_cu_list, offset ) = reader.read_uint( offset, 4 )
+        ( address_area, offset ) = reader.read_uint( offset, 4 )
+        ( symbol_table, offset ) = reader.read_uint( offset, 4 )
+        ( constant_pool, offset ) = reader.read_uint( offset, 4 )
+
+        cus = []
+
+        for entry in range( cu_list, types_cu_list, 16 ):
+            cus.append( reader.read_uint( entry, 8 )[ 0 ] )
+
+        self.cu_offsets.update( cus )
+
+        # .gdb_index knows only CUs of symbols, not DIEs
+        for slot in range( symbol_table, constant_pool, 8 ):
+            ( name_offset, offset ) = reader.read_uint( slot, 4 )
+            ( vector_offset, offset ) = reader.read_uint( offset, 4 )
+
+            if name_offset == 0 and vector_offset == 0:
+                continue
+
+            name = reader.read_cstring( constant_pool + name_offset )[ 0 ]
+            ( count, offset ) = reader.read_uint( constant_pool + vector_offset, 4 )
+
+            for i in range( count ):
+                ( cu_index, offset ) = reader.read_uint( offset, 4 )
+
+                # symbol kind is known since version 7, 1 is for types
+                if version >= 7 and ( cu_index >> 28 ) & 0x7 != 1:
+                    continue
+
+                cu_index &= 0xffffff
+
+                # entries of type units are skipped
+                if cu_index < len( cus ):
+                    self._add( name, cus[ cu_index ], None )
+
+class DebugNamesIndex( INameIndex ):
+    DW_IDX_compile_unit = 1
+    DW_IDX_type_unit = 2
+    DW_IDX_die_offset = 3
+
+    STRUCT_TAGS = ( 0x02, 0x13 ) # DW_TAG_class_type, DW_TAG_structure_type
+
+    def __init__( self, section_name, data, little_endian, dwarf_info ):
+        INameIndex.__init__( self, section_name )
+
+        self.dwarf_info = dwarf_info
+
+        self._read( SectionReader( data, little_endian ) )
+
+    # details
+
+    def _read( self, reader ):
+        offset = 0
+
+        # there is one name index per CU, unless linker merged them
+        while offset < reader.get_size():
+            ( length, offset_size, begin ) = reader.read_initial_length( offset )
+
+            self._read_name_index( reader, begin, offset_size )
+
+            offset = begin + length
+
+    def _read_name_index( self, reader, offset, offset_size ):
+        ( version, offset ) = reader.read_uint( offset, 2 )
+
+        if version != 5:
+            raise StructCompacterError( 'Version (%d) of %s is not supported' \
+                % ( version, self.section_name ) )
+
+        # padding
+        offset += 2
+
+        header = []
+
+        for i in range( 6 ):
+            ( value, offset ) = reader.read_uint( offset, 4 )
+            header.append( value )
+
+        ( cus_count, local_tus_count, foreign_tus_count, buckets_count, names_count, \
+            abbrevs_size ) = header
+
+        ( augmentation_size, offset ) = reader.read_uint( offset, 4 )
+        offset += augmentation_size
+
+        cus = []
+
+        for i in range( cus_count ):
+            ( cu_offset, offset ) = reader.read_uint( offset, offset_size )
+            cus.append( cu_offset )
+
+        self.cu_offsets.update( cus )
+
+        offset += local_tus_count * offset_size + foreign_tus_count * 8
+
+        # hash table is not needed, all names are read at once
+        offset += buckets_count * 4
+
+        if buckets_count > 0:
+            offset += names_count * 4
+
+        string_offsets = offset
+        entry_offsets = string_offsets + names_count * offset_size
+        abbrevs_offset = entry_offsets + names_count * offset_size
+        entry_pool = abbrevs_offset + abbrevs_size
+
+        abbrevs = self._read_abbrevs( reader, abbrevs_offset )
+
+        for i in range( names_count ):
+            string_offset = reader.read_uint( string_offsets + i * offset_size, offset_size )[ 0 ]
+            entry_offset = reader.read_uint( entry_offsets + i * offset_size, offset_size )[ 0 ]
+
+            name = bytes2str( self.dwarf_info.get_string_from_table( string_offset ) )
+
+            self._read_entries( reader, entry_pool + entry_offset, offset_size, abbrevs, name, cus )
+
+    def _read_abbrevs( self, reader, offset ):
+        abbrevs = {}
+
+        while True:
+            ( code, offset ) = reader.read_uleb128( offset )
+
+            if code == 0:
+                return abbrevs
+
+            ( tag, offset ) = reader.read_uleb128( offset )
+            attributes = []
+
+            while True:
+                ( index, offset ) = reader.read_uleb128( offset )
+                ( form, offset ) = reader.read_uleb128( offset )
+
+                if index == 0 and form == 0:
+                    break
+
+                attributes.append( ( index, form ) )
+
+            abbrevs[ code ] = ( tag, attributes )
+
+    def _read_entries( self, reader, offset, offset_size, abbrevs, name, cus ):
+        while True:
+            ( code, offset ) = reader.read_uleb128( offset )
+
+            if code == 0:
+                return
+
+            try:
+                ( tag, attributes ) = abbrevs[ code ]
+            except KeyError:
+                raise StructCompacterError( 'Abbreviation (%d) not found in %s' \
+                    % ( code, self.section_name ) )
+
+            values = {}
+
+            for ( index, form ) in attributes:
+                ( values[ index ], offset ) = self._read_form( reader, offset, form, offset_size )
+
+            if tag not in DebugNamesIndex.STRUCT_TAGS:
+                continue
+
+            if DebugNamesIndex.DW_IDX_type_unit in values:
+                continue
+
+            if DebugNamesIndex.DW_IDX_die_offset not in values:
+                continue
+
+            cu_index = values.get( DebugNamesIndex.DW_IDX_compile_unit, 0 )
+
+            if cu_index < len( cus ):
+                cu_offset = cus[ cu_index ]
+                self._add( name, cu_offset, cu_offset + values[ DebugNamesIndex.DW_IDX_die_offset ] )
+
+    def _read_form( self, reader, offset, form, offset_size ):
+        # DW_FORM_data1, DW_FORM_ref1, DW_FORM_flag
+        if form in ( 0x0b, 0x11, 0x0c ):
+            return reader.read_uint( offset, 1 )
+        # DW_FORM_data2, DW_FORM_ref2
+        elif form in ( 0x05, 0x12 ):
+            return reader.read_uint( offset, 2 )
+        # DW_FORM_data4, DW_FORM_ref4
+        elif form in ( 0x06, 0x13 ):
+            return reader.read_uint( offset, 4 )
+        # DW_FORM_data8, DW_FORM_ref8, DW_FORM_ref_sig8
+        elif form in ( 0x07, 0x14, 0x20 ):
+            return reader.read_uint( offset, 8 )
+        # DW_FORM_udata, DW_FORM_ref_udata
+        elif form in ( 0x0f, 0x15 ):
+            return reader.read_uleb128( offset )
+        # DW_FORM_sdata
+        elif form == 0x0d:
+            return reader.read_sleb128( offset )
+        # DW_FORM_flag_present
+        elif form == 0x19:
+            return ( True, offset )
+        # DW_FORM_data16
+        elif form == 0x1e:
+            return ( None, offset + 16 )
+
+        raise StructCompacterError( 'Form (%x) is not supported in %s' % ( form, self.section_name ) )
+
+def find_relocations( elf_file, section ):
+    # pyelftools looks relocations up by name, which is ambiguous for sections of COMDAT groups
+    index = None
+    relocations = []
+
+    for ( i, other ) in enumerate( elf_file.iter_sections() ):
+        if other.header == section.header:
+            index = i
+        elif isinstance( other, RelocationSection ):
+            relocations.append( other )
+
+    for relocation in relocations:
+        if relocation[ 'sh_info' ] == index:
+            return relocation
+
+    return None
+
+# e_machine -> { type of relocation : size of relocated value }, only absolute ones
+ABSOLUTE_RELOCATIONS = { \
+    'EM_X86_64' : { 0 : 0, 1 : 8, 10 : 4, 11 : 4 } \
+    , 'EM_386' : { 0 : 0, 1 : 4 } \
+    , 'EM_AARCH64' : { 257 : 8, 258 : 4 } \
+    , 'EM_ARM' : { 2 : 4 } \
+    , 'EM_PPC64' : { 1 : 4, 38 : 8 } }
+
+def apply_absolute_relocations( elf_file, data, relocations ):
+    # relocations of debug sections are absolute mostly, pyelftools applies the others
+    sizes = ABSOLUTE_RELOCATIONS.get( elf_file[ 'e_machine' ] )
+
+    if sizes == None:
+        return None
+
+    endian = '<' if elf_file.little_endian else '>'
+    is_RELA = relocations.is_RELA()
+
+    # st_value of symbol is at offset 8 in Elf64_Sym and at 4 in Elf32_Sym
+    if elf_file.elfclass == 64:
+        ( entry_format, info_shift, symbol_format, value_offset ) = ( 'QQq' if is_RELA else 'QQ', 32, 'Q', 8 )
+    else:
+        ( entry_format, info_shift, symbol_format, value_offset ) = ( 'IIi' if is_RELA else 'II', 8, 'I', 4 )
+
+    entry_format = endian + entry_format
+    entry_size = calcsize( entry_format )
+    symbol_format = endian + symbol_format
+
+    symbols = elf_file.get_section( relocations[ 'sh_link' ] )
+    symbols_data = symbols.data()
+    symbol_size = symbols[ 'sh_entsize' ]
+
+    entries = relocations.data()
+    result = bytearray( data )
+
+    for offset in range( 0, len( entries ) - entry_size + 1, entry_size ):
+        entry = unpack_from( entry_format, entries, offset )
+        type = entry[ 1 ] & ( ( 1 << info_shift ) - 1 )
+
+        try:
+            size = sizes[ type ]
+        except KeyError:
+            return None
+
+        if size == 0:
+            continue
+
+        value_format = endian + SectionReader.FORMATS[ size ]
+        value = unpack_from( symbol_format, symbols_data, \
+            ( entry[ 1 ] >> info_shift ) * symbol_size + value_offset )[ 0 ]
+
+        # RELA keeps addend in the entry, REL in relocated place
+        if is_RELA:
+            value += entry[ 2 ]
+        else:
+            value += unpack_from( value_format, result, entry[ 0 ] )[ 0 ]
+
+        pack_into( value_format, result, entry[ 0 ], value & ( ( 1 << ( size * 8 ) ) - 1 ) )
+
+    return bytes( result )
+
+def read_section_data( elf_file, section ):
+    if elf_file[ 'e_type' ] != 'ET_REL':
+        if isinstance( elf_file, MappedELFFile ):
+            return elf_file.get_section_data( section )
+
+        return section.data()
+
+    data = section.data()
+
+    # in object files offsets to .debug_info and .debug_str are not resolved yet
+    handler = RelocationHandler( elf_file )
+    relocations = find_relocations( elf_file, section )
+
+    if relocations == None:
+        return data
+
+    relocated = apply_absolute_relocations( elf_file, data, relocations )
+
+    if relocated != None:
+        return relocated
+
+    stream = BytesIO( data )
+    handler.apply_section_relocations( stream, relocations )
+
+    return stream.getvalue()
+
+def read_name_index( elf_file, dwarf_info ):
+    little_endian = elf_file.little_endian
+
+    # the most precise index goes first
+    for name in ( '.debug_names', '.gdb_index', '.debug_pubtypes', '.debug_gnu_pubtypes' ):
+        section = elf_file.get_section_by_name( name )
+
+        if section == None or section[ 'sh_type' ] == 'SHT_NOBITS':
+            continue
+
+        data = read_section_data( elf_file, section )
+
+        if name == '.debug_names':
+            return DebugNamesIndex( name, data, little_endian, dwarf_info )
+        elif name == '.gdb_index':
+            return GdbIndex( name, data )
+        else:
+            return PubTypesIndex( name, data, little_endian )
+
+    return None
+
+#
+# Native reader of DWARF units, used for split DWARF which pyelftools can not read
+#
+DW_TAG_NAMES = dict( ( value, name ) for ( name, value ) in ENUM_DW_TAG.items() if isinstance( value, int ) )
+DW_AT_NAMES = dict( ( value, name ) for ( name, value ) in ENUM_DW_AT.items() if isinstance( value, int ) )
+DW_FORM_NAMES = dict( ( value, name ) for ( name, value ) in ENUM_DW_FORM.items() if isinstance( value, int ) )
+
+# older pyelftools does not know split DWARF
+DW_TAG_NAMES.setdefault( 0x41, 'DW_TAG_type_unit' )
+DW_TAG_NAMES.setdefault( 0x4a, 'DW_TAG_skeleton_unit' )
+DW_AT_NAMES.setdefault( 0x69, 'DW_AT_signature' )
+DW_AT_NAMES.setdefault( 0x72, 'DW_AT_str_offsets_base' )
+DW_AT_NAMES.setdefault( 0x76, 'DW_AT_dwo_name' )
+DW_AT_NAMES.setdefault( 0x2130, 'DW_AT_GNU_dwo_name' )
+DW_AT_NAMES.setdefault( 0x2131, 'DW_AT_GNU_dwo_id' )
+
+class DWARFUnitType:
+    COMPILE = 1
+    TYPE = 2
+    PARTIAL = 3
+    SKELETON = 4
+    SPLIT_COMPILE = 5
+    SPLIT_TYPE = 6
+
+class DWARFForm:
+    ADDR = 0x01
+    BLOCK2 = 0x03
+    BLOCK4 = 0x04
+    DATA2 = 0x05
+    DATA4 = 0x06
+    DATA8 = 0x07
+    STRING = 0x08
+    BLOCK = 0x09
+    BLOCK1 = 0x0a
+    DATA1 = 0x0b
+    FLAG = 0x0c
+    SDATA = 0x0d
+    STRP = 0x0e
+    UDATA = 0x0f
+    REF_ADDR = 0x10
+    REF1 = 0x11
+    REF2 = 0x12
+    REF4 = 0x13
+    REF8 = 0x14
+    REF_UDATA = 0x15
+    INDIRECT = 0x16
+    SEC_OFFSET = 0x17
+    EXPRLOC = 0x18
+    FLAG_PRESENT = 0x19
+    STRX = 0x1a
+    ADDRX = 0x1b
+    REF_SUP4 = 0x1c
+    STRP_SUP = 0x1d
+    DATA16 = 0x1e
+    LINE_STRP = 0x1f
+    REF_SIG8 = 0x20
+    IMPLICIT_CONST = 0x21
+    LOCLISTX = 0x22
+    RNGLISTX = 0x23
+    REF_SUP8 = 0x24
+    STRX1 = 0x25
+    STRX2 = 0x26
+    STRX3 = 0x27
+    STRX4 = 0x28
+    ADDRX1 = 0x29
+    ADDRX2 = 0x2a
+    ADDRX3 = 0x2b
+    ADDRX4 = 0x2c
+    GNU_ADDR_INDEX = 0x1f01
+    GNU_STR_INDEX = 0x1f02
+    GNU_REF_ALT = 0x1f20
+    GNU_STRP_ALT = 0x1f21
+
+    FIXED_SIZES = { \
+        DATA1 : 1, DATA2 : 2, DATA4 : 4, DATA8 : 8 \
+        , REF1 : 1, REF2 : 2, REF4 : 4, REF8 : 8, REF_SIG8 : 8 \
+        , FLAG : 1, REF_SUP4 : 4, REF_SUP8 : 8 \
+        , ADDRX1 : 1, ADDRX2 : 2, ADDRX4 : 4 }
+
+    ULEB128 = ( UDATA, REF_UDATA, ADDRX, LOCLISTX, RNGLISTX, GNU_ADDR_INDEX )
+
+    OFFSETS = ( SEC_OFFSET, STRP_SUP, GNU_REF_ALT, GNU_STRP_ALT )
+
+    BLOCKS = { BLOCK1 : 1, BLOCK2 : 2, BLOCK4 : 4 }
+
+    STRING_INDEXES = { STRX : 0, STRX1 : 1, STRX2 : 2, STRX3 : 3, STRX4 : 4, GNU_STR_INDEX : 0 }
+
+class DWARFSectionId:
+    # DW_SECT_* identifiers of contributions in .debug_cu_index
+    INFO = 1
+    ABBREV = 3
+    STR_OFFSETS = 6
+
+class DWARFAbbrev:
+    def __init__( self, tag, has_children, specs, form_sizes ):
+        self.tag = tag
+        self.has_children = has_children
+        self.specs = specs
+
+        # ( name or None if skipped, form, implicit_const, size if known )
+        self.steps = []
+
+        # ( offset of DW_AT_sibling in DIE after its code, form ) if offset is known
+        self.sibling = None
+
+        offset = 0
+
+        for ( name, form, implicit_const ) in specs:
+            size = form_sizes.get( form )
+
+            if name == 'DW_AT_sibling' and offset != None:
+                self.sibling = ( offset, form )
+
+            if name in NativeDIE.ATTRIBUTES:
+                self.steps.append( ( name, form, implicit_const, size ) )
+            elif size != None and len( self.steps ) > 0 and self.steps[ -1 ][ 0 ] == None \
+                    and self.steps[ -1 ][ 3 ] != None:
+                # skipped attributes of known sizes are skipped at once
+                self.steps[ -1 ] = ( None, None, None, self.steps[ -1 ][ 3 ] + size )
+            else:
+                self.steps.append( ( None, form, None, size ) )
+
+            if offset != None and size != None:
+                offset += size
+            else:
+                offset = None
+
+        # size of all attributes, if known
+        self.size = offset
+
+class NativeDWARFInfo:
+    def __init__( self, sections, little_endian, contributions = None, types_offset = None ):
+        self.little_endian = little_endian
+
+        self.info = self._make_reader( sections, '.debug_info' )
+        self.abbrev = self._make_reader( sections, '.debug_abbrev' )
+        self.str = self._make_reader( sections, '.debug_str' )
+        self.str_offsets = self._make_reader( sections, '.debug_str_offsets' )
+        self.line_str = self._make_reader( sections, '.debug_line_str' )
+
+        # unit offset -> { DW_SECT_* : offset of unit's contribution }, for .dwp only
+        self.contributions = contributions or {}
+
+        # units of .debug_types follow those of .debug_info, theirs headers differ
+        self.types_offset = types_offset
+
+        self.abbrevs = {}
+        self.units = None
+
+        # signature of type unit -> offset of its type DIE
+        self.type_offsets = None
+
+    def iter_CUs( self ):
+        if self.units == None:
+            self.units = []
+            offset = 0
+
+            while offset < self.info.get_size():
+                unit = DWARFUnit( self, offset )
+                self.units.append( unit )
+
+                offset = unit.get_end()
+
+        return iter( self.units )
+
+    def get_type_offset( self, signature ):
+        if self.type_offsets == None:
+            self.type_offsets = {}
+
+            for unit in self.iter_CUs():
+                if unit[ 'type_signature' ] != None:
+                    self.type_offsets[ unit[ 'type_signature' ] ] = unit.cu_offset + unit[ 'type_offset' ]
+
+        return self.type_offsets[ signature ]
+
+    def get_string_from_table( self, offset ):
+        return self.str.read_cbytes( offset )[ 0 ]
+
+    def get_contribution( self, unit_offset, section_id ):
+        try:
+            return self.contributions[ unit_offset ][ section_id ]
+        except KeyError:
+            return 0
+
+    def get_abbrevs( self, offset, unit ):
+        # sizes of some forms depend on unit, units of one file share them usually
+        key = ( offset, unit.offset_size, unit[ 'address_size' ], unit[ 'version' ] == 2 )
+
+        try:
+            return self.abbrevs[ key ]
+        except KeyError:
+            pass
+
+        abbrevs = {}
+
+        for ( code, ( tag, has_children, specs ) ) in self._read_abbrevs( offset )[ 0 ].items():
+            abbrevs[ code ] = DWARFAbbrev( tag, has_children, specs, unit.form_sizes )
+
+        self.abbrevs[ key ] = abbrevs
+        return abbrevs
+
+    def has_abbrevs( self, tags, attributes = () ):
+        offset = 0
+
+        # abbreviations tables of all units follow one another
+        while offset < self.abbrev.get_size():
+            ( abbrevs, offset ) = self._read_abbrevs( offset )
+
+            for ( tag, has_children, specs ) in abbrevs.values():
+                if tag in tags:
+                    return True
+
+                for ( name, form, implicit_const ) in specs:
+                    if name in attributes:
+                        return True
+
+        return False
+
+    # details
+
+    def _read_abbrevs( self, offset ):
+        abbrevs = {}
+        reader = self.abbrev
+
+        while True:
+            ( code, offset ) = reader.read_uleb128( offset )
+
+            if code == 0:
+                break
+
+            ( tag, offset ) = reader.read_uleb128( offset )
+            ( has_children, offset ) = reader.read_uint( offset, 1 )
+
+            specs = []
+
+            while True:
+                ( name, offset ) = reader.read_uleb128( offset )
+                ( form, offset ) = reader.read_uleb128( offset )
+
+                if name == 0 and form == 0:
+                    break
+
+                implicit_const = None
+
+                if form == DWARFForm.IMPLICIT_CONST:
+                    ( implicit_const, offset ) = reader.read_sleb128( offset )
+
+                specs.append( ( DW_AT_NAMES.get( name, name ), form, implicit_const ) )
+
+            abbrevs[ code ] = ( DW_TAG_NAMES.get( tag, tag ), has_children != 0, specs )
+
+        return ( abbrevs, offset )
+
+    def _make_reader( self, sections, name ):
+        data = sections.get( name )
+
+        if data == None:
+            data = b''
+
+        return SectionReader( data, self.little_endian )
+
+class DWARFUnit:
+    def __init__( self, dwarf_info, offset ):
+        self.dwarfinfo = dwarf_info
+        self.cu_offset = offset
+
+        reader = dwarf_info.info
+
+        ( length, self.offset_size, offset ) = reader.read_initial_length( offset )
+        self.end = offset + length
+
+        ( version, offset ) = reader.read_uint( offset, 2 )
+
+        if version < 2 or version > 5:
+            raise StructCompacterError( 'Version (%d) of unit at offset (%x) is not supported' \
+                % ( version, self.cu_offset ) )
+
+        self.header = { 'unit_length' : length, 'version' : version, 'dwo_id' : None \
+            , 'type_signature' : None, 'type_offset' : None }
+
+        if version >= 5:
+            ( self.header[ 'unit_type' ], offset ) = reader.read_uint( offset, 1 )
+            ( self.header[ 'address_size' ], offset ) = reader.read_uint( offset, 1 )
+            ( abbrev_offset, offset ) = reader.read_uint( offset, self.offset_size )
+
+            if self.header[ 'unit_type' ] in ( DWARFUnitType.SKELETON, DWARFUnitType.SPLIT_COMPILE ):
+                ( self.header[ 'dwo_id' ], offset ) = reader.read_uint( offset, 8 )
+            elif self.header[ 'unit_type' ] in ( DWARFUnitType.TYPE, DWARFUnitType.SPLIT_TYPE ):
+                offset = self._read_type_signature( offset )
+        else:
+            ( abbrev_offset, offset ) = reader.read_uint( offset, self.offset_size )
+            ( self.header[ 'address_size' ], offset ) = reader.read_uint( offset, 1 )
+
+            if dwarf_info.types_offset != None and self.cu_offset >= dwarf_info.types_offset:
+                self.header[ 'unit_type' ] = DWARFUnitType.TYPE
+                offset = self._read_type_signature( offset )
+            else:
+                self.header[ 'unit_type' ] = DWARFUnitType.COMPILE
+
+        self.header[ 'debug_abbrev_offset' ] = abbrev_offset
+        self.cu_die_offset = offset
+
+        self.form_sizes = self._make_form_sizes()
+
+        self.abbrevs = dwarf_info.get_abbrevs( abbrev_offset \
+            + dwarf_info.get_contribution( self.cu_offset, DWARFSectionId.ABBREV ), self )
+
+        self.str_offsets_base = None
+
+    def __getitem__( self, name ):
+        return self.header[ name ]
+
+    def get_end( self ):
+        return self.end
+
+    def get_top_DIE( self ):
+        return NativeDIE( self, None, self.cu_die_offset )
+
+    def get_abbrev( self, code ):
+        try:
+            return self.abbrevs[ code ]
+        except KeyError:
+            raise StructCompacterError( 'Abbreviation (%d) of unit at offset (%x) not found' \
+                % ( code, self.cu_offset ) )
+
+    def skip_attributes( self, offset, abbrev ):
+        if abbrev.size != None:
+            return offset + abbrev.size
+
+        for ( name, form, implicit_const, size ) in abbrev.steps:
+            if size != None:
+                offset += size
+            else:
+                offset = self.skip_form( offset, form )
+
+        return offset
+
+    def skip_children( self, offset ):
+        reader = self.dwarfinfo.info
+        depth = 1
+
+        # DIEs are not created, only abbreviations tell how to skip them
+        while depth > 0:
+            ( code, offset ) = reader.read_uleb128( offset )
+
+            if code == 0:
+                depth -= 1
+                continue
+
+            abbrev = self.get_abbrev( code )
+
+            if abbrev.has_children and abbrev.sibling != None:
+                offset = self.read_sibling( offset, abbrev )
+            else:
+                offset = self.skip_attributes( offset, abbrev )
+
+                if abbrev.has_children:
+                    depth += 1
+
+        return offset
+
+    def read_sibling( self, offset, abbrev ):
+        ( prefix, form ) = abbrev.sibling
+        return self.read_form( offset + prefix, form, None )[ 0 ] + self.cu_offset
+
+    def skip_form( self, offset, form ):
+        reader = self.dwarfinfo.info
+        size = self.form_sizes.get( form )
+
+        if size != None:
+            return offset + size
+        elif form in DWARFForm.ULEB128 or form in ( DWARFForm.SDATA, DWARFForm.STRX, DWARFForm.GNU_STR_INDEX ):
+            return reader.read_uleb128( offset )[ 1 ]
+        elif form == DWARFForm.STRING:
+            return reader.read_cbytes( offset )[ 1 ]
+        elif form == DWARFForm.INDIRECT:
+            ( form, offset ) = reader.read_uleb128( offset )
+            return self.skip_form( offset, form )
+
+        return self.read_form( offset, form, None )[ 1 ]
+
+    def read_form( self, offset, form, implicit_const ):
+        reader = self.dwarfinfo.info
+
+        if form in DWARFForm.FIXED_SIZES:
+            return reader.read_uint( offset, DWARFForm.FIXED_SIZES[ form ] )
+        elif form in DWARFForm.ULEB128:
+            return reader.read_uleb128( offset )
+        elif form in DWARFForm.OFFSETS:
+            return reader.read_uint( offset, self.offset_size )
+        elif form in DWARFForm.BLOCKS:
+            ( size, offset ) = reader.read_uint( offset, DWARFForm.BLOCKS[ form ] )
+            return self._read_block( offset, size )
+        elif form in ( DWARFForm.BLOCK, DWARFForm.EXPRLOC ):
+            ( size, offset ) = reader.read_uleb128( offset )
+            return self._read_block( offset, size )
+        elif form in DWARFForm.STRING_INDEXES:
+            return self._read_string_index( offset, form )
+        elif form == DWARFForm.STRING:
+            return reader.read_cbytes( offset )
+        elif form == DWARFForm.STRP:
+            ( string_offset, offset ) = reader.read_uint( offset, self.offset_size )
+            return ( self._get_string( self.dwarfinfo.str, string_offset ), offset )
+        elif form == DWARFForm.LINE_STRP:
+            ( string_offset, offset ) = reader.read_uint( offset, self.offset_size )
+            return ( self._get_string( self.dwarfinfo.line_str, string_offset ), offset )
+        elif form == DWARFForm.SDATA:
+            return reader.read_sleb128( offset )
+        elif form == DWARFForm.ADDR:
+            return reader.read_uint( offset, self.header[ 'address_size' ] )
+        elif form == DWARFForm.REF_ADDR:
+            # DWARF 2 keeps it as an address
+            if self.header[ 'version' ] == 2:
+                return reader.read_uint( offset, self.header[ 'address_size' ] )
+
+            return reader.read_uint( offset, self.offset_size )
+        elif form == DWARFForm.FLAG_PRESENT:
+            return ( True, offset )
+        elif form == DWARFForm.IMPLICIT_CONST:
+            return ( implicit_const, offset )
+        elif form == DWARFForm.DATA16:
+            return ( None, offset + 16 )
+        elif form == DWARFForm.ADDRX3:
+            return ( None, offset + 3 )
+        elif form == DWARFForm.INDIRECT:
+            ( form, offset ) = reader.read_uleb128( offset )
+            return self.read_form( offset, form, implicit_const )
+
+        raise StructCompacterError( 'Form (%x) in unit at offset (%x) is not supported' \
+            % ( form, self.cu_offset ) )
+
+    # details
+
+    def _make_form_sizes( self ):
+        sizes = dict( DWARFForm.FIXED_SIZES )
+
+        for form in DWARFForm.OFFSETS + ( DWARFForm.STRP, DWARFForm.LINE_STRP ):
+            sizes[ form ] = self.offset_size
+
+        for ( form, size ) in DWARFForm.STRING_INDEXES.items():
+            if size > 0:
+                sizes[ form ] = size
+
+        sizes[ DWARFForm.ADDR ] = self.header[ 'address_size' ]
+        sizes[ DWARFForm.REF_ADDR ] = self.header[ 'address_size' ] \
+            if self.header[ 'version' ] == 2 else self.offset_size
+
+        sizes[ DWARFForm.FLAG_PRESENT ] = 0
+        sizes[ DWARFForm.IMPLICIT_CONST ] = 0
+        sizes[ DWARFForm.DATA16 ] = 16
+        sizes[ DWARFForm.ADDRX3 ] = 3
+
+        return sizes
+
+    def _read_type_signature( self, offset ):
+        reader = self.dwarfinfo.info
+
+        ( self.header[ 'type_signature' ], offset ) = reader.read_uint( offset, 8 )
+        ( self.header[ 'type_offset' ], offset ) = reader.read_uint( offset, self.offset_size )
+
+        return offset
+
+    def _read_block( self, offset, size ):
+        data = self.dwarfinfo.info.data[ offset : offset + size ]
+        return ( list( bytearray( data ) ), offset + size )
+
+    def _read_string_index( self, offset, form ):
+        reader = self.dwarfinfo.info
+        size = DWARFForm.STRING_INDEXES[ form ]
+
+        if size == 0:
+            ( index, offset ) = reader.read_uleb128( offset )
+        elif size == 3:
+            ( low, offset ) = reader.read_uint( offset, 2 )
+            ( high, offset ) = reader.read_uint( offset, 1 )
+
+            index = low | ( high << 16 ) if self.dwarfinfo.little_endian else ( low << 8 ) | high
+        else:
+            ( index, offset ) = reader.read_uint( offset, size )
+
+        base = self._get_str_offsets_base()
+        string_offset = self.dwarfinfo.str_offsets.read_uint( base + index * self.offset_size, \
+            self.offset_size )[ 0 ]
+
+        return ( self._get_string( self.dwarfinfo.str, string_offset ), offset )
+
+    def _get_str_offsets_base( self ):
+        if self.str_offsets_base != None:
+            return self.str_offsets_base
+
+        base = self.dwarfinfo.get_contribution( self.cu_offset, DWARFSectionId.STR_OFFSETS )
+
+        if self.header[ 'version' ] >= 5:
+            # split units have no DW_AT_str_offsets_base, their table follows the header
+            if self.header[ 'unit_type' ] in ( DWARFUnitType.SPLIT_COMPILE, DWARFUnitType.SPLIT_TYPE ):
+                base += 8 if self.offset_size == 4 else 16
+            else:
+                base += self._find_str_offsets_base()
+
+        self.str_offsets_base = base
+        return base
+
+    def _find_str_offsets_base( self ):
+        reader = self.dwarfinfo.info
+
+        ( code, offset ) = reader.read_uleb128( self.cu_die_offset )
+
+        # strings of top DIE may come before the base, so only the base is read here
+        for ( name, form, implicit_const ) in self.get_abbrev( code ).specs:
+            if name == 'DW_AT_str_offsets_base':
+                return self.read_form( offset, form, implicit_const )[ 0 ]
+
+            offset = self.skip_form( offset, form )
+
+        raise StructCompacterError( 'Unit at offset (%x) has no DW_AT_str_offsets_base' % self.cu_offset )
+
+    def _get_string( self, reader, offset ):
+        return reader.read_cbytes( offset )[ 0 ]
+
+class NativeDIE:
+    # attributes used by DIEReader and to find split DWARF, others are skipped
+    ATTRIBUTES = frozenset( ( \
+        'DW_AT_name', 'DW_AT_byte_size', 'DW_AT_type', 'DW_AT_data_member_location' \
+        , 'DW_AT_bit_size', 'DW_AT_bit_offset', 'DW_AT_data_bit_offset' \
+        , 'DW_AT_decl_file', 'DW_AT_decl_line', 'DW_AT_declaration', 'DW_AT_external' \
+        , 'DW_AT_accessibility', 'DW_AT_artificial' \
+        , 'DW_AT_count', 'DW_AT_lower_bound', 'DW_AT_upper_bound' \
+        , 'DW_AT_specification', 'DW_AT_signature', 'DW_AT_comp_dir', 'DW_AT_str_offsets_base' \
+        , 'DW_AT_dwo_name', 'DW_AT_GNU_dwo_name', 'DW_AT_GNU_dwo_id' ) )
+
+    def __init__( self, cu, stream, offset ):
+        # stream is not used, it is here to be constructed as pyelftools DIE
+        self.cu = cu
+        self.offset = offset
+        self.decoded_attributes = None
+
+        ( code, self.attributes_offset ) = cu.dwarfinfo.info.read_uleb128( offset )
+
+        if code == 0:
+            self.abbrev = None
+            self.tag = None
+            self.has_children = False
+            self.size = self.attributes_offset - offset
+            self.decoded_attributes = {}
+
+            return
+
+        self.abbrev = cu.get_abbrev( code )
+        self.tag = self.abbrev.tag
+        self.has_children = self.abbrev.has_children
+        self.size = cu.skip_attributes( self.attributes_offset, self.abbrev ) - offset
+
+    @property
+    def attributes( self ):
+        # most of DIEs are only walked through, theirs attributes are decoded on demand
+        if self.decoded_attributes == None:
+            self.decoded_attributes = self._read_attributes()
+
+        return self.decoded_attributes
+
+    def get_sibling_offset( self ):
+        if not self.has_children:
+            return self.offset + self.size
+
+        if self.abbrev.sibling != None:
+            return self.cu.read_sibling( self.attributes_offset, self.abbrev )
+
+        return self.cu.skip_children( self.offset + self.size )
+
+    # details
+
+    def _read_attributes( self ):
+        attributes = {}
+        position = self.attributes_offset
+
+        for ( name, form, implicit_const, size ) in self.abbrev.steps:
+            if name == None:
+                position = position + size if size != None else self.cu.skip_form( position, form )
+                continue
+
+            ( value, end ) = self.cu.read_form( position, form, implicit_const )
+
+            attributes[ name ] = AttributeValue( \
+                name = name \
+                , form = DW_FORM_NAMES.get( form, form ) \
+                , value = value \
+                , raw_value = value \
+                , offset = position )
+
+            position = end
+
+        return attributes
+
+#
+# Split DWARF, skeleton units of a file refer to units kept in .dwo files or .dwp package
+#
+class SkeletonUnit:
+    def __init__( self, cu_offset, dwo_id, dwo_name, comp_dir ):
+        self.cu_offset = cu_offset
+        self.dwo_id = dwo_id
+        self.dwo_name = dwo_name
+        self.comp_dir = comp_dir
+
+    def get_cu_offset( self ):
+        return self.cu_offset
+
+    def get_dwo_id( self ):
+        return self.dwo_id
+
+    def get_dwo_name( self ):
+        return self.dwo_name
+
+    def get_comp_dir( self ):
+        return self.comp_dir
+
+class DWARFPackage:
+    def __init__( self, elf_file ):
+        section = elf_file.get_section_by_name( '.debug_cu_index' )
+
+        if section == None:
+            raise StructCompacterError( 'Package has no .debug_cu_index' )
+
+        # dwo_id -> { DW_SECT_* : offset of unit's contribution }
+        self.units = self._read_index( SectionReader( \
+            read_section_data( elf_file, section ), elf_file.little_endian ) )
+
+        contributions = {}
+
+        for unit in self.units.values():
+            contributions[ unit[ DWARFSectionId.INFO ] ] = unit
+
+        self.dwarf_info = read_native_DWARF_info( elf_file, '.dwo', contributions )
+
+    def get_dwarf_info( self ):
+        return self.dwarf_info
+
+    def get_unit_offset( self, dwo_id ):
+        try:
+            return self.units[ dwo_id ][ DWARFSectionId.INFO ]
+        except KeyError:
+            return None
+
+    # details
+
+    def _read_index( self, reader ):
+        ( version, offset ) = reader.read_uint( 0, 4 )
+
+        # version 5 is 2 bytes long, followed by padding
+        if version not in ( 2, 5 ):
+            version = reader.read_uint( 0, 2 )[ 0 ]
+
+        if version not in ( 2, 5 ):
+            raise StructCompacterError( 'Version (%d) of .debug_cu_index is not supported' % version )
+
+        ( sections_count, offset ) = reader.read_uint( offset, 4 )
+        ( units_count, offset ) = reader.read_uint( offset, 4 )
+        ( slots_count, offset ) = reader.read_uint( offset, 4 )
+
+        signatures = offset
+        rows = signatures + slots_count * 8
+        section_ids = rows + slots_count * 4
+        offsets = section_ids + sections_count * 4
+
+        ids = [ reader.read_uint( section_ids + i * 4, 4 )[ 0 ] for i in range( sections_count ) ]
+        units = {}
+
+        for slot in range( slots_count ):
+            row = reader.read_uint( rows + slot * 4, 4 )[ 0 ]
+
+            if row == 0:
+                continue
+
+            signature = reader.read_uint( signatures + slot * 8, 8 )[ 0 ]
+            row_offset = offsets + ( row - 1 ) * sections_count * 4
+
+            units[ signature ] = dict( ( ids[ i ], reader.read_uint( row_offset + i * 4, 4 )[ 0 ] ) \
+                for i in range( sections_count ) )
+
+        return units
+
+def read_DWARF_sections( elf_file, suffix = '', names = None ):
+    sections = {}
+
+    if names == None:
+        names = ( '.debug_info', '.debug_abbrev', '.debug_str', '.debug_str_offsets', '.debug_line_str' )
+
+    for name in names:
+        section = elf_file.get_section_by_name( name + suffix )
+
+        if section != None and section[ 'sh_type' ] != 'SHT_NOBITS':
+            sections[ name ] = read_section_data( elf_file, section )
+
+    return sections
+
+def read_native_DWARF_info( elf_file, suffix = '', contributions = None, names = None ):
+    return NativeDWARFInfo( read_DWARF_sections( elf_file, suffix, names ), elf_file.little_endian, contributions )
+
+def read_DWARF_info( elf_file, reader = 'pyelftools' ):
+    units = []
+    types = []
+
+    # object files keep each type unit in a section of its own COMDAT group (SHF_GROUP)
+    for section in elf_file.iter_sections():
+        if section.name == '.debug_info' and section[ 'sh_flags' ] & 0x200:
+            units.append( section )
+        elif section.name == '.debug_types':
+            types.append( section )
+
+    # linked files of DWARF 5 keep type units next to compile units
+    if reader != 'fast' and len( units ) == 0 and len( types ) == 0:
+        abbrevs = read_native_DWARF_info( elf_file, names = ( '.debug_abbrev', ) )
+
+        if not abbrevs.has_abbrevs( ( 'DW_TAG_type_unit', ) ):
+            return elf_file.get_dwarf_info()
+
+    # pyelftools can not resolve signatures of type units, all units are read natively then
+    # as they are by the fast reader
+    sections = read_DWARF_sections( elf_file, \
+        names = ( '.debug_abbrev', '.debug_str', '.debug_str_offsets', '.debug_line_str' ) )
+
+    data = []
+
+    for section in elf_file.iter_sections():
+        if section.name == '.debug_info' and not section[ 'sh_flags' ] & 0x200:
+            data.append( read_section_data( elf_file, section ) )
+            break
+
+    # type units go after compile units, so offsets of DIEs in compile units do not change
+    data.extend( read_section_data( elf_file, section ) for section in units )
+    types_offset = sum( len( chunk ) for chunk in data )
+    data.extend( read_section_data( elf_file, section ) for section in types )
+
+    sections[ '.debug_info' ] = data[ 0 ] if len( data ) == 1 else b''.join( data )
+
+    return NativeDWARFInfo( sections, elf_file.little_endian, types_offset = types_offset )
+
+def find_skeleton_units( elf_file ):
+    skeletons = []
+
+    # abbreviations are short, units are read only if some of them may be a skeleton
+    abbrevs = read_native_DWARF_info( elf_file, names = ( '.debug_abbrev', ) )
+
+    if not abbrevs.has_abbrevs( ( 'DW_TAG_skeleton_unit', ), ( 'DW_AT_dwo_name', 'DW_AT_GNU_dwo_name' ) ):
+        return skeletons
+
+    # only unit headers and top DIEs are read here
+    for unit in read_native_DWARF_info( elf_file ).iter_CUs():
+        attributes = unit.get_top_DIE().attributes
+
+        dwo_name = attributes.get( 'DW_AT_dwo_name' ) or attributes.get( 'DW_AT_GNU_dwo_name' )
+
+        if dwo_name == None:
+            continue
+
+        dwo_id = unit[ 'dwo_id' ]
+
+        # DWARF 4 with GNU extensions keeps dwo_id in top DIE
+        if dwo_id == None and 'DW_AT_GNU_dwo_id' in attributes:
+            dwo_id = attributes[ 'DW_AT_GNU_dwo_id' ].value
+
+        comp_dir = attributes.get( 'DW_AT_comp_dir' )
+
+        skeletons.append( SkeletonUnit( unit.cu_offset, dwo_id, bytes2str( dwo_name.value ), \
+            bytes2str( comp_dir.value ) if comp_dir != None else None ) )
+
+    return skeletons
+
+def find_DWARF_package( file_name ):
+    package_name = file_name + '.dwp'
+
+    if os.path.isfile( package_name ):
+        return package_name
+
+    return None
+
+def find_DWO_file( file_name, skeleton ):
+    dwo_name = skeleton.get_dwo_name()
+    candidates = [ dwo_name ]
+
+    # .dwo files are looked up by path as compiled, and next to the linked file
+    if not os.path.isabs( dwo_name ):
+        if skeleton.get_comp_dir() != None:
+            candidates.insert( 0, os.path.join( skeleton.get_comp_dir(), dwo_name ) )
+
+        candidates.append( os.path.join( os.path.dirname( file_name ), dwo_name ) )
+
+    candidates.append( os.path.join( os.path.dirname( file_name ), os.path.basename( dwo_name ) ) )
+
+    for candidate in candidates:
+        if os.path.isfile( candidate ):
+            return candidate
+
+    return None
+
+#
+# DIEReader from DWARF/DIEs into abstract representation of types
+#
+class DIEReader:
+    def __init__( self, config, types_filter = None ):
+        self.config = config
+        self.types_filter = types_filter
+
+        self.dies = None
+        self.types = {}
+
+        self.pending_structs = []
+
+        self.ptr_size = None
+        self.ref_size = None
+        self.little_endian = True
+
+    def process( self, dwarf_info, cu_offsets = None, name_index = None ):
+        self.ptr_size = self._get_ptr_size( dwarf_info )
+        self.ref_size = self.ptr_size
+        self.little_endian = self._is_little_endian( dwarf_info )
+
+        self.dies = DIECache( dwarf_info )
+
+        # without --types all DIEs are visited anyway, name index does not help
+        if self.types_filter != None and name_index != None:
+            self._convert_indexed_dies_to_structs( name_index, cu_offsets )
+        else:
+            self._convert_die_to_structs( dwarf_info, cu_offsets )
+
+        return self._deduplicate_structs()
+
+    def get_types( self ):
+        return self.types
+
+    # details
+
+    def _get_ptr_size( self, dwarf_info ):
+        for cu in dwarf_info.iter_CUs():
+            return cu[ 'address_size' ]
+
+    def _is_little_endian( self, dwarf_info ):
+        try:
+            return dwarf_info.config.little_endian
+        except AttributeError:
+            return dwarf_info.little_endian
+
+    def _cache( self, offset, type ):
+        self.types[ offset ] = type
+        return type
+
+    def _resolve_type( self, die ):
+        chain = []
+        visited = set()
+
+        # follow derived types (typedef, pointer, const...) down to known or simple type
+        while True:
+            die = self._find_definition( die )
+
+            if die.offset in self.types:
+                type = self.types[ die.offset ]
+                break
+
+            if die.offset in visited:
+                type = UnknownType( 'Cycle of derived types' )
+                break
+
+            visited.add( die.offset )
+
+            if DIE.is_struct( die ):
+                type = self._convert_die_to_struct( die )
+                break
+
+            type = self._create_simple_type( die )
+
+            if type != None:
+                break
+
+            chain.append( die )
+
+            type_id = DIE.get_type_id( die, self.dies )
+
+            if type_id == None:
+                type = UnknownType( 'type_id is None' )
+                break
+
+            die = self.dies[ type_id ]
+
+        # and build derived types back from the innermost one
+        for die in reversed( chain ):
+            type = self._create_derived_type( die, type )
+
+        return type
+
+    def _find_definition( self, die ):
+        if 'DW_AT_signature' not in die.attributes:
+            return die
+
+        # declaration of type defined in type unit
+        try:
+            return self.dies[ DIE.get_ref( die, 'DW_AT_signature', self.dies ) ]
         except KeyError:
-            return -1
+            return die
+
+    def _create_simple_type( self, die ):
+        if die.tag not in ( 'DW_TAG_base_type', 'DW_TAG_union_type', 'DW_TAG_enumeration_type' ):
+            return None
+
+        name = DIE.get_name( die, self.dies )
+        size = DIE.get_size( die )
+
+        # cache type
+        if die.tag == 'DW_TAG_base_type':
+            return self._cache( die.offset, BaseType( name, size ) )
+        elif die.tag == 'DW_TAG_union_type':
+            return self._cache( die.offset, UnionType( name, size ) )
+        else:
+            return self._cache( die.offset, EnumType( name, size ) )
+
+    def _create_derived_type( self, die, type ):
+        # do not cache type
+        if die.tag == 'DW_TAG_member':
+            return type
+        elif die.tag == 'DW_TAG_inheritance':
+            return type
+        elif die.tag == 'DW_TAG_typedef':
+            return type
+        elif die.tag == 'DW_TAG_array_type':
+            return ArrayType( type, DIE.get_element_count( die, self.dies ) )
+
+        # cache type
+        if die.tag == 'DW_TAG_pointer_type':
+            return self._cache( die.offset, PtrType( type, self.ptr_size ) )
+        elif die.tag == 'DW_TAG_reference_type':
+            return self._cache( die.offset, RefType( type, self.ref_size ) )
+        elif die.tag == 'DW_TAG_const_type':
+            return self._cache( die.offset, ConstType( type ) )
+        elif die.tag == 'DW_TAG_volatile_type':
+            return self._cache( die.offset, VolatileType( type ) )
+
+        return UnknownType( 'Wrong die.tag %s' % die.tag )
+
+    def _resolve_member_type( self, die ):
+        type_id = DIE.get_type_id( die, self.dies )
+
+        if type_id == None:
+            return UnknownType( 'type_id is None' )
+        else:
+            return self._resolve_type( self.dies[ type_id ] )
+
+    def _convert_die_to_member( self, die ):
+        assert DIE.is_member( die ), 'die has to be a member'
+
+        name = DIE.get_name( die, self.dies )
+        file_id = DIE.get_file_id( die );
+        line_no = DIE.get_line_number( die )
+        type = self._resolve_member_type( die )
+        this_offset = DIE.get_this_offset( die )
+
+        return Member( name, file_id, line_no, type, this_offset )
+
+    def _convert_die_to_bit_field( self, die ):
+        assert DIE.is_bit_field( die ), 'die has to be a bit field'
+
+        name = DIE.get_name( die, self.dies )
+        file_id = DIE.get_file_id( die )
+        line_no = DIE.get_line_number( die )
+        type = self._resolve_member_type( die )
+        bit_offset = DIE.get_bit_offset( die, type.get_size(), self.little_endian )
+
+        return BitField( name, file_id, line_no, type, bit_offset, DIE.get_bit_size( die ) )
+
+    def _add_bit_field( self, struct, field ):
+        members = struct.get_members()
+
+        # bit fields sharing a byte are kept by one BitFields
+        if len( members ) > 0 and members[ -1 ].__class__ == BitFields:
+            last = members[ -1 ]
+
+            if last.get_this_offset() * 8 <= field.get_bit_offset() < last.get_end() * 8:
+                field.set_bit_offset( field.get_bit_offset() - last.get_this_offset() * 8 )
+                last.get_type().add_field( field )
+
+                return
+
+        this_offset = field.get_bit_offset() // 8
+        field.set_bit_offset( field.get_bit_offset() % 8 )
+
+        struct.add_member( BitFields( BitFieldsType( [ field ] ), this_offset ) )
+
+    def _convert_die_to_inheritance( self, die ):
+        assert DIE.is_inheritance( die ), 'die has to be a inheritance'
+
+        type = self._resolve_member_type( die )
+        this_offset = DIE.get_this_offset( die )
+
+        return Inheritance( type, this_offset )
+
+    def _create_struct_or_declaration( self, die ):
+        size = DIE.get_size( die )
+        name = DIE.get_name( die, self.dies )
+        is_declaration = DIE.is_declaration( die )
+
+        if is_declaration or size == None:
+            return DeclarationType( name )
+
+        struct = StructType( name, size )
+        return self._cache( die.offset, struct )
+
+    def _convert_die_to_struct( self, die ):
+        assert DIE.is_struct( die ), 'die has to be a struct %s' % die.tag
+
+        try:
+            return self.types[ die.offset ]
+        except KeyError:
+            struct = self._create_struct_or_declaration( die )
+
+        # members are added later by _populate_structs, struct may be referenced already
+        self.pending_structs.append( \
+            ( struct, self.dies.iter_children( die ), DIE.get_default_accessibility( die ) ) )
+
+        return struct
+
+    def _populate_structs( self ):
+        stack = []
+
+        while True:
+            # structs met while resolving the last member go first, as in depth-first order
+            stack.extend( reversed( self.pending_structs ) )
+            del self.pending_structs[:]
+
+            if len( stack ) == 0:
+                return
+
+            ( struct, children, accessibility ) = stack[ -1 ]
+            child = next( children, None )
+
+            if child == None:
+                stack.pop()
+                continue
+
+            try:
+                self._convert_die_to_struct_member( struct, child, accessibility )
+            except StructCompacterError as error:
+                if self.config.warnings:
+                    print( 'Warning: ', error )
+
+                stack.pop()
+
+    def _convert_die_to_struct_member( self, struct, child, accessibility ):
+        if DIE.is_struct( child ):
+            self._convert_die_to_struct( child )
+        elif struct.__class__ != StructType:
+            return
+        elif DIE.is_inheritance( child ):
+            struct.add_member( self._convert_die_to_inheritance( child ) )
+            struct.set_is_pod( False )
+        elif DIE.is_member( child ) and DIE.is_bit_field( child ):
+            self._add_bit_field( struct, self._convert_die_to_bit_field( child ) )
+            self._check_is_pod( struct, child, accessibility )
+        elif DIE.is_member( child ):
+            struct.add_member( self._convert_die_to_member( child ) )
+            self._check_is_pod( struct, child, accessibility )
+        elif DIE.is_subprogram( child ):
+            self._check_is_pod( struct, child, accessibility )
+
+    def _check_is_pod( self, struct, die, accessibility ):
+        # POD for the purpose of layout as of C++03, Itanium C++ ABI reuses tail padding of others
+        if DIE.is_subprogram( die ):
+            if DIE.is_artificial( die ):
+                return
+
+            name = DIE.get_name( die, self.dies )
+            class_name = TypeName.get_unqualified( struct.get_name() ).split( '<' )[ 0 ]
+
+            if name in ( class_name, '~' + class_name, 'operator=' ):
+                struct.set_is_pod( False )
+        elif DIE.is_artificial( die ):
+            # vptr
+            struct.set_is_pod( False )
+        elif DIE.get_accessibility( die, accessibility ) != DIE.ACCESS_PUBLIC:
+            struct.set_is_pod( False )
+
+    def _convert_dies_to_structs( self, top_die ):
+        stack = [ ( iter( [ top_die ] ), '' ) ]
+
+        while len( stack ) > 0:
+            ( dies, scope ) = stack[ -1 ]
+            die = next( dies, None )
+
+            if die == None:
+                stack.pop()
+                continue
+
+            if DIE.is_struct( die ):
+                if self._check_types_filter( die ):
+                    self._convert_die_to_struct( die )
+                    self._populate_structs()
+
+                # definitions in type units are out of scope of theirs declarations
+                if 'DW_AT_specification' in die.attributes:
+                    self._set_qualified_name( die, self._get_scope( die ) )
+                else:
+                    self._set_qualified_name( die, scope )
+
+            if not DIE.may_define_types( die ):
+                continue
+
+            if DIE.is_scope( die ):
+                scope = scope + DIE.get_name( die, self.dies ) + '::'
+
+            stack.append( ( self.dies.iter_children( die ), scope ) )
+
+    def _convert_die_to_structs( self, dwarf_info, cu_offsets ):
+        for cu in self.dies.iter_cus():
+            if cu_offsets != None and cu.cu_offset not in cu_offsets:
+                continue
+
+            top_die = self.dies.get_top_die( cu )
+
+            self._convert_dies_to_structs( top_die )
+
+    def _convert_indexed_dies_to_structs( self, name_index, cu_offsets ):
+        walk_cu_offsets = set()
+
+        # CUs not covered by name index are walked as usual
+        for cu in self.dies.iter_cus():
+            if cu.cu_offset not in name_index.get_cu_offsets():
+                walk_cu_offsets.add( cu.cu_offset )
+
+        for ( name, cu_offset, die_offset ) in name_index.find( self.types_filter ):
+            if die_offset == None:
+                walk_cu_offsets.add( cu_offset )
+                continue
+
+            if cu_offsets != None and cu_offset not in cu_offsets:
+                continue
+
+            die = self.dies[ die_offset ]
+
+            if not DIE.is_struct( die ) or not self._check_types_filter( die ):
+                continue
+
+            self._convert_die_to_struct( die )
+            self._populate_structs()
+
+            # not all indexes keep qualified names, scope is taken from DIEs
+            self._set_qualified_name( die, self._get_scope( die ) )
+
+        if cu_offsets != None:
+            walk_cu_offsets &= set( cu_offsets )
+
+        if len( walk_cu_offsets ) > 0:
+            self._convert_die_to_structs( None, walk_cu_offsets )
+
+    def _get_scope( self, die ):
+        if 'DW_AT_specification' in die.attributes:
+            die = self.dies[ DIE.get_ref( die, 'DW_AT_specification', self.dies ) ]
+
+        scope = ''
+
+        for parent in self.dies.get_parents( die ):
+            if DIE.is_scope( parent ):
+                scope = scope + DIE.get_name( parent, self.dies ) + '::'
+
+        return scope
+
+    def _check_types_filter( self, die ):
+        if self.types_filter == None:
+            return True
+
+        # only name is read here, members are materialized for matching structs only
+        return self.types_filter.matches( DIE.get_name( die, self.dies ) )
+
+    def _set_qualified_name( self, die, scope ):
+        try:
+            struct = self.types[ die.offset ]
+        except KeyError:
+            return
+
+        # struct may be referenced (and created) before its scope is known
+        struct.set_qualified_name( scope + struct.get_name() )
+
+    def _deduplicate_structs( self ):
+        structs = [ type for type in self.types.values() if type.__class__ == StructType ]
+
+        propagate_is_pod( structs )
+        set_struct_fingerprints( structs )
+
+        return StructDeduplicator().process( self.types.items() )
+
+#
+# Flat table of types for pickle and JSON, which alone recurse as deep as types are nested
+#
+class TypeRef( int ):
+    pass
+
+def flatten_types( value ):
+    objects = []
+    indexes = {}
+
+    def _replace( item ):
+        if isinstance( item, ( IVisitable, MemberTable ) ):
+            if id( item ) not in indexes:
+                indexes[ id( item ) ] = len( objects )
+                objects.append( item )
+
+            return TypeRef( indexes[ id( item ) ] )
+
+        if item.__class__ in ( list, tuple ):
+            return item.__class__( _replace( element ) for element in item )
+
+        if isinstance( item, dict ):
+            return item.__class__( ( _replace( key ), _replace( element ) ) for key, element in item.items() )
+
+        return item
+
+    root = _replace( value )
+    states = []
+
+    # objects grows while states are replaced, each object is handled once
+    i = 0
+    while i < len( objects ):
+        states.append( ( objects[ i ].__class__, _replace( objects[ i ].__dict__ ) ) )
+        i += 1
+
+    return ( states, root )
+
+def unflatten_types( table ):
+    ( states, root ) = table
+
+    objects = [ cls.__new__( cls ) for ( cls, state ) in states ]
+
+    def _resolve( item ):
+        if item.__class__ == TypeRef:
+            return objects[ item ]
+
+        if item.__class__ in ( list, tuple ):
+            return item.__class__( _resolve( element ) for element in item )
+
+        if isinstance( item, dict ):
+            return item.__class__( ( _resolve( key ), _resolve( element ) ) for key, element in item.items() )
+
+        return item
+
+    for ( object, ( cls, state ) ) in zip( objects, states ):
+        object.__dict__.update( _resolve( state ) )
+
+    return _resolve( root )
+
+#
+# Flat table of types as JSON for AnalysisCache. Classes are kept by name and only types of this
+# module are created back, so reading an entry never runs code the way unpickling may.
+#
+def encode_types_table( table ):
+    ( states, root ) = table
+
+    def _encode( item ):
+        if item.__class__ == TypeRef:
+            return { 'ref': int( item ) }
+
+        if item.__class__ == list:
+            return [ _encode( element ) for element in item ]
+
+        if item.__class__ == tuple:
+            return { 'tuple': [ _encode( element ) for element in item ] }
+
+        if item.__class__ == array:
+            return { 'array': item.typecode, 'items': item.tolist() }
+
+        if isinstance( item, dict ):
+            return { 'dict': [ [ _encode( key ), _encode( element ) ] for key, element in item.items() ] }
+
+        return item
+
+    return { 'states': [ [ cls.__name__, _encode( state ) ] for ( cls, state ) in states ], 'root': _encode( root ) }
+
+def decode_types_table( value ):
+    def _get_class( name ):
+        cls = globals().get( name )
+
+        if not isinstance( cls, type ) or not issubclass( cls, ( IVisitable, MemberTable ) ):
+            raise StructCompacterError( 'Class %s is not a type' % name )
+
+        return cls
+
+    def _decode( item ):
+        if item.__class__ == list:
+            return [ _decode( element ) for element in item ]
+
+        if item.__class__ != dict:
+            return item
+
+        if 'ref' in item:
+            return TypeRef( item[ 'ref' ] )
+
+        if 'tuple' in item:
+            return tuple( _decode( element ) for element in item[ 'tuple' ] )
+
+        if 'array' in item:
+            return array( item[ 'array' ], item[ 'items' ] )
+
+        return OrderedDict( ( _decode( key ), _decode( element ) ) for key, element in item[ 'dict' ] )
+
+    states = [ ( _get_class( name ), _decode( state ) ) for ( name, state ) in value[ 'states' ] ]
+
+    return ( states, _decode( value[ 'root' ] ) )
+
+#
+# Parallel reading of DWARF, CUs are split into chunks processed by worker processes
+#
+def split_CUs_into_chunks( cus, chunks_count ):
+    precondition( chunks_count > 0 )
+
+    cus = list( cus )
+
+    total_size = sum( cu[ 'unit_length' ] for cu in cus )
+    chunk_size = max( 1, total_size // chunks_count )
+
+    chunks = [ [] ]
+    size = 0
+
+    for cu in cus:
+        if size >= chunk_size:
+            chunks.append( [] )
+            size = 0
+
+        chunks[ -1 ].append( cu.cu_offset )
+        size += cu[ 'unit_length' ]
+
+    return chunks
+
+def _read_DWARF_CUs( args ):
+    ( file_name, config, cu_offsets, types_filter ) = args
+
+    with open( file_name, 'rb' ) as file:
+        types = Application( config )._read_DWARF_impl( \
+            file_name, open_ELF_file( file ), types_filter, set( cu_offsets ) )
+
+    return flatten_types( types )
 
-    @staticmethod
-    def get_line_number( die ):
-        if 'DW_AT_decl_line' in die.attributes:
-            return die.attributes[ 'DW_AT_decl_line' ].value
+#
+# MappedELFFile maps file into memory, DWARF sections are read through memoryview
+# slices of the mapping, so bytes are copied only when DIE attributes are decoded
+#
+class MemoryViewStream:
+    def __init__( self, view ):
+        self.view = view
+        self.size = len( view )
+        self.position = 0
+
+    def read( self, size = -1 ):
+        position = self.position
+
+        if size < 0:
+            size = self.size
+
+        # slice is clipped at the end of view, it is the only copy made
+        data = self.view[ position : position + size ].tobytes()
+        self.position = position + len( data )
+
+        return data
+
+    def seek( self, offset, whence = os.SEEK_SET ):
+        if whence == os.SEEK_CUR:
+            offset += self.position
+        elif whence == os.SEEK_END:
+            offset += self.size
+
+        self.position = offset
+        return offset
+
+    def tell( self ):
+        return self.position
+
+class InflatingStream( MemoryViewStream ):
+    CHUNK_BITS = 16
+    CHUNK_SIZE = 1 << CHUNK_BITS
+
+    def __init__( self, view, size ):
+        MemoryViewStream.__init__( self, view )
+
+        self.size = size
+
+        self.decompressor = zlib.decompressobj()
+        self.input_offset = 0
+        self.input = b''
+
+        # inflated data in chunks of CHUNK_SIZE, so most reads are one slice
+        self.chunks = []
+        self.inflated_size = 0
+
+    def read( self, size = -1 ):
+        position = self.position
+
+        if size < 0 or position + size > self.size:
+            size = max( 0, self.size - position )
+
+        if size == 0:
+            return b''
+
+        first = position >> InflatingStream.CHUNK_BITS
+        last = ( position + size - 1 ) >> InflatingStream.CHUNK_BITS
+
+        # section is inflated as far as it is read, never further
+        while len( self.chunks ) <= last:
+            self._inflate_chunk()
+
+        begin = position - ( first << InflatingStream.CHUNK_BITS )
+
+        if first == last:
+            data = self.chunks[ first ][ begin : begin + size ]
         else:
-            return -1
+            data = b''.join( self.chunks[ first : last + 1 ] )[ begin : begin + size ]
 
-    @staticmethod
-    def get_type_id( die, dies ):
-        try:
-            return die.attributes[ 'DW_AT_type' ].value
-        except KeyError:
-            pass
+        self.position = position + len( data )
 
-        try:
-            DIE._get_type_id_from_specification( die, dies )
-        except KeyError:
-            pass
+        if self.inflated_size == self.size:
+            self._set_inflated()
 
-        return None
+        return data
 
-    @staticmethod
-    def get_this_offset( die ):
-        attr = die.attributes[ 'DW_AT_data_member_location' ]
-        return decode( attr.value[1:] )
+    def read_all( self ):
+        self.seek( 0 )
+        return self.read()
 
-    @staticmethod
-    def is_template( die, dies ):
-        return TypeName.is_template( DIE.get_name( die, dies ) )
+    # details
 
-    @staticmethod
-    def is_stl( die, dies ):
-        return TypeName.is_stl_internal( DIE.get_name( die, dies ) )
+    def _set_inflated( self ):
+        stream = BytesIO( b''.join( self.chunks ) )
+        stream.seek( self.position )
 
-    @staticmethod
-    def is_local_type( die ):
-        # todo
-        return False
+        self.chunks = None
 
-    @staticmethod
-    def is_inheritance( die ):
-        return die.tag == 'DW_TAG_inheritance'
+        # whole section is inflated, from now on it is read at speed of BytesIO
+        self.read = stream.read
+        self.seek = stream.seek
+        self.tell = stream.tell
 
-    @staticmethod
-    def is_declaration( die ):
-        return 'DW_AT_declaration' in die.attributes
+    def _inflate_chunk( self ):
+        parts = []
+        missing = InflatingStream.CHUNK_SIZE
+
+        while missing > 0:
+            if len( self.input ) == 0:
+                if self.input_offset >= len( self.view ):
+                    parts.append( self.decompressor.flush() )
+                    break
+
+                self.input = self.view[ self.input_offset : self.input_offset + InflatingStream.CHUNK_SIZE ]
+                self.input_offset += len( self.input )
+
+            part = self.decompressor.decompress( self.input, missing )
+            self.input = self.decompressor.unconsumed_tail
+
+            parts.append( part )
+            missing -= len( part )
+
+        chunk = b''.join( parts )
+
+        if len( chunk ) == 0:
+            raise StructCompacterError( 'Compressed section is shorter than its declared size' )
+
+        self.chunks.append( chunk )
+        self.inflated_size += len( chunk )
+
+class MappedELFFile( ELFFile ):
+    SHF_COMPRESSED = 0x800
+    ELFCOMPRESS_ZLIB = 1
+
+    def __init__( self, mapping ):
+        self.mapping = mapping
+        self.view = memoryview( mapping )
+
+        ELFFile.__init__( self, mapping )
+
+    def get_section_data( self, section ):
+        if not self._can_map_section( section, False ):
+            return section.data()
+
+        stream = self._get_section_stream( section )
+
+        if isinstance( stream, InflatingStream ):
+            return stream.read_all()
+
+        return stream.view
+
+    def get_section_by_name( self, name ):
+        section = ELFFile.get_section_by_name( self, name )
+
+        # objcopy leaves sections it can not shrink under theirs .debug names, next to .zdebug ones
+        if section == None and name.startswith( '.zdebug' ) and name != '.zdebug_info':
+            section = ELFFile.get_section_by_name( self, '.' + name[ 2 : ] )
+
+        return section
 
     # details
 
-    @staticmethod
-    def _get_name_impl( die ):
-        return die.attributes[ 'DW_AT_name' ].value.decode( 'utf-8' )
+    def _read_dwarf_section( self, section, relocate_dwarf_sections ):
+        if not self._can_map_section( section, relocate_dwarf_sections ):
+            return ELFFile._read_dwarf_section( self, section, relocate_dwarf_sections )
+
+        stream = self._get_section_stream( section )
+
+        fields = { \
+            'stream' : stream \
+            , 'name' : section.name \
+            , 'global_offset' : section[ 'sh_offset' ] \
+            , 'size' : stream.size }
+
+        # newer pyelftools keeps also section address
+        if 'address' in DebugSectionDescriptor._fields:
+            fields[ 'address' ] = section[ 'sh_addr' ]
+
+        return DebugSectionDescriptor( ** fields )
 
     @staticmethod
-    def _get_name_from_specification( die, dies ):
-        specification_id = die.attributes[ 'DW_AT_specification' ].value
-        specification_die = dies[ specification_id ]
-        result = DIE.get_name( specification_die, dies )
+    def _decompress_dwarf_section( section ):
+        # .zdebug sections are inflated on demand by InflatingStream already
+        if isinstance( section.stream, InflatingStream ) or not section.name.startswith( '.zdebug' ):
+            return section
 
-        return result
+        return ELFFile._decompress_dwarf_section( section )
+
+    def _get_section_stream( self, section ):
+        offset = section[ 'sh_offset' ]
+        view = self.view[ offset : offset + section[ 'sh_size' ] ]
+
+        if section[ 'sh_flags' ] & MappedELFFile.SHF_COMPRESSED:
+            endian = '<' if self.little_endian else '>'
+
+            if self.elfclass == 64:
+                ( compression, reserved, size ) = unpack_from( endian + 'IIQ', view, 0 )
+                header_size = 24
+            else:
+                ( compression, size ) = unpack_from( endian + 'II', view, 0 )
+                header_size = 12
+
+            if compression != MappedELFFile.ELFCOMPRESS_ZLIB:
+                raise StructCompacterError( 'Compression (%d) of section %s is not supported' \
+                    % ( compression, section.name ) )
+
+            return InflatingStream( view[ header_size : ], size )
+
+        # GNU style compression, 'ZLIB' and big endian size go first
+        if section.name.startswith( '.zdebug' ) and view[ 0 : 4 ].tobytes() == b'ZLIB':
+            return InflatingStream( view[ 12 : ], unpack_from( '>Q', view, 4 )[ 0 ] )
+
+        return MemoryViewStream( view )
+
+    def _can_map_section( self, section, relocate_dwarf_sections ):
+        if section[ 'sh_type' ] == 'SHT_NOBITS':
+            return False
+
+        # relocations are applied on a copy, it happens for object files only
+        if relocate_dwarf_sections and self[ 'e_type' ] == 'ET_REL':
+            return find_relocations( self, section ) == None
+
+        return True
+
+def open_ELF_file( file ):
+    try:
+        mapping = mmap.mmap( file.fileno(), 0, access = mmap.ACCESS_READ )
+    except ( ValueError, EnvironmentError ):
+        # empty files and special files can not be mapped
+        return ELFFile( file )
+
+    return MappedELFFile( mapping )
+
+#
+# ELFSections reads ELF section headers without pyelftools, it is enough to identify a file
+#
+class ELFSections:
+    def __init__( self, file ):
+        self.file = file
+        self.sections = OrderedDict()
+
+        self._read_sections()
+
+    def get_names( self ):
+        return list( self.sections.keys() )
+
+    def has_section( self, name ):
+        return name in self.sections
+
+    def get_offset_and_size( self, name ):
+        return self.sections[ name ]
+
+    def read( self, name ):
+        ( offset, size ) = self.sections[ name ]
+
+        self.file.seek( offset )
+        return self.file.read( size )
+
+    def iter_chunks( self, name, chunk_size = 1024 * 1024 ):
+        ( offset, size ) = self.sections[ name ]
+
+        self.file.seek( offset )
+
+        while size > 0:
+            chunk = self.file.read( min( chunk_size, size ) )
+
+            if len( chunk ) == 0:
+                raise StructCompacterError( 'Section %s is truncated' % name )
+
+            size -= len( chunk )
+            yield chunk
+
+    def get_build_id( self ):
+        if not self.has_section( '.note.gnu.build-id' ):
+            return None
+
+        note = self.read( '.note.gnu.build-id' )
+
+        if len( note ) < 12:
+            return None
+
+        ( name_size, desc_size, note_type ) = unpack_from( self.endian + 'III', note, 0 )
+
+        # NT_GNU_BUILD_ID
+        if note_type != 3:
+            return None
+
+        desc_offset = 12 + ( ( name_size + 3 ) // 4 ) * 4
+
+        return note[ desc_offset : desc_offset + desc_size ]
+
+    # details
+
+    def _read_sections( self ):
+        self.file.seek( 0 )
+        ident = self.file.read( 16 )
+
+        if len( ident ) < 16 or ident[ 0 : 4 ] != b'\x7fELF':
+            raise StructCompacterError( 'File is not in ELF format' )
+
+        self.endian = '<' if ident[ 5 ] == 1 else '>'
+
+        if ident[ 4 ] == 2:
+            header_format = self.endian + 'HHIQQQIHHHHHH'
+            section_format = self.endian + 'IIQQQQIIQQ'
+        else:
+            header_format = self.endian + 'HHIIIIIHHHHHH'
+            section_format = self.endian + 'IIIIIIIIII'
+
+        header = self.file.read( calcsize( header_format ) )
+        header = unpack_from( header_format, header, 0 )
+
+        ( section_offset, section_size, sections_count, names_index ) \
+            = ( header[ 5 ], header[ 10 ], header[ 11 ], header[ 12 ] )
+
+        if section_offset == 0:
+            return
+
+        self.file.seek( section_offset )
+        first = unpack_from( section_format, self.file.read( calcsize( section_format ) ), 0 )
+
+        # extended numbering, real values are kept in the first section header
+        if sections_count == 0:
+            sections_count = first[ 5 ]
+
+        if names_index == 0xffff:
+            names_index = first[ 6 ]
+
+        self.file.seek( section_offset )
+        table = self.file.read( sections_count * section_size )
+
+        headers = [ unpack_from( section_format, table, i * section_size ) \
+            for i in range( sections_count ) ]
+
+        names_offset = headers[ names_index ][ 4 ]
+        names_size = headers[ names_index ][ 5 ]
+
+        self.file.seek( names_offset )
+        names = self.file.read( names_size )
+
+        for header in headers:
+            name_end = names.find( b'\0', header[ 0 ] )
+            name = names[ header[ 0 ] : name_end ].decode( 'utf-8', 'replace' )
+
+            # SHT_NOBITS has no content in file
+            if header[ 1 ] == 8:
+                continue
+
+            self.sections[ name ] = ( header[ 4 ], header[ 5 ] )
+
+#
+# AnalysisCache keeps types read from DWARF on disk, keyed by ELF build-id or debug sections hash.
+# Structs are compacted on each run, they depend on structs of other inputs and options.
+#
+class AnalysisCache:
+    # bumped whenever layout of cached types changes
+    FORMAT = 9
+
+    def __init__( self, directory ):
+        self.directory = directory
+
+    def get_key( self, file_name, options = '' ):
+        digest = hashlib.sha1()
+        digest.update( ( 'StructCompacter %s %d' % ( VERSION, AnalysisCache.FORMAT ) ).encode( 'utf-8' ) )
+
+        # options changing types read, types of other --types filters are kept apart
+        digest.update( options.encode( 'utf-8' ) )
+
+        with open( file_name, 'rb' ) as file:
+            sections = ELFSections( file )
+            build_id = sections.get_build_id()
+
+            if build_id != None:
+                digest.update( b'build-id' )
+                digest.update( build_id )
+            else:
+                for name in sections.get_names():
+                    if not AnalysisCache._is_debug_section( name ):
+                        continue
+
+                    digest.update( name.encode( 'utf-8' ) )
+
+                    for chunk in sections.iter_chunks( name ):
+                        digest.update( chunk )
+
+        return digest.hexdigest()
+
+    def load( self, key ):
+        try:
+            with open( self._get_path( key ), 'r' ) as file:
+                return unflatten_types( decode_types_table( json.load( file ) ) )
+        except ( IOError, OSError, ValueError, KeyError, TypeError, StructCompacterError ):
+            return None
+
+    def store( self, key, value ):
+        if not os.path.isdir( self.directory ):
+            os.makedirs( self.directory )
+
+        ( handle, temp_name ) = tempfile.mkstemp( dir = self.directory )
+
+        # write to temporary file first, so concurrent runs never see partial entry
+        with os.fdopen( handle, 'w' ) as file:
+            json.dump( encode_types_table( flatten_types( value ) ), file )
+
+        os.replace( temp_name, self._get_path( key ) )
+
+    # details
+
+    def _get_path( self, key ):
+        return os.path.join( self.directory, key + '.json' )
 
     @staticmethod
-    def _get_type_id_from_specification( die, dies ):
-        specification_id = die.attributes[ 'DW_AT_specification' ].value
-        specification_die = dies[ specification_id ]
-        result = DIE.get_type_id( specification_die )
+    def _is_debug_section( name ):
+        for prefix in ( '.debug', '.zdebug', '.rela.debug', '.rel.debug' ):
+            if name.startswith( prefix ):
+                return True
 
-        return result
+        return False
 
 #
-# DIEReader from DWARF/DIEs into abstract representation of types
+# Application
 #
-class DIEReader:
+class Application:
     def __init__( self, config ):
         self.config = config
 
-        self.dies = {}
-        self.types = {}
+        self.die_reader = DIEReader( config )
 
-        self.ptr_size = None
-        self.ref_size = None
+        self.types_filter = TypeFilter( config.types )
+        self.profile = AccessProfile( config.profile )
+        self.instances = InstanceCounts( config.instances )
 
-    def process( self, dwarf_info ):
-        self.ptr_size = self._get_ptr_size( dwarf_info )
-        self.ref_size = self.ptr_size
+        if config.summary:
+            self.summary = SavingsSummary( config.summary_top )
+        else:
+            self.summary = None
 
-        self._make_dies_mapping( dwarf_info )
-        self._convert_die_to_structs( dwarf_info )
+        if config.patch != None:
+            self.patch = SourcePatch()
+        else:
+            self.patch = None
 
-        return self.types
+        # types skipped by analysis as ( type, phase, reason )
+        self.skipped = []
 
-    def get_types( self ):
-        return self.types
+        # structs are packed once, even when embedded in structs of many files
+        self.compact_struct_visitor = CompactStructVisitor( self.config.engine, self.config.budget, \
+            self.profile, self.config.cache_line )
 
-    # details
+        self.report = None
+        self.output = OutputDirectory()
 
-    def _get_ptr_size( self, dwarf_info ):
-        for cu in dwarf_info.iter_CUs():
-            return cu[ 'address_size' ]
+    def open_output( self ):
+        # workers reading DWARF in parallel create Application too, they do not write any output
+        self.report = open_report( self.config.format, self.config.output )
+        self.output = open_output( self.config.archive )
 
-    def _create_type( self, die ):
-        type = self._resolve_type( die )
-        self.types[ die.offset ] = type
-        return type
+    def close( self ):
+        if self.report != None:
+            self.report.close()
 
-    def _get_or_create_type( self, die ):
-        if die.offset in self.types:
-            return self.types[ die.offset ]
-        else:
-            return self._create_type( die )
+        self.output.close()
 
-    def _resolve_type( self, die ):
-        if die.offset in self.types:
-            return self.types[ die.offset ]
+    def process( self, file_names ):
+        deduplicator = StructDeduplicator()
+
+        # types of each file are dropped once it is reported, packed structs are kept for ranking
+        packed_types = []
+
+        for file_name in file_names:
+            if len( file_names ) > 1:
+                print( 'Processing', file_name )
+
+            try:
+                ( file_types, file_skipped ) = self._analyze( file_name )
+            except ( StructCompacterError, ELFError ) as e:
+                print( 'File', file_name, 'skipped since', e )
+                continue
+
+            # the same struct comes from many files, the first one is compacted only
+            file_types = deduplicator.process( \
+                ( ( file_name, id ), type ) for ( id, type ) in file_types.items() )
+
+            self.skipped = [ ( type, phase, reason ) for ( type, phase, reason ) in file_skipped \
+                if not deduplicator.is_replaced( type ) ]
+
+            print( 'Compacting structs...' )
+            file_packed_types = self._compact_structs( file_types )
+
+            packed_types.extend( file_packed_types )
+
+            if self.config.verbose:
+                self._print_structs( file_types, len( file_names ) > 1 )
+
+            if self.summary != None:
+                self._add_to_summary( file_types, file_packed_types, self.skipped )
+
+            if self.patch != None:
+                self._add_to_patch( file_name, file_types, file_packed_types )
+
+            self.skipped = []
+
+        print( '... and finally:' )
+
+        packed_types = self.instances.rank( packed_types )
+
+        if self.report != None:
+            self._write_report( packed_types )
+        elif self.config.diff:
+            self._print_diff_of_structs( packed_types )
         else:
-            return self._resolve_type_impl( die )
+            self._dump_structs_to_files( packed_types )
 
-    def _cache( self, offset, type ):
-        self.types[ offset ] = type
-        return type
+        self._print_top_level_savings( packed_types )
 
-    def _resolve_type_impl( self, die ):
+        if not self.instances.is_empty():
+            self._print_total_saving( packed_types )
 
-        # process simple types
+        if self.summary != None:
+            self.summary.print_summary()
 
-        name = DIE.get_name( die, self.dies )
-        size = DIE.get_size( die )
+        if self.patch != None:
+            self._write_patch()
 
-        if die.tag == 'DW_TAG_class_type' or die.tag == 'DW_TAG_structure_type':
-            return self._convert_die_to_struct( die )
+        if self.config.guards != None:
+            self._write_guards( packed_types )
 
-        # cache type
-        if die.tag == 'DW_TAG_base_type':
-            return self._cache( die.offset, BaseType( name, size ) )
-        elif die.tag == 'DW_TAG_union_type':
-            return self._cache( die.offset, UnionType( name, size ) )
-        elif die.tag == 'DW_TAG_enumeration_type':
-            return self._cache( die.offset, EnumType( name, size ) )
+        print( 'Done.' )
+
+    # details
+
+    def _analyze( self, file_name ):
+        if self.config.cache == None:
+            return self._analyze_impl( file_name )
+
+        cache = AnalysisCache( self.config.cache )
+        key = cache.get_key( file_name, 'types=%s' % ','.join( sorted( self.config.types ) ) )
+        cached = cache.load( key )
+
+        if cached != None:
+            print( 'Reading analysis from cache...' )
+            return cached
+
+        result = self._analyze_impl( file_name )
+        cache.store( key, result )
+
+        return result
+
+    def _add_to_summary( self, types, packed_types, skipped ):
+        packed_structs = dict( ( id( struct ), packed ) for ( struct, packed ) in packed_types )
+
+        for type in types.values():
+            if type.__class__ == StructType and self._check_types_filter( type ):
+                self.summary.add_struct( type, packed_structs.get( id( type ) ) )
+
+        for ( type, phase, reason ) in skipped:
+            if self._check_types_filter( type ):
+                self.summary.add_skipped( phase, reason )
+
+    def _add_to_patch( self, file_name, types, packed_types ):
+        keys = dict( ( id( type ), key ) for ( key, type ) in types.items() )
+
+        # duplicates of structs from previous files are not in types
+        packed_structs = [ ( struct, packed ) for ( struct, packed ) in packed_types \
+            if id( struct ) in keys and self._check_types_filter( struct ) ]
+
+        if len( packed_structs ) == 0:
+            return
+
+        try:
+            source_files = SourceFiles( file_name, self.config.source_dir )
+        except ( ELFError, IOError, OSError ) as error:
+            print( 'Sources of', file_name, 'skipped since', error )
+            return
+
+        for ( struct, packed ) in packed_structs:
+            ( file_name, die_offset ) = keys[ id( struct ) ]
+            declarations = get_declarations( struct )
+            path = None
+
+            # offsets of split DWARF are meaningful within its .dwo file or package only
+            if not isinstance( die_offset, tuple ) and len( declarations ) > 0:
+                try:
+                    path = source_files.get_path( die_offset, declarations[ 0 ][ 1 ] )
+                except ELFError as error:
+                    if self.config.warnings:
+                        print( 'Warning: ', error )
+
+            reason = self.patch.add( struct, packed, path )
+
+            if reason != None and self.config.warnings:
+                print( 'Warning: declarations of {%s} not reordered since %s' % ( struct.get_name(), reason ) )
+
+    def _write_patch( self ):
+        try:
+            with open( self.config.patch, 'w' ) as file:
+                self.patch.write( file )
+        except ( IOError, OSError ) as error:
+            print( 'Patch', self.config.patch, 'not created since', error )
+            return
+
+        print( 'Patch', self.config.patch, 'created, declarations of %d structs reordered' \
+            % self.patch.get_reordered() )
+
+    def _write_guards( self, packed_structs ):
+        guards = LayoutGuards( self.config.guards )
 
-        # process derived types
+        for ( struct, packed ) in packed_structs:
+            if packed == None or self._check_types_filter( struct ) == False:
+                continue
 
-        type_id = DIE.get_type_id( die, self.dies )
+            # layouts the patch does not give are not guarded, compilation of patched sources would fail
+            if self.patch != None and not self.patch.contains( struct ):
+                if self.config.warnings:
+                    print( 'Warning: layout of {%s} not guarded since its declarations are not reordered' \
+                        % struct.get_name() )
 
-        if type_id == None:
-            type = UnknownType( 'type_id is None' )
-        else:
-            type = self._get_or_create_type( self.dies[ type_id ] )
+                continue
 
-        # do not cache type
-        if die.tag == 'DW_TAG_member':
-            return type
-        elif die.tag == 'DW_TAG_inheritance':
-            return type
-        elif die.tag == 'DW_TAG_typedef':
-            return type
-        elif die.tag == 'DW_TAG_array_type':
-            return ArrayType( type )
+            if not guards.add( struct, packed ) and self.config.warnings:
+                print( 'Warning: layout of {%s} not guarded since its name is repeated or unknown' \
+                    % struct.get_name() )
 
-        # cache type
-        if die.tag == 'DW_TAG_pointer_type':
-            return self._cache( die.offset, PtrType( type, self.ptr_size ) )
-        elif die.tag == 'DW_TAG_reference_type':
-            return self._cache( die.offset, RefType( type, self.ref_size ) )
-        elif die.tag == 'DW_TAG_const_type':
-            return self._cache( die.offset, ConstType( type ) )
-        elif die.tag == 'DW_TAG_volatile_type':
-            return self._cache( die.offset, VolatileType( type ) )
+        try:
+            with open( self.config.guards, 'w' ) as file:
+                guards.write( file )
+        except ( IOError, OSError ) as error:
+            print( 'Guards', self.config.guards, 'not created since', error )
+            return
 
-        return UnknownType( 'Wrong die.tag %s' % die.tag )
+        print( 'Guards', self.config.guards, 'created, layouts of %d structs guarded' % guards.get_count() )
 
-    def _resolve_member_type( self, die ):
-        type_id = DIE.get_type_id( die, self.dies )
+    def _analyze_impl( self, file_name ):
+        self.skipped = []
 
-        if type_id == None:
-            return UnknownType( 'type_id is None' )
+        if not self.types_filter.is_empty():
+            types_filter = self.types_filter
         else:
-            return self._resolve_type( self.dies[ type_id ] )
+            types_filter = None
 
-    def _convert_die_to_member( self, die ):
-        assert DIE.is_member( die ), 'die has to be a member'
+        print( 'Reading DWARF (may take some time)...' )
+        types = self._read_DWARF( file_name, types_filter )
 
-        name = DIE.get_name( die, self.dies )
-        file_id = DIE.get_file_id( die );
-        line_no = DIE.get_line_number( die )
-        type = self._resolve_member_type( die )
-        this_offset = DIE.get_this_offset( die )
+        print( 'Fixing types...' )
+        types = self._fix_types( types )
 
-        return Member( name, file_id, line_no, type, this_offset )
+        print( 'Finding paddings...' )
+        types = self._find_padding( types )
 
-    def _convert_die_to_inheritance( self, die ):
-        assert DIE.is_inheritance( die ), 'die has to be a inheritance'
+        return ( types, self.skipped )
 
-        type = self._resolve_member_type( die )
-        this_offset = DIE.get_this_offset( die )
+    def _read_DWARF( self, file_name, types_filter ):
+        if self.config.jobs > 1:
+            return self._read_DWARF_in_parallel( file_name, types_filter )
 
-        return Inheritance( type, this_offset )
+        with open( file_name, 'rb' ) as file:
+            elfFile = open_ELF_file( file )
+            return self._read_DWARF_impl( file_name, elfFile, types_filter )
 
-    def _create_struct_or_declaration( self, die ):
-        size = DIE.get_size( die )
-        name = DIE.get_name( die, self.dies )
-        is_declaration = DIE.is_declaration( die )
+    def _read_DWARF_impl( self, file_name, elfFile, types_filter, cu_offsets = None ):
+        if not elfFile.has_dwarf_info():
+            raise StructCompacterError( "File %s has no DWARF info" % file_name )
 
-        if is_declaration or size == None:
-            return DeclarationType( name )
+        skeletons = self._find_skeleton_units( elfFile )
 
-        struct = StructType( name, size )
-        return self._cache( die.offset, struct )
+        if len( skeletons ) > 0:
+            return self._read_split_DWARF( file_name, skeletons, types_filter, cu_offsets )
 
-    def _convert_die_to_struct( self, die ):
-        assert DIE.is_struct( die ), 'die has to be a struct %s' % die.tag
+        dwarfInfo = read_DWARF_info( elfFile, self.config.reader )
 
-        try:
-            return self.types[ die.offset ]
-        except KeyError:
-            struct = self._create_struct_or_declaration( die )
+        if types_filter != None:
+            name_index = self._read_name_index( elfFile, dwarfInfo )
+        else:
+            name_index = None
 
+        # DIE offsets are meaningful within one file only
+        self.die_reader = DIEReader( self.config, types_filter )
+        return self.die_reader.process( dwarfInfo, cu_offsets, name_index )
+
+    def _find_skeleton_units( self, elfFile ):
         try:
-            for child in die.iter_children():
-                if DIE.is_inheritance( child ):
-                    struct.add_member( self._convert_die_to_inheritance( child ) )
-                elif DIE.is_member( child ):
-                    struct.add_member( self._convert_die_to_member( child ) )
-                elif DIE.is_struct( child ):
-                    self._convert_die_to_struct( child )
+            return find_skeleton_units( elfFile )
         except StructCompacterError as error:
             if self.config.warnings:
-                print( 'Warning: ', error )
+                print( 'Warning: split DWARF not checked since', error )
 
-        return struct
+            return []
 
-    def _make_dies_mapping_recursively( self, die ):
-        self.dies[ die.offset ] = die
+    def _read_split_DWARF( self, file_name, skeletons, types_filter, cu_offsets ):
+        if cu_offsets != None:
+            skeletons = [ skeleton for skeleton in skeletons if skeleton.get_cu_offset() in cu_offsets ]
 
-        for children in die.iter_children():
-            self._make_dies_mapping_recursively( children )
+        items = []
 
-    def _convert_die_to_structs_recursively( self, die ):
-        if DIE.is_struct( die ):
-            self._convert_die_to_struct( die )
+        package_name = find_DWARF_package( file_name )
 
-        for children in die.iter_children():
-            self._convert_die_to_structs_recursively( children )
+        if package_name != None:
+            # sections of package are read lazily, the file is kept open while DIEs are read
+            with open( package_name, 'rb' ) as file:
+                package = DWARFPackage( open_ELF_file( file ) )
 
-    def _make_dies_mapping( self, dwarf_info ):
-        for cu in dwarf_info.iter_CUs():
-            top_die = cu.get_top_DIE()
+                unit_offsets = set()
+                not_packed = []
 
-            self._make_dies_mapping_recursively( top_die )
+                for skeleton in skeletons:
+                    unit_offset = package.get_unit_offset( skeleton.get_dwo_id() )
 
-    def _convert_die_to_structs( self, dwarf_info ):
-        for cu in dwarf_info.iter_CUs():
-            top_die = cu.get_top_DIE()
+                    if unit_offset == None:
+                        not_packed.append( skeleton )
+                    else:
+                        unit_offsets.add( unit_offset )
 
-            self._convert_die_to_structs_recursively( top_die )
+                types = DIEReader( self.config, types_filter ).process( package.get_dwarf_info(), unit_offsets )
+                items.extend( ( ( package_name, id ), type ) for ( id, type ) in types.items() )
 
-#
-# Application
-#
-class Application:
-    def __init__( self, config ):
-        self.config = config
+            skeletons = not_packed
 
-        self.dies = {}
-        self.die_reader = DIEReader( config )
+        dwo_names = set()
 
-    def process( self, file_name ):
-        try:
-            print( 'Reading DWARF (may take some time)...' )
-            types = self._read_DWARF( file_name )
+        for skeleton in skeletons:
+            dwo_name = find_DWO_file( file_name, skeleton )
 
-            print( 'Fixing types...' )
-            types = self._fix_types( types )
+            if dwo_name == None:
+                if self.config.warnings:
+                    print( 'Warning: file', skeleton.get_dwo_name(), 'not found' )
 
-            print( 'Finding paddings...' )
-            types = self._find_padding( types )
+                continue
 
-            if self.config.verbose:
-                self._print_structs( types )
+            if dwo_name in dwo_names:
+                continue
 
-            print( 'Compacting structs...' )
-            packed_types = self._compact_structs( types )
+            dwo_names.add( dwo_name )
 
-            print( '... and finally:' )
+            with open( dwo_name, 'rb' ) as file:
+                dwarf_info = read_native_DWARF_info( open_ELF_file( file ), '.dwo' )
 
-            if self.config.diff:
-                self._print_diff_of_structs( packed_types )
-            else:
-                self._dump_structs_to_files( packed_types )
+                types = DIEReader( self.config, types_filter ).process( dwarf_info )
+                items.extend( ( ( dwo_name, id ), type ) for ( id, type ) in types.items() )
 
-            print( 'Done.' )
+        # the same struct comes from many units, keep one of them
+        return StructDeduplicator().process( items )
 
-        except EBOError as e:
-            print( 'File', file_name, 'skipped since', e )
+    def _read_name_index( self, elfFile, dwarfInfo ):
+        try:
+            return read_name_index( elfFile, dwarfInfo )
+        except ( StructCompacterError, ELFError ) as error:
+            if self.config.warnings:
+                print( 'Warning: name index skipped since', error )
 
-    # details
+            return None
 
-    def _read_DWARF( self, file_name ):
+    def _read_DWARF_in_parallel( self, file_name, types_filter ):
         with open( file_name, 'rb' ) as file:
-            elfFile = ELFFile( file )
-            return self._read_DWARF_impl( elfFile )
+            elfFile = open_ELF_file( file )
 
-    def _read_DWARF_impl( self, elfFile ):
-        if not elfFile.has_dwarf_info():
-            raise Exception( "File %s has no DWARF info" % file_name )
+            if not elfFile.has_dwarf_info():
+                raise StructCompacterError( "File %s has no DWARF info" % file_name )
 
-        dwarfInfo = elfFile.get_dwarf_info()
-        return self.die_reader.process( dwarfInfo )
+            cus = DIECache( read_DWARF_info( elfFile, self.config.reader ) ).iter_cus()
+            chunks = split_CUs_into_chunks( cus, self.config.jobs * 4 )
 
-    def _get_types( self ):
-        return self.die_reader.get_types()
+        if len( chunks ) < 2:
+            with open( file_name, 'rb' ) as file:
+                return self._read_DWARF_impl( file_name, open_ELF_file( file ), types_filter )
 
-    def _check_types_filter( self, struct ):
-        if len( self.config.types ) == 0:
-            return True
+        pool = multiprocessing.Pool( min( self.config.jobs, len( chunks ) ) )
 
-        for pattern in self.config.types:
-            if pattern[ -1 ] == '*':
-                if struct._get_name().startswith( pattern[ 0 : -1 ] ):
-                    return True
-            else:
-                if struct._get_name() == pattern:
-                    return True
+        try:
+            tables = pool.map( _read_DWARF_CUs, \
+                [ ( file_name, self.config, chunk, types_filter ) for chunk in chunks ] )
+        finally:
+            pool.close()
+            pool.join()
 
-        return False
+        # the same struct may come from many workers, keep one of them
+        items = []
+
+        for table in tables:
+            items.extend( unflatten_types( table ).items() )
+
+        return StructDeduplicator().process( items )
+
+    def _check_types_filter( self, struct ):
+        return self.types_filter.matches( struct._get_name() )
 
     def _dump_structs_to_files( self, packed_structs ):
         for ( struct, packed ) in packed_structs:
@@ -2398,21 +7347,17 @@ class Application:
             struct_file_name = struct.get_name() + '.old.' + str( struct.get_size() ) + '.sc'
             packed_file_name = struct.get_name() + '.new.' + str( packed.get_size() ) + '.sc'
 
-            struct_file = open( struct_file_name, 'w' )
-            packed_file = open( packed_file_name, 'w' )
-
-            sys.stdout = struct_file
-            print_struct( struct, self.config.columns )
-
-            sys.stdout = packed_file
-            print_struct( packed, self.config.columns )
+            self.output.write( struct_file_name, \
+                format_struct( struct, self.config.columns, self.config.cache_line ) )
+            self.output.write( packed_file_name, \
+                format_struct( packed, self.config.columns, self.config.cache_line ) )
 
-            struct_file.close()
-            packed_file.close()
-
-            sys.stdout = sys.__stdout__
+            if self.output.get_location() == None:
+                print( 'Files', struct_file_name, packed_file_name, 'created' )
+            else:
+                print( 'Files', struct_file_name, packed_file_name, 'added to', self.output.get_location() )
 
-            print( 'Files', struct_file_name, packed_file_name, 'created' )
+            self._print_saving( struct, packed )
 
     def _print_diff_of_structs( self, packed_structs ):
         for ( struct, packed ) in packed_structs:
@@ -2423,30 +7368,106 @@ class Application:
                 continue
 
             if self.config.stdout:
-                print_diff_of_structs( struct, packed, self.config.columns )
+                print_diff_of_structs( struct, packed, self.config.columns, self.config.cache_line )
+                self._print_saving( struct, packed )
                 print( '\n' )
             else:
                 file_name = struct.get_name() + '.sc'
-                file = open( file_name, 'w' )
 
-                print( 'File', file_name, 'created.' )
+                if self.output.get_location() == None:
+                    print( 'File', file_name, 'created.' )
+                else:
+                    print( 'File', file_name, 'added to', self.output.get_location() )
+
+                self.output.write( file_name, \
+                    format_diff_of_structs( struct, packed, self.config.columns, self.config.cache_line ) \
+                        + self._format_saving( struct, packed ) )
+
+    def _write_report( self, packed_structs ):
+        for ( struct, packed ) in packed_structs:
+            if packed == None:
+                continue
+
+            if self._check_types_filter( struct ) == False:
+                continue
+
+            record = make_struct_record( struct, packed )
+            record[ 'instances' ] = self.instances.get_count( struct )
+            record[ 'instances_saving' ] = self.instances.get_saving( struct, packed )
+
+            self.report.write( record )
+
+    def _print_saving( self, struct, packed ):
+        for text in self._format_saving( struct, packed ):
+            print( text )
+
+    def _format_saving( self, struct, packed ):
+        saving = self.instances.get_saving( struct, packed )
+
+        if saving == None:
+            return []
+
+        return [ 'Instances: %d, saved: %d bytes' % ( self.instances.get_count( struct ), saving ) ]
+
+    def _print_top_level_savings( self, packed_structs ):
+        packed_structs = [ ( struct, packed ) for ( struct, packed ) in packed_structs \
+            if packed != None and self._check_types_filter( struct ) ]
+
+        structs = set( struct for ( struct, packed ) in packed_structs )
+        embedded = set()
+        embedding = set()
+
+        for struct in structs:
+            for member in struct.get_members():
+                nested = get_embedded_struct( member.get_type() )
+
+                if nested in structs:
+                    embedded.add( nested )
+                    embedding.add( struct )
+
+        # saving of type which is not embedded in others includes savings of types embedded in it
+        top_level = [ ( struct, packed ) for ( struct, packed ) in packed_structs \
+            if struct in embedding and struct not in embedded ]
+
+        if len( top_level ) == 0:
+            return
+
+        print( 'Savings of top-level types, embedded structs included:' )
+
+        for ( struct, packed ) in sorted( top_level, key = lambda item: item[ 1 ].get_size() - item[ 0 ].get_size() ):
+            print( '{%s}(%d/%d) %d bytes' % ( struct.get_name(), struct.get_size(), packed.get_size(), \
+                struct.get_size() - packed.get_size() ) )
+
+    def _print_total_saving( self, packed_structs ):
+        total = 0
+
+        for ( struct, packed ) in packed_structs:
+            if packed == None or self._check_types_filter( struct ) == False:
+                continue
+
+            total += self.instances.get_saving( struct, packed ) or 0
 
-                sys.stdout = file
-                print_diff_of_structs( struct, packed, self.config.columns )
-                file.close()
-                sys.stdout = sys.__stdout__
+        print( 'Saved %d bytes by all instances' % total )
 
-    def _print_structs( self, types ):
+    def _print_structs( self, types, with_file_name ):
         print_output_visitor = PrintStructVisitor()
 
-        for id, type in types.items():
+        for ( file_name, id ), type in types.items():
             if self._check_types_filter( type ) == False:
                 continue
 
-            type.accept( print_output_visitor, id )
+            # offsets of split DWARF are meaningful within its .dwo file or package only
+            if isinstance( id, tuple ):
+                label = '%s:%x' % id
+            elif with_file_name:
+                label = '%s:%x' % ( file_name, id )
+            else:
+                label = '%x' % id
+
+            type.accept( print_output_visitor, label )
 
     def _compact_structs( self, types ):
-        visitor = CompactStructVisitor()
+        visitor = self.compact_struct_visitor
 
         packed_types = []
 
@@ -2461,8 +7482,20 @@ class Application:
 
                 if packed:
                     packed_types.append( ( type, packed ) )
+                elif type.__class__ == StructType:
+                    reason = visitor.get_skip_reason( type )
+
+                    if reason != None:
+                        self.skipped.append( ( type, 'compacting structs', reason ) )
 
             except EBOError as error:
+                self.skipped.append( ( type, 'compacting structs', 'EBO error' ) )
+
+                if self.config.warnings:
+                    print( 'Warning: ', error )
+            except TypeNotWellDefinedError as error:
+                self.skipped.append( ( type, 'compacting structs', 'not well defined' ) )
+
                 if self.config.warnings:
                     print( 'Warning: ', error )
 
@@ -2475,9 +7508,13 @@ class Application:
             try:
                 type.accept( visitor, None )
             except EBOError as error:
+                self.skipped.append( ( type, 'finding paddings', 'EBO error' ) )
+
                 if self.config.warnings:
                     print( 'Warning: ', error )
             except TypeNotWellDefinedError as error:
+                self.skipped.append( ( type, 'finding paddings', 'not well defined' ) )
+
                 if self.config.warnings:
                     print( 'Warning: ', error )
 
@@ -2490,21 +7527,59 @@ class Application:
             try:
                 type.accept( visitor, None )
             except EBOError as error:
+                self.skipped.append( ( type, 'fixing types', 'EBO error' ) )
+
                 if self.config.warnings:
                     print( 'Warning: ', error )
             except TypeNotWellDefinedError as error:
+                self.skipped.append( ( type, 'fixing types', 'not well defined' ) )
+
                 if self.config.warnings:
                     print( 'Warning: ', error )
 
         return types
 
+#
+# Input files, directories and glob patterns are expanded into list of ELF files
+#
+def is_elf_file( file_name ):
+    try:
+        with open( file_name, 'rb' ) as file:
+            return file.read( 4 ) == b'\x7fELF'
+    except ( IOError, OSError ):
+        return False
+
+def expand_input_files( paths ):
+    result = []
+
+    for path in paths:
+        if os.path.isdir( path ):
+            for ( directory, subdirectories, file_names ) in os.walk( path ):
+                subdirectories.sort()
+
+                for file_name in sorted( file_names ):
+                    file_name = os.path.join( directory, file_name )
+
+                    if is_elf_file( file_name ):
+                        result.append( file_name )
+
+        elif glob.has_magic( path ):
+            result.extend( expand_input_files( sorted( glob.glob( path, recursive = True ) ) ) )
+        else:
+            result.append( path )
+
+    # the same file given twice is processed once
+    return list( OrderedDict.fromkeys( result ) )
+
 def process_argv( argv ):
     parser = argparse.ArgumentParser(
         formatter_class=argparse.RawDescriptionHelpFormatter,
+        fromfile_prefix_chars='@',
         description =
-            "StructCompacter reads object (*.o) file in ELF format and using DWARF debug info"
-            " detects structs and theirs members, calculates padding and tries such shuffle with"
-            " members to minimalize padding space and save memory.",
+            "StructCompacter reads object (*.o) files, executables and shared libraries in ELF"
+            " format and using DWARF debug info detects structs and theirs members, calculates"
+            " padding and tries such shuffle with members to minimalize padding space and save"
+            " memory.",
 
         epilog =
             "examples:\n\n"
@@ -2523,6 +7598,42 @@ def process_argv( argv ):
             "  Process specified types, show it details, show result on screen\n"
             "  cc.py -s -v -t SomeTypes* -- application.o\n\n"
 
+            "  Process file reading DWARF with 8 processes\n"
+            "  cc.py -j 8 application.o\n\n"
+
+            "  Process file with built-in DWARF reader, faster than pyelftools (see bin/benchmark.py)\n"
+            "  cc.py --reader fast application.o\n\n"
+
+            "  Process file, find the smallest layout of each struct spending up to 5s on it\n"
+            "  cc.py --engine optimal --budget 5 application.o\n\n"
+
+            "  Process file, keep members accessed according to profile in as few cache lines as possible\n"
+            "  cc.py --profile access.csv application.o\n\n"
+
+            "  Process file, rank packed structs by bytes saved by all instances counted in heap profile\n"
+            "  cc.py -d --instances instances.csv application.o\n\n"
+
+            "  Process file, save diffs of types and packed ones to one zip archive\n"
+            "  cc.py -d --archive layouts.zip application.o\n\n"
+
+            "  Process file, write one JSON record per packed struct to one file\n"
+            "  cc.py --format jsonl --output report.jsonl application.o\n\n"
+
+            "  Process file, write patch reordering members in sources as in packed structs\n"
+            "  cc.py --patch packed.diff --source-dir ~/project application.o\n\n"
+
+            "  Process file, write header asserting sizes and offsets of members of packed structs\n"
+            "  cc.py --guards layout_guards.h application.o\n\n"
+
+            "  Process all ELF files in build directory, summarize savings and paddings of 20 top structs\n"
+            "  cc.py --summary --summary-top 20 build/\n\n"
+
+            "  Process file, reuse types read by previous run if file is not changed\n"
+            "  cc.py --cache ~/.cache/StructCompacter application.o\n\n"
+
+            "  Process all ELF files in build directory and objects listed in file, one report\n"
+            "  cc.py -d build/ 'lib/**/*.so' @objects.txt\n\n"
+
             "author:\n\n"
             "  Lukasz Czerwinski (wo3kie@gmail.com)(https://github.com/wo3kie/StructCompacter)"
     )
@@ -2580,10 +7691,166 @@ def process_argv( argv ):
     );
 
     parser.add_argument(
-        'file',
-        nargs=1,
+        '--format',
+        default='text',
+        choices=[ 'text', 'jsonl', 'csv' ],
+        help=
+            'Format of output. The jsonl and csv ones write one record per packed struct'
+            ' (sizes, permutation of members, offsets and paddings) to one file given by'
+            ' --output or to stdout, messages go to stderr then. By default text is set.'
+    )
+
+    parser.add_argument(
+        '-o', '--output',
+        default=None,
+        metavar='FILE',
+        help=
+            'File the jsonl or csv records are written to instead of stdout.'
+    )
+
+    parser.add_argument(
+        '--archive',
+        default=None,
+        metavar='FILE',
+        help=
+            'Zip archive the text files (*.old.sc/*.new.sc or *.sc with --diff) are written'
+            ' to instead of current directory.'
+    )
+
+    parser.add_argument(
+        '-j', '--jobs',
+        default=1,
+        type=int,
+        help=
+            'Number of processes reading DWARF in parallel, each of them handles'
+            ' a part of compilation units. By default 1 is set.'
+    )
+
+    parser.add_argument(
+        '--reader',
+        default='pyelftools',
+        choices=[ 'pyelftools', 'fast' ],
+        help=
+            'DWARF reader. The fast one decodes only DIEs and attributes needed for'
+            ' structs and skips the others. By default pyelftools is set.'
+    )
+
+    parser.add_argument(
+        '--engine',
+        default='greedy',
+        choices=[ 'greedy', 'optimal' ],
+        help=
+            'Algorithm shuffling members. The greedy one moves members into paddings'
+            ' found so far, the optimal one searches for the order of members with the'
+            ' least padding, bases and vptr stay in front. By default greedy is set.'
+    )
+
+    parser.add_argument(
+        '--budget',
+        default=1.0,
+        type=float,
+        metavar='SECONDS',
         help=
-            'Object file to be processed.'
+            'Time the optimal engine may spend on one struct, greedy one is used when it'
+            ' is exceeded. By default 1 is set.'
+    )
+
+    parser.add_argument(
+        '--profile',
+        default=None,
+        metavar='FILE',
+        help=
+            'Access counts of members in CSV file, one member per line as: struct,member,count.'
+            ' Members of structs listed there are laid out so accessed ones share as few cache'
+            ' lines as possible, the smallest size of struct comes second.'
+    )
+
+    parser.add_argument(
+        '--instances',
+        default=None,
+        metavar='FILE',
+        help=
+            'Numbers of live instances of types in CSV file, one type per line as: type,count'
+            ' (eg. from heap profile), types are named with theirs scopes (eg.: net::Packet). Packed structs are ranked by bytes saved by all'
+            ' instances.'
+    )
+
+    parser.add_argument(
+        '--cache-line',
+        default=None,
+        type=int,
+        metavar='BYTES',
+        help=
+            'Size of cache line, its boundaries are shown in output. By default 64 is set'
+            ' if --profile is given.'
+    )
+
+    parser.add_argument(
+        '--patch',
+        default=None,
+        metavar='FILE',
+        help=
+            'Unified diff reordering declarations of members in source files as in packed'
+            ' structs. Files are found through DWARF line tables, each member has to be declared'
+            ' on a line of its own. Use -w to see why some structs are not reordered.'
+    )
+
+    parser.add_argument(
+        '--source-dir',
+        default=None,
+        metavar='DIR',
+        help=
+            'Directory of sources, if they are not in directory they were compiled in.'
+            ' The patch has paths relative to it.'
+    )
+
+    parser.add_argument(
+        '--guards',
+        default=None,
+        metavar='FILE',
+        help=
+            'Header for C and C++ with static assertions of size and alignment of packed'
+            ' structs and offsets of their members (of POD structs only) as far as packed layout'
+            ' is sure of them, so compilation fails if a packed layout changes.'
+    )
+
+    parser.add_argument(
+        '--summary',
+        action='store_true',
+        default=False,
+        help=
+            'Print summary at the end: top structs by bytes and by percent saved, total'
+            ' padding and padding recoverable by packing, histogram of holes by alignment and'
+            ' numbers of types skipped by each phase with reason.'
+    )
+
+    parser.add_argument(
+        '--summary-top',
+        default=10,
+        type=int,
+        metavar='N',
+        help=
+            'Number of structs in top lists of --summary. By default 10 is set.'
+    )
+
+    parser.add_argument(
+        '--cache',
+        default=None,
+        metavar='DIR',
+        help=
+            'Keep types read from DWARF in directory DIR (eg.: ~/.cache/StructCompacter)'
+            ' and reuse them while file is not changed. Files are identified by ELF build-id'
+            ' or hash of debug sections.'
+    )
+
+    parser.add_argument(
+        'files',
+        nargs='+',
+        help=
+            'Object files, executables or shared libraries to be processed. Directories'
+            ' are searched recursively for ELF files, glob patterns are expanded and'
+            ' @FILE reads further arguments from FILE, one per line. Types repeated'
+            ' in many files are reported once.'
     )
 
     result = parser.parse_args( argv )
@@ -2592,6 +7859,43 @@ def process_argv( argv ):
     #
     result.columns = max( 30, result.columns )
 
+    # check --jobs
+    #
+    result.jobs = max( 1, result.jobs )
+
+    # check --budget
+    #
+    if result.budget <= 0:
+        parser.error( 'argument --budget: has to be greater than 0' )
+
+    # check --cache-line
+    #
+    if result.cache_line == None and result.profile != None:
+        result.cache_line = 64
+
+    if result.cache_line != None and result.cache_line < 8:
+        parser.error( 'argument --cache-line: has to be at least 8' )
+
+    # check --source-dir
+    #
+    if result.source_dir != None and result.patch == None:
+        parser.error( 'argument --source-dir: has to be used with --patch' )
+
+    # check --summary
+    #
+    if result.summary_top < 1:
+        parser.error( 'argument --summary-top: has to be at least 1' )
+
+    # check --output
+    #
+    if result.output != None and result.format == 'text':
+        parser.error( 'argument --output: has to be used with --format jsonl or csv' )
+
+    # check --archive
+    #
+    if result.archive != None and ( result.stdout or result.format != 'text' ):
+        parser.error( 'argument --archive: can not be used with --stdout or --format jsonl/csv' )
+
     # check diff & stdout
     #
     if result.stdout:
@@ -2602,8 +7906,25 @@ def process_argv( argv ):
 def main():
     config = process_argv( sys.argv[1:] )
 
-    app = Application( config )
-    app.process( config.file[0] )
+    file_names = expand_input_files( config.files )
+
+    if len( file_names ) == 0:
+        exit( 'No ELF files found in %s' % ' '.join( config.files ) )
+
+    try:
+        app = Application( config )
+        app.open_output()
+    except StructCompacterError as error:
+        exit( str( error ) )
+
+    # records go to stdout, messages to stderr not to mix with them
+    if config.format != 'text' and config.output == None:
+        sys.stdout = sys.stderr
+
+    try:
+        app.process( file_names )
+    finally:
+        app.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,194 @@
+# Fixtures of tests, sources are compiled with debug info and Struct Compacter runs on them
+
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) )
+SC_PATH = os.path.join( ROOT_DIR, 'bin', 'sc.py' )
+BENCHMARK_PATH = os.path.join( ROOT_DIR, 'bin', 'benchmark.py' )
+
+sys.path.insert( 0, os.path.dirname( SC_PATH ) )
+
+class Layout:
+    # offsets of members (of bit fields in bits) of struct as compiler laid it out
+    def __init__( self, size, offsets, bit_offsets ):
+        self.size = size
+        self.offsets = offsets
+        self.bit_offsets = bit_offsets
+
+    def __eq__( self, other ):
+        return ( self.size, self.offsets, self.bit_offsets ) == ( other.size, other.offsets, other.bit_offsets )
+
+    def __repr__( self ):
+        return 'Layout(%d, %r, %r)' % ( self.size, self.offsets, self.bit_offsets )
+
+class Workspace:
+    def __init__( self, path, sc ):
+        self.path = str( path )
+        self.sc = sc
+
+    def write( self, file_name, text ):
+        path = os.path.join( self.path, file_name )
+        os.makedirs( os.path.dirname( path ), exist_ok = True )
+
+        with open( path, 'w' ) as file:
+            file.write( text )
+
+        return path
+
+    def compile( self, source, output = None, compiler = None, flags = () ):
+        # compiled in directory of source, as build systems do, so DWARF refers to it
+        source = os.path.join( self.path, source )
+
+        if compiler == None:
+            compiler = 'g++' if source.endswith( '.cpp' ) else 'gcc'
+
+        if shutil.which( compiler ) == None:
+            pytest.skip( '%s is not found' % compiler )
+
+        if output == None:
+            output = os.path.splitext( os.path.basename( source ) )[ 0 ] + '.o'
+
+        output = os.path.join( self.path, output )
+
+        subprocess.run( [ compiler, '-g' ] + list( flags ) + [ '-c', os.path.basename( source ), '-o', output ], \
+            cwd = os.path.dirname( source ), check = True )
+
+        return output
+
+    def link( self, object_files, output ):
+        # relocatable link keeps one CU per object file
+        if shutil.which( 'ld' ) == None:
+            pytest.skip( 'ld is not found' )
+
+        output = os.path.join( self.path, output )
+
+        subprocess.run( [ 'ld', '-r' ] + list( object_files ) + [ '-o', output ], check = True )
+
+        return output
+
+    def build( self, object_files, output ):
+        # executable is linked at fixed addresses, its DWARF has no relocations
+        if shutil.which( 'gcc' ) == None:
+            pytest.skip( 'gcc is not found' )
+
+        output = os.path.join( self.path, output )
+
+        subprocess.run( [ 'gcc' ] + list( object_files ) + [ '-o', output ], check = True )
+
+        return output
+
+    def run( self, * args, check = True, script = SC_PATH ):
+        # sc is run as users run it, pyelftools is found where pytest found it
+        env = dict( os.environ )
+        env[ 'PYTHONPATH' ] = os.pathsep.join( path for path in sys.path if path )
+
+        result = subprocess.run( [ sys.executable, script ] + list( args ), cwd = self.path, \
+            env = env, stdout = subprocess.PIPE, stderr = subprocess.PIPE, universal_newlines = True )
+
+        if check and result.returncode != 0:
+            pytest.fail( '%s %s failed:\n%s%s' % ( os.path.basename( script ), ' '.join( args ), \
+                result.stdout, result.stderr ) )
+
+        return result
+
+    @staticmethod
+    def get_sizes( result ):
+        # old and new sizes of packed structs, as told by names of .sc files created
+        sizes = {}
+
+        for match in re.finditer( r'^Files (\S+)\.old\.(\d+)\.sc \S+\.new\.(\d+)\.sc', result.stdout, re.M ):
+            sizes[ match.group( 1 ) ] = ( int( match.group( 2 ) ), int( match.group( 3 ) ) )
+
+        return sizes
+
+    def read_sc( self, file_name ):
+        # names and offsets of members listed in .sc file, paddings have no name
+        members = []
+
+        with open( os.path.join( self.path, file_name ) ) as file:
+            for line in file:
+                match = re.match( r'^(\S*)\s+\(\+(\d+)\)', line )
+
+                if match:
+                    members.append( ( match.group( 1 ), int( match.group( 2 ) ) ) )
+
+        return members
+
+    def run_benchmark( self, * args ):
+        return self.run( * args, script = BENCHMARK_PATH )
+
+    def read_records( self, file_name ):
+        with open( os.path.join( self.path, file_name ) ) as file:
+            records = [ json.loads( line ) for line in file ]
+
+        return { record[ 'type' ]: record for record in records }
+
+    def patch( self, diff, source_dir, patched_dir ):
+        if shutil.which( 'patch' ) == None:
+            pytest.skip( 'patch is not found' )
+
+        patched_dir = os.path.join( self.path, patched_dir )
+        shutil.copytree( os.path.join( self.path, source_dir ), patched_dir )
+
+        subprocess.run( [ 'patch', '-s', '-p1', '-i', os.path.join( self.path, diff ) ], \
+            cwd = patched_dir, check = True )
+
+        return patched_dir
+
+    def read_layout( self, object_file, name ):
+        config = self.sc.process_argv( [ object_file ] )
+        types = self.sc.Application( config )._read_DWARF( object_file, None )
+
+        for type in types.values():
+            if type.__class__ == self.sc.StructType and type.get_name() == name:
+                return Layout( type.get_size(), *self._get_offsets( type ) )
+
+        raise KeyError( name )
+
+    @staticmethod
+    def get_new_layout( record ):
+        # offsets of members of packed struct written to jsonl record, as read_layout gives them
+        offsets = {}
+        bit_offsets = {}
+
+        for member in record[ 'members' ]:
+            if member[ 'bit_size' ] != None:
+                bit_offsets[ member[ 'name' ] ] = member[ 'new_offset' ] * 8 + member[ 'new_bit_offset' ]
+            else:
+                offsets[ member[ 'name' ] ] = member[ 'new_offset' ]
+
+        return Layout( record[ 'new_size' ], offsets, bit_offsets )
+
+    # details
+
+    def _get_offsets( self, struct ):
+        offsets = {}
+        bit_offsets = {}
+
+        for member in struct.get_members():
+            if member.__class__ == self.sc.BitFields:
+                for field in member.get_type().get_fields():
+                    bit_offsets[ field.get_name() ] = member.get_this_offset() * 8 + field.get_bit_offset()
+            else:
+                offsets[ member.get_name() ] = member.get_this_offset()
+
+        return ( offsets, bit_offsets )
+
+@pytest.fixture
+def sc():
+    pytest.importorskip( 'elftools' )
+
+    import sc
+
+    return sc
+
+@pytest.fixture
+def workspace( tmp_path, sc ):
+    return Workspace( tmp_path, sc )
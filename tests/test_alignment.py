@@ -0,0 +1,37 @@
+# Structs are aligned as the most aligned of their members, the ones in arrays too
+
+import pytest
+
+SOURCE = '''\
+struct A {
+  short a;
+  long long b[4];
+  char c;
+} a;
+
+struct B {
+  char a;
+  double b[2];
+  int c[3];
+  short d;
+} b;
+'''
+
+# greedy engine does not move arrays into paddings, B is left as it is
+@pytest.mark.parametrize( ( 'engine', 'sizes' ), [ ( 'greedy', { 'A': 40 } ), ( 'optimal', { 'A': 40, 'B': 32 } ) ] )
+def test_arrays_of_8_byte_types_align_struct( workspace, engine, sizes ):
+    workspace.write( 'src/a.c', SOURCE )
+    object_file = workspace.compile( 'src/a.c' )
+
+    workspace.run( '--engine', engine, '--format', 'jsonl', '-o', 'records.jsonl' \
+        , '--patch', 'p.diff', '--source-dir', 'src', object_file )
+
+    records = workspace.read_records( 'records.jsonl' )
+
+    assert dict( ( name, record[ 'new_size' ] ) for ( name, record ) in records.items() ) == sizes
+
+    workspace.patch( 'p.diff', 'src', 'patched' )
+    patched_file = workspace.compile( 'patched/a.c', 'patched.o' )
+
+    for ( name, record ) in records.items():
+        assert workspace.read_layout( patched_file, name ) == workspace.get_new_layout( record )
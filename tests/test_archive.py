@@ -0,0 +1,44 @@
+# With --archive the text files are written into one zip archive instead of current directory
+
+import os
+import zipfile
+
+SOURCE = '''\
+struct Packet {
+  char kind;
+  double value;
+  short port;
+  long long id;
+  char flags;
+} packet;
+'''
+
+def test_archive_has_text_files( workspace ):
+    workspace.write( 'src/p.c', SOURCE )
+    object_file = workspace.compile( 'src/p.c' )
+
+    workspace.run( '--archive', 'layouts.zip', object_file )
+
+    with zipfile.ZipFile( os.path.join( workspace.path, 'layouts.zip' ) ) as archive:
+        assert sorted( archive.namelist() ) == [ 'Packet.new.24.sc', 'Packet.old.40.sc' ]
+        assert 'kind' in archive.read( 'Packet.new.24.sc' ).decode()
+
+    assert not os.path.exists( os.path.join( workspace.path, 'Packet.old.40.sc' ) )
+
+def test_archive_has_diffs( workspace ):
+    workspace.write( 'src/p.c', SOURCE )
+    object_file = workspace.compile( 'src/p.c' )
+
+    workspace.run( '-d', '--archive', 'layouts.zip', object_file )
+
+    with zipfile.ZipFile( os.path.join( workspace.path, 'layouts.zip' ) ) as archive:
+        assert archive.namelist() == [ 'Packet.sc' ]
+
+def test_archive_is_not_for_records( workspace ):
+    workspace.write( 'src/p.c', SOURCE )
+    object_file = workspace.compile( 'src/p.c' )
+
+    result = workspace.run( '--format', 'jsonl', '--archive', 'layouts.zip', object_file, check = False )
+
+    assert result.returncode != 0
+    assert '--archive' in result.stderr
@@ -0,0 +1,73 @@
+# Bit fields are packed into bytes they use, as compiler lays out structs declared in that order
+
+import pytest
+
+SOURCE = '''\
+struct S19 {
+  unsigned m0:22;
+  long m1;
+  char m2;
+} s19;
+
+struct Flags {
+  unsigned char a:3;
+  int b;
+  unsigned short c:9;
+  char d;
+  unsigned e:17;
+} flags;
+
+struct Gap {
+  char a;
+  long b;
+  unsigned c:20;
+  short d;
+} gap;
+'''
+
+def test_pack_sizes_bit_fields_by_bytes_used( sc ):
+    unsigned = sc.BaseType( 'unsigned int', 4 )
+
+    packed = sc.BitFieldsType.pack( [ sc.BitField( 'm0', -1, -1, unsigned, 0, 22 ) ] )
+
+    assert packed.get_size() == 3
+    assert packed.get_alignment() == 4
+
+def test_pack_does_not_cross_units_of_fields( sc ):
+    unsigned = sc.BaseType( 'unsigned int', 4 )
+
+    packed = sc.BitFieldsType.pack( [ sc.BitField( 'a', -1, -1, unsigned, 0, 20 ) \
+        , sc.BitField( 'b', -1, -1, unsigned, 0, 20 ) ] )
+
+    assert packed.get_size() == 7
+    assert [ field.get_bit_offset() for field in packed.get_fields() ] == [ 0, 32 ]
+
+def test_bit_fields_are_read_as_compiler_laid_them( workspace ):
+    workspace.write( 'src/s.c', SOURCE )
+    object_file = workspace.compile( 'src/s.c' )
+
+    layout = workspace.read_layout( object_file, 'Flags' )
+
+    assert layout.size == 16
+    assert layout.offsets == { 'b': 4, 'd': 10 }
+    assert layout.bit_offsets == { 'a': 0, 'c': 64, 'e': 96 }
+
+@pytest.mark.parametrize( 'engine', [ 'greedy', 'optimal' ] )
+def test_packed_layout_matches_compiler( workspace, engine ):
+    workspace.write( 'src/s.c', SOURCE )
+    object_file = workspace.compile( 'src/s.c' )
+
+    workspace.run( '--engine', engine, '--format', 'jsonl', '-o', 'records.jsonl' \
+        , '--patch', 'p.diff', '--source-dir', 'src', object_file )
+
+    records = workspace.read_records( 'records.jsonl' )
+    assert sorted( records ) == [ 'Flags', 'Gap', 'S19' ]
+
+    workspace.patch( 'p.diff', 'src', 'patched' )
+    patched_file = workspace.compile( 'patched/s.c', 'patched.o' )
+
+    for ( name, record ) in records.items():
+        assert workspace.read_layout( patched_file, name ) == workspace.get_new_layout( record )
+
+    # m2 follows the last byte used by m0, not its alignment
+    assert records[ 'S19' ][ 'new_size' ] == 16
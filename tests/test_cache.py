@@ -0,0 +1,115 @@
+# Types are read from cache while file is the same, otherwise DWARF is read again
+
+import glob
+import json
+import os
+
+SOURCE = '''\
+struct Packet {
+  char kind;
+  double value;
+  short port;
+  long long id;
+  char flags;
+} packet;
+'''
+
+CHANGED_SOURCE = SOURCE.replace( '  char flags;\n', '  char flags;\n  double extra;\n' )
+
+def is_hit( result ):
+    return 'Reading analysis from cache...' in result.stdout and 'Reading DWARF' not in result.stdout
+
+def run( workspace, * args ):
+    return workspace.run( '--cache', 'cache', * args )
+
+def test_second_run_is_hit( workspace ):
+    workspace.write( 'src/p.c', SOURCE )
+    object_file = workspace.compile( 'src/p.c' )
+
+    miss = run( workspace, object_file )
+    miss_layout = workspace.read_sc( 'Packet.new.24.sc' )
+
+    hit = run( workspace, object_file )
+
+    assert not is_hit( miss )
+    assert is_hit( hit )
+
+    assert workspace.get_sizes( hit ) == workspace.get_sizes( miss ) == { 'Packet': ( 40, 24 ) }
+    assert workspace.read_sc( 'Packet.new.24.sc' ) == miss_layout
+
+def test_changed_file_is_miss( workspace ):
+    workspace.write( 'src/p.c', SOURCE )
+    object_file = workspace.compile( 'src/p.c' )
+
+    old = run( workspace, object_file )
+
+    workspace.write( 'src/p.c', CHANGED_SOURCE )
+    workspace.compile( 'src/p.c' )
+
+    new = run( workspace, object_file )
+
+    assert not is_hit( new )
+
+    assert workspace.get_sizes( old ) == { 'Packet': ( 40, 24 ) }
+    assert workspace.get_sizes( new ) == { 'Packet': ( 48, 32 ) }
+
+def test_types_filter_is_applied_to_miss( workspace ):
+    workspace.write( 'src/p.c', SOURCE )
+    workspace.write( 'src/q.c', SOURCE.replace( 'Packet', 'Query' ).replace( 'packet', 'query' ) )
+    object_file = workspace.link( [ workspace.compile( 'src/p.c' ), workspace.compile( 'src/q.c' ) ], 'all.o' )
+
+    miss = run( workspace, '-t', 'Pack*', '--', object_file )
+    hit = run( workspace, '-t', 'Pack*', '--', object_file )
+
+    assert not is_hit( miss )
+    assert is_hit( hit )
+    assert workspace.get_sizes( miss ) == workspace.get_sizes( hit ) == { 'Packet': ( 40, 24 ) }
+
+    # types of other filters are not in the entry
+    other = run( workspace, object_file )
+
+    assert not is_hit( other )
+    assert workspace.get_sizes( other ) == { 'Packet': ( 40, 24 ), 'Query': ( 40, 24 ) }
+
+def test_directory_is_not_taken_from_files( workspace ):
+    workspace.write( 'src/p.c', SOURCE )
+    object_file = workspace.compile( 'src/p.c' )
+
+    result = workspace.run( object_file, '--cache', check = False )
+
+    assert result.returncode != 0
+    assert '--cache' in result.stderr
+
+def test_entry_is_data_only( workspace ):
+    workspace.write( 'src/p.c', SOURCE )
+    object_file = workspace.compile( 'src/p.c' )
+
+    run( workspace, object_file )
+
+    ( entry, ) = glob.glob( os.path.join( workspace.path, 'cache', '*' ) )
+
+    with open( entry ) as file:
+        table = json.load( file )
+
+    # entry naming other classes than types is not read
+    table[ 'states' ][ 0 ][ 0 ] = 'Application'
+
+    with open( entry, 'w' ) as file:
+        json.dump( table, file )
+
+    result = run( workspace, object_file )
+
+    assert not is_hit( result )
+    assert workspace.get_sizes( result ) == { 'Packet': ( 40, 24 ) }
+
+def test_other_engine_packs_hit( workspace ):
+    workspace.write( 'src/p.c', SOURCE )
+    object_file = workspace.compile( 'src/p.c' )
+
+    run( workspace, '--engine', 'greedy', object_file )
+
+    # types read are cached, structs are compacted by engine of each run
+    result = run( workspace, '--engine', 'optimal', object_file )
+
+    assert is_hit( result )
+    assert workspace.get_sizes( result ) == { 'Packet': ( 40, 24 ) }
@@ -0,0 +1,69 @@
+# Structs of the same layout read from many CUs and files are analyzed and reported once
+
+HEADER = '''\
+struct Packet {
+  char kind;
+  double value;
+  short port;
+  long long id;
+  char flags;
+};
+'''
+
+FIRST = '#include "packet.h"\nstruct Packet first;\n'
+SECOND = '#include "packet.h"\nstruct Packet second;\n'
+
+SCOPED = '''\
+namespace first { struct Packet { char kind; double value; char flags; } packet; }
+namespace second { struct Packet { char kind; double value; char flags; } packet; }
+'''
+
+def count_reported( result, name ):
+    return result.stdout.count( 'Files %s.old.' % name )
+
+def test_struct_of_many_cus_is_reported_once( workspace ):
+    workspace.write( 'src/packet.h', HEADER )
+    workspace.write( 'src/first.c', FIRST )
+    workspace.write( 'src/second.c', SECOND )
+
+    object_file = workspace.link( [ workspace.compile( 'src/first.c' ), workspace.compile( 'src/second.c' ) ], 'all.o' )
+
+    result = workspace.run( object_file )
+
+    assert count_reported( result, 'Packet' ) == 1
+    assert workspace.get_sizes( result ) == { 'Packet': ( 40, 24 ) }
+
+def test_structs_of_other_scopes_are_kept( workspace ):
+    workspace.write( 'src/scoped.cpp', SCOPED )
+    object_file = workspace.compile( 'src/scoped.cpp' )
+
+    assert count_reported( workspace.run( object_file ), 'Packet' ) == 2
+
+# Holder of both files has the same members, Inner embedded in it differs
+INNER_LOOSE = 'struct Inner { char a; int b; char c; };\nstruct Holder { struct Inner in; int t; } holder;\n'
+INNER_TIGHT = 'struct Inner { int b; int c; char a; };\nstruct Holder { struct Inner in; int t; } holder;\n'
+
+def test_structs_embedding_other_layouts_are_kept( workspace ):
+    workspace.write( 'src/tight.c', INNER_TIGHT )
+    workspace.write( 'src/loose.c', INNER_LOOSE )
+
+    object_files = [ workspace.compile( 'src/tight.c' ), workspace.compile( 'src/loose.c' ) ]
+
+    workspace.run( '--format', 'jsonl', '-o', 'records.jsonl', *object_files )
+    records = workspace.read_records( 'records.jsonl' )
+
+    assert ( records[ 'Holder' ][ 'old_size' ], records[ 'Holder' ][ 'new_size' ] ) == ( 16, 12 )
+
+def test_duplicates_are_replaced_behind_pointers( sc ):
+    first = sc.StructType( 'Packet', 8 )
+    second = sc.StructType( 'Packet', 8 )
+
+    holder = sc.StructType( 'Holder', 8 )
+    holder.add_member( sc.Member( 'packet', 0, 0, sc.PtrType( sc.ConstType( second ), 8 ), 0 ) )
+
+    sc.set_struct_fingerprints( [ first, second, holder ] )
+
+    types = sc.StructDeduplicator().process( [ ( 1, first ), ( 2, second ), ( 3, holder ) ] )
+
+    assert list( types ) == [ 1, 3 ]
+    assert holder.get_members()[ 0 ].get_type().type.get_type() is first
@@ -0,0 +1,53 @@
+# Types nested deeper than Python recursion limit are read and packed
+
+import shutil
+import sys
+
+import pytest
+
+DEPTH = sys.getrecursionlimit() + 500
+
+def make_typedef_chain( depth ):
+    lines = [ 'typedef int T0;' ]
+
+    for i in range( 1, depth ):
+        lines.append( 'typedef T%d T%d;' % ( i - 1, i ) )
+
+    lines.append( 'struct Chain { char a; T%d b; char c; } chain;' % ( depth - 1 ) )
+
+    return '\n'.join( lines ) + '\n'
+
+def make_nested_structs( depth ):
+    lines = [ 'struct N0 { char a; int b; };' ]
+
+    for i in range( 1, depth ):
+        lines.append( 'struct N%d { char a; struct N%d n; };' % ( i, i - 1 ) )
+
+    lines.append( 'struct Top { char a; struct N%d n; char b; int c; } top;' % ( depth - 1 ) )
+
+    return '\n'.join( lines ) + '\n'
+
+def test_long_typedef_chain( workspace ):
+    workspace.write( 'src/chain.c', make_typedef_chain( DEPTH ) )
+    object_file = workspace.compile( 'src/chain.c' )
+
+    assert workspace.get_sizes( workspace.run( object_file ) ) == { 'Chain': ( 12, 8 ) }
+
+def test_deeply_nested_structs( workspace ):
+    workspace.write( 'src/nested.c', make_nested_structs( DEPTH ) )
+    object_file = workspace.compile( 'src/nested.c' )
+
+    # each level adds a char and 3 bytes of padding which packing can not remove
+    size = 8 + ( DEPTH - 1 ) * 4
+
+    assert workspace.get_sizes( workspace.run( object_file ) ) == { 'Top': ( size + 12, size + 8 ) }
+
+def test_benchmark_of_deep_hierarchy( workspace ):
+    if shutil.which( 'gcc' ) == None:
+        pytest.skip( 'gcc is not found' )
+
+    result = workspace.run_benchmark( '--repeat', '1', '--deep', str( DEPTH ) )
+
+    # both readers find nested structs and the struct of typedef chain
+    assert 'Fast reader is' in result.stdout
+    assert result.stdout.count( ' %d ' % ( DEPTH + 2 ) ) == 2
@@ -0,0 +1,53 @@
+# DIEs are read when referenced and only the most recently used ones are kept
+
+PACKET = '''\
+struct Packet {
+  char kind;
+  double value;
+  short port;
+  long long id;
+  char flags;
+} packet;
+'''
+
+NODE = '''\
+typedef unsigned short port_t;
+
+struct Node {
+  char tag;
+  struct Node * next;
+  port_t port;
+  int id;
+} node;
+'''
+
+def make_object( workspace ):
+    workspace.write( 'src/packet.c', PACKET )
+    workspace.write( 'src/node.c', NODE )
+
+    return workspace.link( [ workspace.compile( 'src/packet.c' ), workspace.compile( 'src/node.c' ) ], 'all.o' )
+
+def test_types_of_every_cu_are_resolved( workspace ):
+    # references are relative to CU, Node is read from the second one
+    result = workspace.run( make_object( workspace ) )
+
+    assert workspace.get_sizes( result ) == { 'Packet': ( 40, 24 ), 'Node': ( 24, 16 ) }
+    assert workspace.read_sc( 'Node.new.16.sc' ) == [ ( 'tag', 0 ), ( '', 1 ), ( 'port', 2 ), ( 'id', 4 ), ( 'next', 8 ) ]
+
+def test_cache_walks_children_as_pyelftools( workspace, sc ):
+    from elftools.elf.elffile import ELFFile
+
+    object_file = make_object( workspace )
+
+    with open( object_file, 'rb' ) as file:
+        dwarf_info = ELFFile( file ).get_dwarf_info()
+        cache = sc.DIECache( dwarf_info, max_size = 4 )
+
+        for ( cu, expected_cu ) in zip( cache.iter_cus(), dwarf_info.iter_CUs() ):
+            children = cache.iter_children( cache.get_top_die( cu ) )
+            expected_children = expected_cu.get_top_DIE().iter_children()
+
+            assert [ ( die.offset, die.tag ) for die in children ] \
+                == [ ( die.offset, die.tag ) for die in expected_children ]
+
+            assert len( cache.dies ) <= 4
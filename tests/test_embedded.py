@@ -0,0 +1,35 @@
+# Structs embedding packed structs by value are laid out again with the packed ones
+
+SOURCE = '''\
+struct Inner { char a; double b; char c; };
+struct Outer { double x; struct Inner inner; struct Inner pair[2]; } outer;
+'''
+
+def test_saving_of_embedded_struct_is_propagated( workspace ):
+    workspace.write( 'src/e.c', SOURCE )
+    object_file = workspace.compile( 'src/e.c' )
+
+    # members of Outer are in the best order already, it shrinks with Inner only
+    result = workspace.run( object_file )
+
+    assert workspace.get_sizes( result ) == { 'Inner': ( 24, 16 ), 'Outer': ( 80, 56 ) }
+    assert workspace.read_sc( 'Outer.new.56.sc' ) == [ ( 'x', 0 ), ( 'inner', 8 ), ( 'pair', 24 ) ]
+
+    assert '{Outer}(80/56) 24 bytes' in result.stdout
+
+QUALIFIED_SOURCE = '''\
+struct Inner { char a; double b; char c; };
+typedef const struct Inner ConstInner;
+struct Outer { double x; ConstInner inner; volatile struct Inner pair[2]; } outer;
+'''
+
+def test_qualified_embedded_struct_is_propagated( workspace ):
+    workspace.write( 'src/q.c', QUALIFIED_SOURCE )
+    object_file = workspace.compile( 'src/q.c' )
+
+    result = workspace.run( object_file )
+
+    assert workspace.get_sizes( result ) == { 'Inner': ( 24, 16 ), 'Outer': ( 80, 56 ) }
+    assert workspace.read_sc( 'Outer.new.56.sc' ) == [ ( 'x', 0 ), ( 'inner', 8 ), ( 'pair', 24 ) ]
+
+    assert '{Outer}(80/56) 24 bytes' in result.stdout
@@ -0,0 +1,40 @@
+# Built-in DWARF reader finds the same structs as pyelftools
+
+import pytest
+
+SOURCE = '''\
+#include <map>
+#include <string>
+
+namespace net {
+  struct Packet {
+    char kind;
+    double value;
+    short port;
+    long long id;
+    char flags;
+  };
+
+  struct Route : Packet {
+    char hops;
+    std::string name;
+    short metric;
+  } route;
+}
+
+struct Table {
+  char id;
+  std::map< int, net::Packet > packets;
+  bool dirty;
+} table;
+'''
+
+@pytest.mark.parametrize( 'flags', [ [ '-gdwarf-4' ], [ '-gdwarf-5' ], [ '-gdwarf-4', '-fdebug-types-section' ] ] )
+def test_fast_reader_finds_structs_of_pyelftools( workspace, flags ):
+    workspace.write( 'src/s.cpp', SOURCE )
+    object_file = workspace.compile( 'src/s.cpp', flags = flags )
+
+    sizes = workspace.get_sizes( workspace.run( '--reader', 'pyelftools', object_file ) )
+
+    assert { 'Packet', 'Route', 'Table' } <= set( sizes )
+    assert workspace.get_sizes( workspace.run( '--reader', 'fast', object_file ) ) == sizes
@@ -0,0 +1,75 @@
+# Packed structs are written as one jsonl or csv record each, to a file or to stdout
+
+import csv
+import io
+import json
+
+SOURCE = '''\
+struct Packet {
+  char kind;
+  double value;
+  short port;
+  long long id;
+  char flags;
+} packet;
+
+struct S19 {
+  unsigned m0:22;
+  long m1;
+  char m2;
+} s19;
+'''
+
+def test_jsonl_record_tells_layouts( workspace ):
+    workspace.write( 'src/p.c', SOURCE )
+    object_file = workspace.compile( 'src/p.c' )
+
+    workspace.run( '--format', 'jsonl', '-o', 'records.jsonl', object_file )
+
+    records = workspace.read_records( 'records.jsonl' )
+    packet = records[ 'Packet' ]
+
+    assert ( packet[ 'old_size' ], packet[ 'new_size' ], packet[ 'saving' ] ) == ( 40, 24, 16 )
+    assert ( packet[ 'old_padding' ], packet[ 'new_padding' ] ) == ( 20, 4 )
+    assert packet[ 'new_paddings' ] == [ [ 4, 4 ] ]
+
+    assert [ ( member[ 'name' ], member[ 'old_offset' ], member[ 'new_offset' ] ) for member in packet[ 'members' ] ] \
+        == [ ( 'kind', 0, 0 ), ( 'flags', 32, 1 ), ( 'port', 16, 2 ), ( 'value', 8, 8 ), ( 'id', 24, 16 ) ]
+
+    # bit fields are listed one by one
+    assert workspace.get_new_layout( records[ 'S19' ] ).bit_offsets == { 'm0': 0 }
+    assert workspace.get_new_layout( records[ 'S19' ] ).offsets == { 'm1': 8, 'm2': 3 }
+
+def test_stdout_gets_records_only( workspace ):
+    workspace.write( 'src/p.c', SOURCE )
+    object_file = workspace.compile( 'src/p.c' )
+
+    result = workspace.run( '--format', 'jsonl', object_file )
+    records = [ json.loads( line ) for line in result.stdout.splitlines() ]
+
+    assert sorted( record[ 'type' ] for record in records ) == [ 'Packet', 'S19' ]
+    assert 'Reading DWARF' in result.stderr
+
+def test_csv_has_the_same_records( workspace ):
+    workspace.write( 'src/p.c', SOURCE )
+    object_file = workspace.compile( 'src/p.c' )
+
+    workspace.run( '--format', 'jsonl', '-o', 'records.jsonl', object_file )
+    result = workspace.run( '--format', 'csv', object_file )
+
+    rows = { row[ 'type' ]: row for row in csv.DictReader( io.StringIO( result.stdout ) ) }
+    packet = workspace.read_records( 'records.jsonl' )[ 'Packet' ]
+
+    assert sorted( rows ) == [ 'Packet', 'S19' ]
+    assert int( rows[ 'Packet' ][ 'new_size' ] ) == packet[ 'new_size' ]
+    assert rows[ 'Packet' ][ 'names' ].split( ';' ) == [ member[ 'name' ] for member in packet[ 'members' ] ]
+    assert rows[ 'Packet' ][ 'new_offsets' ].split( ';' ) == [ str( member[ 'new_offset' ] ) for member in packet[ 'members' ] ]
+
+def test_records_name_types_with_scopes( workspace ):
+    workspace.write( 'src/s.cpp', 'namespace net { struct Packet { char a; long b; char c; } packet; }\n' \
+        'namespace disk { struct Packet { char a; long b; char c; } packet; }\n' )
+    object_file = workspace.compile( 'src/s.cpp' )
+
+    workspace.run( '--format', 'jsonl', '-o', 'records.jsonl', object_file )
+
+    assert sorted( workspace.read_records( 'records.jsonl' ) ) == [ 'disk::Packet', 'net::Packet' ]
@@ -0,0 +1,136 @@
+# Guards hold for patched sources, random structs are packed, patched and compiled with them
+
+import random
+import shutil
+import subprocess
+
+import pytest
+
+TYPES = [ 'char', 'short', 'int', 'long', 'float', 'double', 'long long', 'void *' ]
+
+BIT_FIELD_TYPES = [ ( 'unsigned char', 8 ), ( 'unsigned short', 16 ), ( 'unsigned', 32 ), ( 'unsigned long', 64 ) ]
+
+def generate_source( seed, count = 40 ):
+    # one member per line, so all of them can be reordered by the patch
+    generator = random.Random( seed )
+    unions = []
+    structs = []
+
+    for i in range( count ):
+        structs.append( 'struct S%d {' % i )
+
+        for j in range( generator.randint( 2, 6 ) ):
+            kind = generator.random()
+
+            if kind < 0.15:
+                ( type, width ) = generator.choice( BIT_FIELD_TYPES )
+                structs.append( '  %s m%d:%d;' % ( type, j, generator.randint( 1, width ) ) )
+            elif kind < 0.30:
+                structs.append( '  %s m%d[%d];' % ( generator.choice( TYPES ), j, generator.randint( 1, 7 ) ) )
+            elif kind < 0.36 and i > 0:
+                structs.append( '  struct S%d m%d%s;' % ( generator.randrange( i ), j, generator.choice( [ '', '[2]' ] ) ) )
+            elif kind < 0.40:
+                unions.append( 'union U%d_%d { %s a; %s b[3]; };' \
+                    % ( i, j, generator.choice( TYPES ), generator.choice( TYPES ) ) )
+                structs.append( '  union U%d_%d m%d;' % ( i, j, j ) )
+            elif kind < 0.42:
+                structs.append( '  long double m%d;' % j )
+            else:
+                structs.append( '  %s m%d;' % ( generator.choice( TYPES ), j ) )
+
+        structs.append( '} s%d;' % i )
+
+    return ''.join( line + '\n' for line in unions + structs )
+
+def compile_with_guards( workspace, compiler, source ):
+    if shutil.which( compiler ) == None:
+        pytest.skip( '%s is not found' % compiler )
+
+    checked = workspace.write( source, '#include "patched/r.c"\n#include "guards.h"\n' )
+    result = subprocess.run( [ compiler, '-c', checked, '-o', checked + '.o' ], cwd = workspace.path, \
+        stdout = subprocess.PIPE, stderr = subprocess.STDOUT, universal_newlines = True )
+
+    assert result.returncode == 0, result.stdout
+
+@pytest.mark.parametrize( 'engine', [ 'greedy', 'optimal' ] )
+@pytest.mark.parametrize( 'seed', range( 1, 9 ) )
+def test_guards_hold_for_patched_sources( workspace, engine, seed ):
+    workspace.write( 'src/r.c', generate_source( seed ) )
+    object_file = workspace.compile( 'src/r.c' )
+
+    result = workspace.run( '-w', '--engine', engine, '--patch', 'p.diff', '--source-dir', 'src' \
+        , '--guards', 'guards.h', '--format', 'jsonl', '-o', 'records.jsonl', object_file )
+
+    assert 'skipped' not in result.stdout
+    assert 'not reordered' not in result.stdout
+
+    records = workspace.read_records( 'records.jsonl' )
+    assert len( records ) > 0
+
+    workspace.patch( 'p.diff', 'src', 'patched' )
+
+    compile_with_guards( workspace, 'gcc', 'check.c' )
+    compile_with_guards( workspace, 'g++', 'check.cpp' )
+
+SOURCE = '''\
+struct S19 {
+  unsigned m0:22;
+  long m1;
+  char m2;
+  short m3;
+} s19;
+
+struct Plain {
+  char a;
+  long b;
+  char c;
+} plain;
+'''
+
+def test_guards_assert_only_layout_known( workspace ):
+    workspace.write( 'src/s.c', SOURCE )
+    object_file = workspace.compile( 'src/s.c' )
+
+    workspace.run( '--engine', 'optimal', '--guards', 'guards.h', object_file )
+
+    with open( workspace.path + '/guards.h' ) as file:
+        guards = file.read()
+
+    # offsets are not known after bit fields, compiler may put them closer than packed struct does
+    assert 'sizeof( sc_guards_h_1 ) <= 16' in guards
+    assert 'offsetof( sc_guards_h_1, m1 ) == 0' in guards
+    assert 'offsetof( sc_guards_h_1, m2 )' not in guards
+
+    assert 'sizeof( sc_guards_h_2 ) == 16' in guards
+    assert 'SC_ALIGNOF( sc_guards_h_2 ) == 8' in guards
+    assert 'offsetof( sc_guards_h_2, c ) == 9' in guards
+
+ARRAYS_SOURCE = '''\
+struct Buffer {
+  char tag;
+  long id;
+  char name[5];
+  short port;
+  char data[3][3];
+} buffer;
+'''
+
+def test_guards_assert_exact_layout_of_arrays( workspace ):
+    workspace.write( 'src/r.c', ARRAYS_SOURCE )
+    object_file = workspace.compile( 'src/r.c' )
+
+    workspace.run( '--engine', 'optimal', '--patch', 'p.diff', '--source-dir', 'src' \
+        , '--guards', 'guards.h', object_file )
+
+    with open( workspace.path + '/guards.h' ) as file:
+        guards = file.read()
+
+    # bounds of arrays are read from DWARF, padding after them is not taken for theirs size
+    assert 'sizeof( sc_guards_h_1 ) == 32' in guards
+    assert 'offsetof( sc_guards_h_1, data ) == 11' in guards
+    assert 'offsetof( sc_guards_h_1, name ) == 20' in guards
+
+    workspace.patch( 'p.diff', 'src', 'patched' )
+
+    compile_with_guards( workspace, 'gcc', 'check.c' )
+    compile_with_guards( workspace, 'g++', 'check.cpp' )
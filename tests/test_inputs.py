@@ -0,0 +1,65 @@
+# Many objects are read in one run, given as files, directories, patterns or response files
+
+PACKET = '''\
+struct Packet {
+  char kind;
+  double value;
+  short port;
+  long long id;
+  char flags;
+} packet;
+'''
+
+NODE = '''\
+struct Node {
+  char tag;
+  struct Node * next;
+  int id;
+} node;
+'''
+
+SIZES = { 'Packet': ( 40, 24 ), 'Node': ( 24, 16 ) }
+
+def make_objects( workspace ):
+    workspace.write( 'src/packet.c', PACKET )
+    workspace.write( 'src/node/node.c', NODE )
+
+    workspace.compile( 'src/packet.c', 'src/packet.o' )
+    workspace.compile( 'src/node/node.c', 'src/node/node.o' )
+
+    # directories are searched for ELF files only
+    workspace.write( 'src/node/notes.txt', 'not an object\n' )
+
+def test_directory_is_searched( workspace ):
+    make_objects( workspace )
+
+    assert workspace.get_sizes( workspace.run( 'src' ) ) == SIZES
+
+def test_pattern_is_expanded( workspace ):
+    make_objects( workspace )
+
+    assert workspace.get_sizes( workspace.run( 'src/**/*.o' ) ) == SIZES
+
+def test_response_file_is_read( workspace ):
+    make_objects( workspace )
+    workspace.write( 'args.txt', 'src/packet.o\nsrc/node/node.o\n' )
+
+    assert workspace.get_sizes( workspace.run( '@args.txt' ) ) == SIZES
+
+def test_broken_file_is_skipped( workspace ):
+    make_objects( workspace )
+    workspace.write( 'broken.o', 'not an object\n' )
+
+    result = workspace.run( 'broken.o', 'src/packet.o', 'src/node/node.o' )
+
+    assert 'File broken.o skipped since' in result.stdout
+    assert workspace.get_sizes( result ) == SIZES
+
+def test_struct_of_many_files_is_reported_once( workspace ):
+    make_objects( workspace )
+    workspace.compile( 'src/packet.c', 'src/node/packet.o' )
+
+    result = workspace.run( 'src' )
+
+    assert result.stdout.count( 'Files Packet.old.' ) == 1
+    assert workspace.get_sizes( result ) == SIZES
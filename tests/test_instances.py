@@ -0,0 +1,45 @@
+# Packed structs are ranked by bytes saved by all their instances
+
+import re
+
+SOURCE = '''\
+struct Small { char a; int b; char c; } small;
+struct Big { char a; double b; char c; } big;
+struct Rare { char a; long b; char c; short d; } rare;
+'''
+
+INSTANCES = '''\
+Big,10
+Small,1000
+'''
+
+def test_structs_are_ranked_by_saving_of_instances( workspace ):
+    workspace.write( 'src/i.c', SOURCE )
+    workspace.write( 'instances.csv', INSTANCES )
+    object_file = workspace.compile( 'src/i.c' )
+
+    result = workspace.run( '--instances', 'instances.csv', object_file )
+
+    # Rare is not counted, it goes last
+    assert re.findall( r'^Files (\w+)\.old', result.stdout, re.M ) == [ 'Small', 'Big', 'Rare' ]
+    assert re.findall( r'^Instances: (\d+), saved: (\d+) bytes', result.stdout, re.M ) \
+        == [ ( '1000', '4000' ), ( '10', '80' ) ]
+
+    assert 'Saved 4080 bytes by all instances' in result.stdout
+
+SCOPED_SOURCE = '''\
+namespace net { struct Packet { char a; long b; char c; } packet; }
+namespace disk { struct Packet { char a; double b; char c; short d; } packet; }
+'''
+
+def test_instances_are_counted_by_qualified_names( workspace ):
+    workspace.write( 'src/s.cpp', SCOPED_SOURCE )
+    workspace.write( 'instances.csv', 'type,count\nnet::Packet,100\n::disk::Packet,7\n' )
+    object_file = workspace.compile( 'src/s.cpp' )
+
+    workspace.run( '--instances', 'instances.csv', '--format', 'jsonl', '-o', 'records.jsonl', object_file )
+
+    records = workspace.read_records( 'records.jsonl' )
+
+    assert ( records[ 'net::Packet' ][ 'instances' ], records[ 'net::Packet' ][ 'instances_saving' ] ) == ( 100, 800 )
+    assert ( records[ 'disk::Packet' ][ 'instances' ], records[ 'disk::Packet' ][ 'instances_saving' ] ) == ( 7, 56 )
@@ -0,0 +1,44 @@
+# Compilation units read by many processes give the same structs as read by one
+
+import pytest
+
+SOURCE = '''\
+#include "common.h"
+
+struct Unit%(i)d {
+  char a;
+  struct Common common;
+  short b;
+  double c;
+  char d;
+} unit%(i)d;
+'''
+
+HEADER = '''\
+struct Common {
+  char tag;
+  long long id;
+  short port;
+};
+'''
+
+@pytest.mark.parametrize( 'jobs', [ '2', '3' ] )
+def test_jobs_give_same_structs( workspace, jobs ):
+    workspace.write( 'src/common.h', HEADER )
+    object_files = []
+
+    for i in range( 5 ):
+        workspace.write( 'src/unit%d.c' % i, SOURCE % { 'i': i } )
+        object_files.append( workspace.compile( 'src/unit%d.c' % i ) )
+
+    object_file = workspace.link( object_files, 'all.o' )
+
+    sizes = workspace.get_sizes( workspace.run( '-j', '1', object_file ) )
+
+    assert sorted( sizes ) == [ 'Common', 'Unit0', 'Unit1', 'Unit2', 'Unit3', 'Unit4' ]
+
+    # Common is read by every process, it is reported once still
+    result = workspace.run( '-j', jobs, object_file )
+
+    assert workspace.get_sizes( result ) == sizes
+    assert result.stdout.count( 'Files Common.old.' ) == 1
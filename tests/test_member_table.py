@@ -0,0 +1,50 @@
+# Members of struct are rows of its MemberTable, member objects are views writing back to it
+
+def make_struct( sc ):
+    char = sc.BaseType( 'char', 1 )
+    double = sc.BaseType( 'double', 8 )
+
+    struct = sc.StructType( 'S', 24 )
+    struct.add_member( sc.Member( 'a', 1, 2, char, 0 ) )
+    struct.add_member( sc.Member( 'b', 1, 3, double, 8 ) )
+    struct.add_member( sc.Padding( sc.PaddingType( 7 ), 1 ) )
+
+    return struct
+
+def describe( member ):
+    if member.__class__.__name__ == 'Padding':
+        return ( 'Padding', member.get_this_offset(), member.get_size() )
+
+    return ( member.__class__.__name__, member.get_name(), member.get_this_offset(), member.get_size() )
+
+def test_rows_keep_members( sc ):
+    struct = make_struct( sc )
+
+    assert [ describe( member ) for member in struct.get_members() ] \
+        == [ ( 'Member', 'a', 0, 1 ), ( 'Member', 'b', 8, 8 ), ( 'Padding', 1, 7 ) ]
+
+    assert struct.get_members()[ 1 ].get_type().get_name() == 'double'
+    assert struct.get_members()[ 1 ].line_no == 3
+
+def test_views_write_back( sc ):
+    struct = make_struct( sc )
+
+    struct.get_members()[ 0 ].this_offset = 16
+    struct.get_members()[ -1 ].type = sc.PaddingType( 3 )
+
+    assert [ describe( member ) for member in struct.get_members() ] \
+        == [ ( 'Member', 'a', 16, 1 ), ( 'Member', 'b', 8, 8 ), ( 'Padding', 1, 3 ) ]
+
+def test_swap_moves_rows( sc ):
+    struct = make_struct( sc )
+
+    struct.get_members().swap( 0, 1 )
+
+    assert [ describe( member ) for member in struct.get_members() ] \
+        == [ ( 'Member', 'b', 8, 8 ), ( 'Member', 'a', 0, 1 ), ( 'Padding', 1, 7 ) ]
+
+def test_struct_without_members_has_no_table( sc ):
+    struct = sc.StructType( 'Empty', 1 )
+
+    assert struct.get_members() == ()
+    assert struct.members == None
@@ -0,0 +1,48 @@
+# DWARF sections are read from memory-mapped file, without copies of whole sections
+
+import os
+
+SOURCE = '''\
+struct Packet {
+  char kind;
+  double value;
+  short port;
+  long long id;
+  char flags;
+} packet;
+
+int main() { return packet.kind; }
+'''
+
+def test_stream_reads_view( sc ):
+    stream = sc.MemoryViewStream( memoryview( b'0123456789' )[ 2 : 8 ] )
+
+    assert stream.read( 2 ) == b'23'
+    assert stream.seek( 1, os.SEEK_CUR ) == 3
+    assert stream.read() == b'567'
+    assert stream.read( 1 ) == b''
+
+    stream.seek( -2, os.SEEK_END )
+
+    assert stream.tell() == 4
+    assert stream.read( 4 ) == b'67'
+
+def test_sections_of_executable_are_mapped( workspace, sc ):
+    workspace.write( 'src/p.c', SOURCE )
+    executable = workspace.build( [ workspace.compile( 'src/p.c' ) ], 'p' )
+
+    with open( executable, 'rb' ) as file:
+        elf_file = sc.open_ELF_file( file )
+        stream = elf_file.get_dwarf_info().debug_info_sec.stream
+
+        assert stream.__class__ == sc.MemoryViewStream
+
+def test_executable_is_packed_as_object( workspace ):
+    workspace.write( 'src/p.c', SOURCE )
+    object_file = workspace.compile( 'src/p.c' )
+    executable = workspace.build( [ object_file ], 'p' )
+
+    sizes = workspace.get_sizes( workspace.run( object_file ) )
+
+    assert sizes == { 'Packet': ( 40, 24 ) }
+    assert workspace.get_sizes( workspace.run( executable ) ) == sizes
@@ -0,0 +1,50 @@
+# Structs given by --types are found through name index instead of walking all DIEs
+
+SOURCE = '''\
+namespace net {
+  struct Packet {
+    char kind;
+    double value;
+    short port;
+    long long id;
+    char flags;
+  } packet;
+}
+
+struct Other {
+  char a;
+  long b;
+  char c;
+} other;
+'''
+
+def test_index_finds_struct( workspace, sc ):
+    from elftools.elf.elffile import ELFFile
+
+    workspace.write( 'src/n.cpp', SOURCE )
+    object_file = workspace.compile( 'src/n.cpp', flags = [ '-gpubnames' ] )
+
+    with open( object_file, 'rb' ) as file:
+        elf_file = ELFFile( file )
+        dwarf_info = elf_file.get_dwarf_info()
+
+        name_index = sc.read_name_index( elf_file, dwarf_info )
+        entries = name_index.find( sc.TypeFilter( [ 'Packet' ] ) )
+
+        assert name_index.get_section_name() == '.debug_pubtypes'
+        assert [ entry[ 0 ] for entry in entries ] == [ 'net::Packet' ]
+
+        die = sc.DIECache( dwarf_info ).get( entries[ 0 ][ 2 ] )
+
+        assert die.tag == 'DW_TAG_structure_type'
+        assert die.attributes[ 'DW_AT_name' ].value == b'Packet'
+
+def test_indexed_struct_is_packed_as_walked( workspace ):
+    workspace.write( 'src/n.cpp', SOURCE )
+    walked_file = workspace.compile( 'src/n.cpp', 'walked.o' )
+    indexed_file = workspace.compile( 'src/n.cpp', 'indexed.o', flags = [ '-gpubnames' ] )
+
+    sizes = workspace.get_sizes( workspace.run( '-t', 'Packet', '--', walked_file ) )
+
+    assert sizes == { 'Packet': ( 40, 24 ) }
+    assert workspace.get_sizes( workspace.run( '-t', 'Packet', '--', indexed_file ) ) == sizes
@@ -0,0 +1,58 @@
+# Optimal engine finds order of members with the least padding, where greedy one stops earlier
+
+import itertools
+
+SOURCE = '''\
+struct B {
+  char a;
+  double b[2];
+  int c[3];
+  short d;
+} b;
+'''
+
+# sizes of arrays at the end of struct are not known, structs wrap them
+TYPES = 'struct C3 { char c[3]; }; struct H3 { short h[3]; }; struct I3 { int i[3]; };'
+
+# declarations of members with theirs sizes and alignments
+MEMBERS = [ ( 'char %s;', 1, 1 ), ( 'short %s;', 2, 2 ), ( 'int %s;', 4, 4 ), ( 'double %s;', 8, 8 ) \
+    , ( 'struct C3 %s;', 3, 1 ), ( 'struct H3 %s;', 6, 2 ), ( 'struct I3 %s;', 12, 4 ) ]
+
+def get_size( members ):
+    end = 0
+
+    for ( declaration, size, alignment ) in members:
+        end = ( end + alignment - 1 ) // alignment * alignment + size
+
+    alignment = max( alignment for ( declaration, size, alignment ) in members )
+
+    return ( end + alignment - 1 ) // alignment * alignment
+
+def test_optimal_engine_packs_what_greedy_does_not( workspace ):
+    workspace.write( 'src/b.c', SOURCE )
+    object_file = workspace.compile( 'src/b.c' )
+
+    # greedy engine does not move arrays into paddings, B is left as it is
+    assert workspace.get_sizes( workspace.run( '--engine', 'greedy', object_file ) ) == {}
+    assert workspace.get_sizes( workspace.run( '--engine', 'optimal', object_file ) ) == { 'B': ( 40, 32 ) }
+
+    assert workspace.read_sc( 'B.new.32.sc' ) == [ ( 'b', 0 ), ( 'c', 16 ), ( 'd', 28 ), ( 'a', 30 ), ( '', 31 ) ]
+
+def test_optimal_engine_finds_smallest_size( workspace ):
+    structs = list( itertools.combinations( MEMBERS, 4 ) )
+    lines = [ TYPES ]
+
+    for ( i, members ) in enumerate( structs ):
+        declarations = ' '.join( member[ 0 ] % ( 'm%d' % j ) for ( j, member ) in enumerate( members ) )
+        lines.append( 'struct S%d { %s } s%d;' % ( i, declarations, i ) )
+
+    workspace.write( 'src/s.c', '\n'.join( lines ) + '\n' )
+    object_file = workspace.compile( 'src/s.c' )
+
+    sizes = workspace.get_sizes( workspace.run( '--engine', 'optimal', object_file ) )
+
+    for ( i, members ) in enumerate( structs ):
+        best_size = min( get_size( order ) for order in itertools.permutations( members ) )
+        ( old_size, new_size ) = sizes.get( 'S%d' % i, ( get_size( members ), ) * 2 )
+
+        assert ( old_size, new_size ) == ( get_size( members ), best_size )
@@ -0,0 +1,51 @@
+# PaddingIndex finds the first padding a member fits in, as walking through all of them does
+
+import random
+
+def find_first( sc, paddings, size, alignment ):
+    for padding in sorted( paddings, key = lambda padding: padding.get_this_offset() ):
+        if sc.check_padding( padding, size, alignment ):
+            return padding
+
+    return None
+
+def test_find_returns_first_fitting_padding( sc ):
+    generator = random.Random( 0 )
+
+    for i in range( 50 ):
+        index = sc.PaddingIndex()
+        paddings = []
+        end = 0
+
+        for j in range( 100 ):
+            if paddings and generator.random() < 0.3:
+                padding = paddings.pop( generator.randrange( len( paddings ) ) )
+                index.remove( padding )
+            else:
+                end += generator.randint( 1, 8 )
+                padding = sc.PaddingNode( sc.PaddingType( generator.randint( 1, 24 ) ), end )
+                end += padding.get_size()
+
+                index.add( padding )
+                paddings.append( padding )
+
+            size = generator.randint( 1, 16 )
+            alignment = generator.choice( [ 1, 2, 4, 8 ] )
+
+            assert index.find( size, alignment ) is find_first( sc, paddings, size, alignment )
+
+def test_min_tree_grows_with_keys( sc ):
+    tree = sc.MinTree()
+
+    tree.set( 3, 40 )
+    tree.set( 100, 8 )
+    tree.set( 7, 16 )
+
+    assert tree.find_min( 0 ) == 8
+    assert tree.find_min( 4 ) == 8
+    assert tree.find_min( 101 ) == None
+
+    tree.set( 100, None )
+
+    assert tree.find_min( 0 ) == 16
+    assert tree.find_min( 8 ) == None
@@ -0,0 +1,46 @@
+# --patch reorders declarations of members in sources as in packed structs
+
+import os
+
+SOURCE = '''\
+struct Packet {
+  char kind;
+  double value;
+  short port;
+  long long id;
+  char flags;
+} packet;
+
+struct Pair {
+  char a; double b;
+  char c;
+} pair;
+'''
+
+def test_patched_source_has_packed_layout( workspace ):
+    workspace.write( 'src/p.c', SOURCE )
+    object_file = workspace.compile( 'src/p.c' )
+
+    result = workspace.run( '-w', '--format', 'jsonl', '-o', 'records.jsonl' \
+        , '--patch', 'p.diff', '--source-dir', 'src', object_file )
+
+    records = workspace.read_records( 'records.jsonl' )
+    assert sorted( records ) == [ 'Packet', 'Pair' ]
+
+    workspace.patch( 'p.diff', 'src', 'patched' )
+    patched_file = workspace.compile( 'patched/p.c', 'patched.o' )
+
+    assert workspace.read_layout( patched_file, 'Packet' ) == workspace.get_new_layout( records[ 'Packet' ] )
+
+    # members of Pair share a line, it is left as it is
+    assert workspace.read_layout( patched_file, 'Pair' ) == workspace.read_layout( object_file, 'Pair' )
+    assert 'Pair' in result.stdout + result.stderr
+
+def test_no_patch_for_nothing_packed( workspace ):
+    workspace.write( 'src/p.c', 'struct Tight { long a; int b; int c; } tight;\n' )
+    object_file = workspace.compile( 'src/p.c' )
+
+    workspace.run( '--patch', 'p.diff', '--source-dir', 'src', object_file )
+
+    path = os.path.join( workspace.path, 'p.diff' )
+    assert not os.path.exists( path ) or os.path.getsize( path ) == 0
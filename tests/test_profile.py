@@ -0,0 +1,36 @@
+# Members accessed by profile go first, so the hot path touches as few cache lines as possible
+
+SOURCE = '''\
+struct Conn {
+  long hot1;
+  char buffer[64];
+  long cold;
+  char names[56];
+  long hot2;
+  char flag;
+} conn;
+'''
+
+PROFILE = '''\
+Conn,hot1,1000
+Conn,hot2,500
+Conn,flag,10
+'''
+
+def test_accessed_members_share_cache_line( workspace ):
+    workspace.write( 'src/c.c', SOURCE )
+    workspace.write( 'profile.csv', PROFILE )
+    object_file = workspace.compile( 'src/c.c' )
+
+    # nothing to save in size, Conn is laid out again for its hot path only
+    assert workspace.get_sizes( workspace.run( object_file ) ) == {}
+    assert workspace.get_sizes( workspace.run( '--profile', 'profile.csv', object_file ) ) == { 'Conn': ( 152, 152 ) }
+
+    assert workspace.read_sc( 'Conn.new.152.sc' )[ : 3 ] == [ ( 'hot1', 0 ), ( 'hot2', 8 ), ( 'flag', 16 ) ]
+
+def test_struct_not_in_profile_is_packed_as_usual( workspace ):
+    workspace.write( 'src/c.c', SOURCE.replace( 'Conn', 'Other' ) )
+    workspace.write( 'profile.csv', PROFILE )
+    object_file = workspace.compile( 'src/c.c' )
+
+    assert workspace.get_sizes( workspace.run( '--profile', 'profile.csv', object_file ) ) == {}
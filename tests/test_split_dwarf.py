@@ -0,0 +1,82 @@
+# Structs are read from .dwo files, DWARF packages and compressed sections as from plain DWARF
+
+import os
+import shutil
+import subprocess
+
+import pytest
+
+SOURCE = '''\
+struct Packet {
+  char kind;
+  double value;
+  short port;
+  long long id;
+  char flags;
+} packet;
+
+int main() { return packet.kind; }
+'''
+
+SIZES = { 'Packet': ( 40, 24 ) }
+
+def run_tool( workspace, tool, * args ):
+    if shutil.which( tool ) == None:
+        pytest.skip( '%s is not found' % tool )
+
+    subprocess.run( [ tool ] + list( args ), cwd = workspace.path, check = True )
+
+@pytest.mark.parametrize( 'version', [ '-gdwarf-4', '-gdwarf-5' ] )
+def test_dwo_file_is_followed( workspace, version ):
+    workspace.write( 'src/p.c', SOURCE )
+    object_file = workspace.compile( 'src/p.c', flags = [ version, '-gsplit-dwarf' ] )
+
+    assert os.path.exists( os.path.join( workspace.path, 'p.dwo' ) )
+    assert workspace.get_sizes( workspace.run( object_file ) ) == SIZES
+
+# GNU dwp does not pack DWARF 5 units
+@pytest.mark.parametrize( ( 'version', 'tool' ), [ ( '-gdwarf-4', 'dwp' ), ( '-gdwarf-5', 'llvm-dwp' ) ] )
+def test_package_is_followed( workspace, version, tool ):
+    workspace.write( 'src/p.c', SOURCE )
+    executable = workspace.build( [ workspace.compile( 'src/p.c', flags = [ version, '-gsplit-dwarf' ] ) ], 'p' )
+
+    run_tool( workspace, tool, '-e', 'p', '-o', 'p.dwp' )
+    os.remove( os.path.join( workspace.path, 'p.dwo' ) )
+
+    assert workspace.get_sizes( workspace.run( executable ) ) == SIZES
+
+def test_compressed_sections_of_object_are_inflated( workspace ):
+    workspace.write( 'src/p.c', SOURCE )
+    workspace.compile( 'src/p.c' )
+
+    run_tool( workspace, 'objcopy', '--compress-debug-sections=zlib', 'p.o', 'compressed.o' )
+
+    assert workspace.get_sizes( workspace.run( 'compressed.o' ) ) == SIZES
+
+# .zdebug sections of objects have relocations of compressed bytes, they are not read
+@pytest.mark.parametrize( 'compression', [ 'zlib', 'zlib-gnu' ] )
+def test_compressed_sections_of_executable_are_inflated( workspace, compression ):
+    workspace.write( 'src/p.c', SOURCE )
+    workspace.build( [ workspace.compile( 'src/p.c' ) ], 'p' )
+
+    run_tool( workspace, 'objcopy', '--compress-debug-sections=%s' % compression, 'p', 'compressed' )
+
+    assert workspace.get_sizes( workspace.run( 'compressed' ) ) == SIZES
+
+@pytest.mark.parametrize( ( 'version', 'tool' ), [ ( '-gdwarf-4', 'dwp' ), ( '-gdwarf-5', 'llvm-dwp' ) ] )
+def test_package_is_read_while_open( workspace, sc, monkeypatch, version, tool ):
+    workspace.write( 'src/p.c', SOURCE )
+    executable = workspace.build( [ workspace.compile( 'src/p.c', flags = [ version, '-gsplit-dwarf' ] ) ], 'p' )
+
+    run_tool( workspace, tool, '-e', 'p', '-o', 'p.dwp' )
+    os.remove( os.path.join( workspace.path, 'p.dwo' ) )
+
+    # files which can not be mapped are read through theirs file objects
+    def mmap( * args, ** kwargs ):
+        raise ValueError( 'mmap is not available' )
+
+    monkeypatch.setattr( sc.mmap, 'mmap', mmap )
+
+    layout = workspace.read_layout( executable, 'Packet' )
+
+    assert layout.size == 40
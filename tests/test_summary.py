@@ -0,0 +1,78 @@
+# --summary ranks packed structs of all inputs by saving and totals theirs paddings
+
+SOURCES = {
+    'src/a.c': '''\
+struct Packet {
+  char kind;
+  double value;
+  short port;
+  long long id;
+  char flags;
+} packet;
+''',
+    'src/b.c': '''\
+struct Node {
+  char tag;
+  struct Node * next;
+  unsigned short port;
+  int id;
+} node;
+''',
+}
+
+def get_summary( stdout ):
+    lines = stdout.splitlines()
+
+    return lines[ lines.index( 'Summary:' ) + 1 : lines.index( 'Done.' ) ]
+
+def test_summary_of_all_inputs( workspace ):
+    object_files = []
+
+    for source, text in SOURCES.items():
+        workspace.write( source, text )
+        object_files.append( workspace.compile( source ) )
+
+    result = workspace.run( '--summary', '--summary-top', '1', *object_files )
+    summary = get_summary( result.stdout )
+
+    assert summary[ : 6 ] == [
+        'Structs: 2, packed: 2',
+        'Size: 64 bytes, padding: 29 bytes (45.3%), recoverable: 24 bytes (82.8% of padding)',
+        'Top 1 by bytes saved:',
+        '  {Packet}(40/24) 16 bytes',
+        'Top 1 by percent saved:',
+        '  {Packet}(40/24) 40.0%',
+    ]
+
+    # hole of Node before id, holes of Packet before value and id, at its tail, and of Node before next
+    assert summary[ 7 : ] == [ '  4: 2:1', '  8: 6:1 7:3' ]
+
+def test_no_summary_by_default( workspace ):
+    workspace.write( 'src/a.c', SOURCES[ 'src/a.c' ] )
+    object_file = workspace.compile( 'src/a.c' )
+
+    assert 'Summary:' not in workspace.run( object_file ).stdout
+
+def test_summary_does_not_take_file( workspace ):
+    workspace.write( 'src/a.c', SOURCES[ 'src/a.c' ] )
+    object_file = workspace.compile( 'src/a.c' )
+
+    summary = get_summary( workspace.run( '--summary', object_file ).stdout )
+
+    assert summary[ 0 ] == 'Structs: 1, packed: 1'
+
+def test_structs_are_printed_file_by_file( workspace ):
+    object_files = []
+
+    for source, text in SOURCES.items():
+        workspace.write( source, text )
+        object_files.append( workspace.compile( source ) )
+
+    lines = workspace.run( '-v', *object_files ).stdout.splitlines()
+    lines = lines[ : lines.index( '... and finally:' ) ]
+
+    # types of a file are printed, and dropped, before the next file is read
+    assert lines.index( 'Processing %s' % object_files[ 1 ] ) \
+        < min( i for ( i, line ) in enumerate( lines ) if 'Node' in line )
+    assert max( i for ( i, line ) in enumerate( lines ) if 'Packet' in line ) \
+        < lines.index( 'Processing %s' % object_files[ 1 ] )
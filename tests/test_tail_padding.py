@@ -0,0 +1,125 @@
+# Members of derived classes are placed into tail padding of bases which are not POD
+
+SOURCE = '''\
+struct Base {
+  Base() {}
+  char a;
+  long b;
+  char c;
+};
+
+struct Mid : Base {
+  Mid() {}
+  char d;
+};
+
+struct Leaf : Mid {
+  Leaf() {}
+  char e;
+  int f;
+};
+
+Leaf leaf;
+'''
+
+# members declared in order of packed structs
+PACKED_SOURCE = '''\
+struct Base {
+  Base() {}
+  long b;
+  char a;
+  char c;
+};
+
+struct Mid : Base {
+  Mid() {}
+  char d;
+};
+
+struct Leaf : Mid {
+  Leaf() {}
+  char e;
+  int f;
+};
+
+Leaf leaf;
+'''
+
+def get_offsets( workspace, file_name ):
+    return dict( member for member in workspace.read_sc( file_name ) if member[ 0 ] not in ( '', '__inheritance' ) )
+
+def test_hierarchy_is_packed_bases_first( workspace ):
+    workspace.write( 'src/h.cpp', SOURCE )
+    workspace.write( 'packed/h.cpp', PACKED_SOURCE )
+
+    object_file = workspace.compile( 'src/h.cpp' )
+    packed_file = workspace.compile( 'packed/h.cpp', 'packed.o' )
+
+    # d is in tail padding of Base, e and f in the one of Mid
+    sizes = workspace.get_sizes( workspace.run( '--engine', 'optimal', object_file ) )
+
+    assert sizes == { 'Base': ( 24, 16 ), 'Mid': ( 24, 16 ), 'Leaf': ( 24, 16 ) }
+
+    for ( name, ( old_size, new_size ) ) in sizes.items():
+        layout = workspace.read_layout( packed_file, name )
+        offsets = get_offsets( workspace, '%s.new.%d.sc' % ( name, new_size ) )
+
+        assert layout.size == new_size
+        assert dict( item for item in layout.offsets.items() if item[ 0 ] in offsets ) == offsets
+
+# bases are not POD for a member of class type which is not POD or a reference member, theirs
+# tail paddings appear once they are packed
+MEMBERS_SOURCE = '''\
+struct Ctor {
+  Ctor();
+  int x;
+};
+
+Ctor::Ctor() : x( 0 ) {}
+
+struct Base {
+  char tag;
+  Ctor c;
+  char flags;
+  long l;
+};
+
+struct Derived : Base {
+  char d;
+};
+
+int i;
+
+struct RefBase {
+  RefBase() : r( i ) {}
+  char tag;
+  int x;
+  char flags;
+  int & r;
+};
+
+struct RefDerived : RefBase {
+  char d;
+};
+
+Derived derived;
+RefDerived ref_derived;
+'''
+
+PACKED_MEMBERS_SOURCE = MEMBERS_SOURCE \
+    .replace( '  char tag;\n  Ctor c;\n  char flags;\n  long l;\n', '  long l;\n  Ctor c;\n  char tag;\n  char flags;\n' ) \
+    .replace( '  char tag;\n  int x;\n  char flags;\n  int & r;\n', '  int & r;\n  int x;\n  char tag;\n  char flags;\n' )
+
+def test_members_make_bases_not_pod( workspace ):
+    workspace.write( 'src/m.cpp', MEMBERS_SOURCE )
+    workspace.write( 'packed/m.cpp', PACKED_MEMBERS_SOURCE )
+
+    object_file = workspace.compile( 'src/m.cpp' )
+    packed_file = workspace.compile( 'packed/m.cpp', 'packed.o' )
+
+    sizes = workspace.get_sizes( workspace.run( '--engine', 'optimal', object_file ) )
+
+    assert sizes[ 'Derived' ] == sizes[ 'RefDerived' ] == ( 32, 16 )
+
+    for name in ( 'Derived', 'RefDerived' ):
+        assert workspace.read_layout( packed_file, name ).size == 16
@@ -0,0 +1,38 @@
+# Structs kept by type units are found through references by signature
+
+import pytest
+
+HEADER = '''\
+struct Packet {
+  char kind;
+  double value;
+  short port;
+  long long id;
+  char flags;
+};
+'''
+
+SOURCE = '''\
+#include "packet.h"
+
+struct Holder {
+  char tag;
+  Packet packet;
+  int id;
+} holder%d;
+'''
+
+@pytest.mark.parametrize( 'version', [ '-gdwarf-4', '-gdwarf-5' ] )
+def test_structs_of_type_units_are_read( workspace, version ):
+    workspace.write( 'src/packet.h', HEADER )
+    workspace.write( 'src/first.cpp', SOURCE % 1 )
+    workspace.write( 'src/second.cpp', SOURCE % 2 )
+
+    flags = [ version, '-fdebug-types-section' ]
+    object_files = [ workspace.compile( 'src/first.cpp', flags = flags ), workspace.compile( 'src/second.cpp', flags = flags ) ]
+
+    # every CU refers to the same type units, structs are reported once
+    result = workspace.run( workspace.link( object_files, 'all.o' ) )
+
+    assert workspace.get_sizes( result ) == { 'Packet': ( 40, 24 ), 'Holder': ( 56, 32 ) }
+    assert result.stdout.count( 'Files Packet.old.' ) == 1
@@ -0,0 +1,44 @@
+# Types given by --types are packed as they are when all types are processed
+
+import pytest
+
+SOURCE = '''\
+struct S0 {
+  short a;
+  long long b[4];
+  char c;
+} s0;
+
+struct S1 {
+  char a;
+  long long b;
+  char c;
+} s1;
+
+struct S2 {
+  char a;
+  struct S0 b;
+  char c;
+} s2;
+'''
+
+@pytest.mark.parametrize( 'engine', [ 'greedy', 'optimal' ] )
+@pytest.mark.parametrize( 'name', [ 'S0', 'S1', 'S2' ] )
+def test_filtered_type_is_packed_as_unfiltered( workspace, engine, name ):
+    workspace.write( 'src/s.c', SOURCE )
+    object_file = workspace.compile( 'src/s.c' )
+
+    sizes = workspace.get_sizes( workspace.run( '--engine', engine, object_file ) )
+    layout = workspace.read_sc( '%s.new.%d.sc' % ( name, sizes[ name ][ 1 ] ) )
+
+    assert workspace.get_sizes( workspace.run( '--engine', engine, '-t', name, '--', object_file ) ) \
+        == { name: sizes[ name ] }
+    assert workspace.read_sc( '%s.new.%d.sc' % ( name, sizes[ name ][ 1 ] ) ) == layout
+
+def test_struct_not_well_defined_does_not_skip_file( workspace ):
+    workspace.write( 'src/s.c', SOURCE )
+    object_file = workspace.compile( 'src/s.c' )
+
+    result = workspace.run( '-w', '-t', 'S0', '--', object_file )
+
+    assert 'skipped' not in result.stdout